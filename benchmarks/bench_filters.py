@@ -0,0 +1,231 @@
+"""
+Микробенчмарк нормализации объема и цены.
+
+Запуск:
+    python -m benchmarks.bench_filters [--rows N]
+
+Значения берутся из небольшого набора типичных ячеек прайс-листа
+с неравномерными частотами (как в реальных файлах: "0,5 л банка"
+встречается гораздо чаще редкой тары). Для каждого нормализатора
+выводится время на строку исходной реализации (до), текущей без кэша,
+с кэшем и пакетно по колонке.
+"""
+import argparse
+import random
+import re
+import time
+from typing import Optional
+
+import pandas as pd
+
+from core import filters
+
+VOLUME_VALUES = [
+    "0,5 л банка", "0,33 л банка", "0,5 л бутылка", "0,33 л бутылка",
+    "кега 30", "кега 20", "Кега 30 л", "ПЭТ 30", "ПЭТ 20", "0.44 ж/б",
+    "330 мл", "500 ml", "0,75 л бутылка", "1 л", "KEG 20", "30", 20.0,
+    "0,5 л банка\nлимитированная серия", "бут. 0,33", "банка 0.5",
+]
+
+PRICE_VALUES = [
+    150, 160, 175.5, "250", "250 руб.", "5 500 ₽", "4000", "4 000,00",
+    "по запросу", 189, 210, 230, 3900, 5400, "170,5 руб", 99.9,
+]
+
+
+# Исходные нормализаторы (до предкомпиляции выражений и кэша) - колонка "до".
+# Копия дословная, чтобы замер "до" воспроизводился по текущему дереву.
+
+def baseline_extract_volume(text: str) -> Optional[str]:
+    """
+    Извлечь объем из текста.
+
+    Args:
+        text: Текст для анализа
+
+    Returns:
+        Optional[str]: Объем в стандартизированном виде
+    """
+    if not text:
+        return None
+
+    # Если передано число (литраж кеги)
+    try:
+        volume_num = float(text)
+        # Если >= 15 литров - это ПЭТ-кега
+        if volume_num >= 15:
+            return f"{int(volume_num)} л (ПЭТ-кега)"
+        elif volume_num > 0:
+            return f"{volume_num} л"
+    except (ValueError, TypeError):
+        pass
+
+    if not isinstance(text, str):
+        return None
+
+    text_original = str(text)
+    text = text_original.lower()
+
+    # Удаляем переносы строк для поиска
+    text_clean = text.replace('\n', ' ').replace('\r', ' ')
+
+    # Проверяем, есть ли упоминание кеги (включая ПЭТ-кеги)
+    is_keg = 'кег' in text_clean or 'keg' in text_clean or 'пэт' in text_clean or 'pet' in text_clean
+
+    # Определение типа тары
+    container_type = None
+    if 'бутылка' in text_clean or 'bottle' in text_clean or 'бут' in text_clean:
+        container_type = 'бутылка'
+    elif 'банка' in text_clean or 'can' in text_clean or 'банку' in text_clean or 'ж/б' in text_clean:
+        container_type = 'банка'
+
+    # Паттерны для литров и дробных чисел (0,33 0,5 и т.д.)
+    liter_patterns = [
+        r'(\d+(?:[.,]\d+)?)\s*л(?:итр)?',
+        r'(\d+(?:[.,]\d+)?)\s*l(?:iter)?',
+        r'(\d[.,]\d+)',  # Дробные числа типа 0,33 или 0.5
+    ]
+
+    # Ищем в очищенном тексте (без переносов)
+    for pattern in liter_patterns:
+        match = re.search(pattern, text_clean, re.IGNORECASE)
+        if match:
+            volume = match.group(1).replace(',', '.')
+            if is_keg:
+                return f"{volume} л (кега)"
+            elif container_type:
+                return f"{volume} л ({container_type})"
+            return f"{volume} л"
+
+    # Паттерны для миллилитров
+    ml_patterns = [
+        r'(\d+)\s*мл',
+        r'(\d+)\s*ml',
+    ]
+
+    for pattern in ml_patterns:
+        match = re.search(pattern, text_clean, re.IGNORECASE)
+        if match:
+            ml = int(match.group(1))
+            liters = ml / 1000
+            if is_keg:
+                return f"{liters} л (кега)"
+            elif container_type:
+                return f"{liters} л ({container_type})"
+            return f"{liters} л"
+
+    # Если есть упоминание кеги, но нет объема - ищем число
+    if is_keg:
+        # ПЭТ-кеги
+        if 'пэт 30' in text_clean or 'pet 30' in text_clean:
+            return "30 л (ПЭТ-кега)"
+        elif 'пэт 20' in text_clean or 'pet 20' in text_clean:
+            return "20 л (ПЭТ-кега)"
+        # Обычные кеги
+        elif '30' in text_clean:
+            return "30 л (кега)"
+        elif '50' in text_clean:
+            return "50 л (кега)"
+        elif '20' in text_clean:
+            return "20 л (кега)"
+        else:
+            return "кега"
+
+    return None
+
+
+def baseline_extract_price(text: str, volume_text: Optional[str] = None) -> Optional[str]:
+    """
+    Извлечь цену из текста.
+
+    Args:
+        text: Текст с ценой
+        volume_text: Текст с объемом (для расчета цены за литр)
+
+    Returns:
+        Optional[str]: Цена в стандартизированном виде
+    """
+    if not text:
+        return None
+
+    text = str(text)
+
+    # Паттерны для цены
+    price_patterns = [
+        r'(\d+(?:[.,]\d+)?)\s*(?:руб|₽|rub)?',
+        r'(\d+(?:[.,]\d+)?)',
+    ]
+
+    price = None
+    for pattern in price_patterns:
+        match = re.search(pattern, text)
+        if match:
+            price_value = match.group(1).replace(',', '.')
+            price = f"{price_value} руб."
+            break
+
+    # Не добавляем расчет цены за литр - пользователь сам это видит
+    return price
+
+
+def make_column(values: list, rows: int, seed: int = 0) -> list:
+    """
+    Колонка с частотами по закону Ципфа (первые значения - самые частые).
+
+    Args:
+        values: Возможные значения ячеек
+        rows: Количество строк
+        seed: Зерно генератора
+
+    Returns:
+        list: Значения колонки
+    """
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(values))]
+    return rng.choices(values, weights=weights, k=rows)
+
+
+def per_row_us(func, column: list, repeat: int = 3) -> float:
+    """
+    Лучшее время на строку в микросекундах.
+
+    Args:
+        func: Функция от колонки
+        column: Значения
+        repeat: Количество повторов
+
+    Returns:
+        float: Микросекунд на строку
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(column)
+        best = min(best, time.perf_counter() - start)
+    return best / len(column) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк нормализации объема и цены")
+    parser.add_argument("--rows", type=int, default=100_000, help="Количество строк")
+    args = parser.parse_args()
+
+    cases = [
+        ("объем", make_column(VOLUME_VALUES, args.rows), baseline_extract_volume,
+         filters._extract_volume, filters.extract_volume, filters.extract_volumes),
+        ("цена", make_column(PRICE_VALUES, args.rows, seed=1), baseline_extract_price,
+         filters._extract_price, filters.extract_price, filters.extract_prices),
+    ]
+
+    print(f"{'поле':<8}{'до':>12}{'без кэша':>12}{'с кэшем':>12}{'колонка':>12}   мкс/строку, строк: {args.rows}")
+    for name, column, baseline, uncached, cached, batch in cases:
+        series = pd.Series(column, dtype=object)
+        before = per_row_us(lambda values: [baseline(value) for value in values], column)
+        plain = per_row_us(lambda values: [uncached(value) for value in values], column)
+        memo = per_row_us(lambda values: [cached(value) for value in values], column)
+        vector = per_row_us(batch, series)
+        print(f"{name:<8}{before:>12.2f}{plain:>12.2f}{memo:>12.2f}{vector:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Бенчмарк парсинга Excel файлов.
+
+Запуск:
+    python -m benchmarks.bench_parser [--workers N] [путь_к_файлу ...]
+
+Без аргументов используются файлы из tests/test_data. Для каждого файла
+выводится время парсинга и количество открытий xlsx-архива на лист.
+С --workers N дополнительно замеряется разбор листов в N процессах
+и выводится ускорение относительно последовательного режима.
+
+Каждый замер начинается с пустого реестра раскладок, поэтому все повторы
+проходят поиск заголовков и классификацию колонок. Отдельная колонка -
+повторная загрузка того же файла, когда раскладки листов уже известны.
+Файл реестра процесса (data/layouts.json) бенчмарк не трогает.
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+
+from core.layout_registry import LayoutRegistry
+from core.parser import ExcelParser
+
+TEST_DATA_DIR = Path(__file__).parent.parent / "tests" / "test_data"
+
+
+@contextlib.contextmanager
+def count_zip_opens():
+    """
+    Подсчитать открытия zip-архивов (каждый xlsx - это zip).
+
+    Yields:
+        list: Одноэлементный список со счетчиком открытий
+    """
+    counter = [0]
+    original_init = zipfile.ZipFile.__init__
+
+    def counting_init(self, *args, **kwargs):
+        counter[0] += 1
+        original_init(self, *args, **kwargs)
+
+    zipfile.ZipFile.__init__ = counting_init
+    try:
+        yield counter
+    finally:
+        zipfile.ZipFile.__init__ = original_init
+
+
+def bench_file(file_path: Path, repeat: int = 3, workers: int = 0, known_layouts: bool = False) -> dict:
+    """
+    Замерить парсинг одного файла.
+
+    Args:
+        file_path: Путь к Excel файлу
+        repeat: Количество повторов (берется лучшее время)
+        workers: Процессов для разбора листов (0 - последовательно)
+        known_layouts: Раскладки листов уже в реестре (повторная загрузка файла)
+
+    Returns:
+        dict: Время, количество позиций, листов и открытий архива
+    """
+    with pd.ExcelFile(file_path) as xls:
+        sheets = len(xls.sheet_names)
+
+    layouts = None
+    if known_layouts:
+        layouts = LayoutRegistry()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ExcelParser(auto_learn=False, workers=workers, layouts=layouts).parse_file(str(file_path))
+
+    best = None
+    items = []
+    opens = 0
+    for _ in range(repeat):
+        with count_zip_opens() as counter, contextlib.redirect_stdout(io.StringIO()):
+            # Без известных раскладок каждый повтор - с пустым реестром
+            registry = layouts if known_layouts else LayoutRegistry()
+            parser = ExcelParser(auto_learn=False, workers=workers, layouts=registry)
+            start = time.perf_counter()
+            items = parser.parse_file(str(file_path))
+            elapsed = time.perf_counter() - start
+        opens = counter[0]
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {"time": best, "items": len(items), "sheets": sheets, "opens": opens}
+
+
+def main(argv):
+    """Запустить бенчмарк по списку файлов."""
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк парсинга Excel")
+    arg_parser.add_argument("files", nargs="*", help="Excel файлы (по умолчанию tests/test_data)")
+    arg_parser.add_argument("--workers", type=int, default=0, help="Процессов для разбора листов")
+    args = arg_parser.parse_args(argv)
+
+    files = [Path(p) for p in args.files] or sorted(TEST_DATA_DIR.glob("*.xlsx"))
+    header = f"{'файл':40s} {'листы':>6s} {'позиции':>8s} {'время, с':>9s} {'откр./лист':>11s} {'раскладка, с':>13s}"
+    if args.workers > 1:
+        header += f" {'параллельно, с':>15s} {'ускорение':>10s}"
+    print(header)
+    for file_path in files:
+        result = bench_file(file_path)
+        per_sheet = result["opens"] / max(result["sheets"], 1)
+        known = bench_file(file_path, known_layouts=True)
+        line = (f"{file_path.name[:40]:40s} {result['sheets']:6d} {result['items']:8d} "
+                f"{result['time']:9.3f} {per_sheet:11.2f} {known['time']:13.3f}")
+        if args.workers > 1:
+            parallel = bench_file(file_path, workers=args.workers)
+            line += f" {parallel['time']:15.3f} {result['time'] / parallel['time']:9.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
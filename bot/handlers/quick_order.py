@@ -10,39 +10,62 @@ from openpyxl import load_workbook
 from io import BytesIO
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict
+from typing import BinaryIO, List, Dict, Optional, Sequence, Tuple, Union
 import json
 import re
 import pandas as pd
-import os
-import hashlib
+import asyncio
+import logging
+import config
 from database.crud import async_session_maker, get_or_create_user, create_quick_order
 from bot.states import QuickOrderStates
+from core.cart import CartJournal, initial_order, order_lines
+from core.catalog import Catalog, catalog_store, page_positions
+from core.facets import FACET_TITLES, CatalogFacets
+from core.layout_registry import layout_registry
+from core.parse_cache import document_index, parse_cache
+from core.scheduler import ParseJobCancelled, ParseQueueFull, parse_scheduler
+from core.sorting import SORT_CATALOG, SORT_NAME, SORT_PRICE_PER_LITER, SORT_TITLES, CatalogSorts, price_per_liter_kop
+from core.upload_buffer import UploadBuffer
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
-# Простой кэш для результатов парсинга
-_parsing_cache = {}
 
-def get_file_hash(file_path: str) -> str:
-    """Получить хэш файла для кэширования."""
-    with open(file_path, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
+def parse_price_list(source: UploadBuffer, filename: str) -> List[Dict]:
+    """
+    Распарсить прайс-лист (выполняется в пуле планировщика).
+    
+    Args:
+        source: Содержимое Excel файла
+        filename: Имя файла (для определения пивоварни)
+        
+    Returns:
+        List[Dict]: Позиции пива
+    """
+    parser = ExcelParser()
+    return parser.parse_file(source, filename=filename)
 
-def get_cached_parsing_result(file_path: str) -> List[Dict]:
-    """Получить кэшированный результат парсинга."""
-    file_hash = get_file_hash(file_path)
-    return _parsing_cache.get(file_hash)
 
-def cache_parsing_result(file_path: str, result: List[Dict]):
-    """Сохранить результат парсинга в кэш."""
-    file_hash = get_file_hash(file_path)
-    _parsing_cache[file_hash] = result
-    # Ограничиваем размер кэша (максимум 10 файлов)
-    if len(_parsing_cache) > 10:
-        # Удаляем самый старый элемент
-        oldest_key = next(iter(_parsing_cache))
-        del _parsing_cache[oldest_key]
+async def download_document(message: Message, file_id: str) -> UploadBuffer:
+    """
+    Скачать документ в память, хэшируя по мере загрузки.
+    
+    Args:
+        message: Сообщение (для доступа к боту)
+        file_id: Идентификатор файла в Telegram
+        
+    Returns:
+        UploadBuffer: Содержимое файла (на диске только сверх UPLOAD_SPOOL_BYTES)
+    """
+    buffer = UploadBuffer(config.UPLOAD_SPOOL_BYTES)
+    try:
+        await message.bot.download(file_id, destination=buffer)
+    except Exception:
+        buffer.close()
+        raise
+    return buffer
 
 
 @router.message(F.document)
@@ -62,49 +85,256 @@ async def process_excel_file(message: Message, state: FSMContext):
     
     await message.answer("Парсинг файла...")
     
-    # Скачиваем файл
-    file_path = f"temp_files/{document.file_name}"
-    await message.bot.download(document, destination=file_path)
+    # Уже встречавшийся документ: хэш известен, скачивание и парсинг не нужны.
+    # Каталог общий для всех пользователей, загрузивших этот файл
+    catalog = None
+    file_hash = document_index.get(document.file_unique_id)
+    if file_hash:
+        catalog = await asyncio.to_thread(catalog_store.get, file_hash)
     
-    # Парсинг файла (с кэшированием)
-    cached_result = get_cached_parsing_result(file_path)
-    if cached_result:
-        beer_items = cached_result
-        await message.answer(f"Файл загружен из кэша! Найдено {len(beer_items)} позиций")
+    if catalog:
+        await message.answer(f"Файл загружен из кэша! Найдено {len(catalog)} позиций")
     else:
-        parser = ExcelParser()
-        beer_items = parser.parse_file(file_path)
-        cache_parsing_result(file_path, beer_items)
+        # Скачиваем файл в память, хэш считается по мере загрузки
+        buffer = await download_document(message, document.file_id)
+        file_hash = buffer.hexdigest()
+        document_index.put(document.file_unique_id, file_hash)
+        # Кэш с диска читается вне цикла событий
+        catalog = await asyncio.to_thread(catalog_store.get, file_hash)
+    
+        if catalog:
+            buffer.close()
+            await message.answer(f"Файл загружен из кэша! Найдено {len(catalog)} позиций")
+        else:
+            # Парсинг в пуле планировщика: бот продолжает отвечать другим пользователям.
+            # Тот же файл, загруженный несколькими пользователями одновременно, парсится один раз.
+            # Буфер закрывает планировщик, когда парсинг его уже не читает (и при отмене)
+            try:
+                beer_items = await parse_scheduler.run(
+                    message.from_user.id, parse_price_list, buffer, document.file_name,
+                    key=file_hash, cleanup=buffer.close
+                )
+            except ParseJobCancelled:
+                # Пользователь уже загрузил новый файл - этот результат не нужен
+                return
+            except ParseQueueFull:
+                await message.answer("Сейчас обрабатывается много файлов. Попробуйте через минуту.")
+                return
+            if beer_items:
+                await asyncio.to_thread(parse_cache.put, file_hash, beer_items)
+                catalog = catalog_store.put(file_hash, beer_items)
+    logger.info(
+        "Кэш парсинга: %s, каталоги: %s, документы: %s, раскладки: %s, планировщик: %s",
+        parse_cache.stats(), catalog_store.stats(), document_index.stats(),
+        layout_registry.stats(), parse_scheduler.stats()
+    )
     
-    if not beer_items:
+    if not catalog:
         await message.answer("Не удалось извлечь данные из файла.")
         return
     
-    # Сохраняем данные в состояние
+    # В состоянии только ключ каталога и журнал заказа пользователя;
+    # заказ из колонки "Заказ" файла - начальный заказ журнала
     await state.update_data(
-        file_path=file_path,
+        **CartJournal(catalog, initial_order(catalog)).to_state(),
+        file_id=document.file_id,
         filename=document.file_name,
-        items=beer_items,
+        catalog_key=file_hash,
+        filters={},
+        sort=SORT_CATALOG,
+        view=None,
+        view_key=None,
         current_page=0
     )
     
     # Показываем позиции
-    sent_message = await show_items_page(message, beer_items, 0, state=state)
+    sent_message = await show_items_page(message, catalog, 0, state=state)
     
     # Сохраняем ID сообщения для редактирования
     await state.update_data(list_message_id=sent_message.message_id)
     await state.set_state(QuickOrderStates.viewing_page)
 
 
-async def show_items_page(message: Message, items: List[Dict], page: int, items_per_page: int = 20, brewery_filter: str = None, edit_message_id: int = None, state: FSMContext = None):
+async def session_catalog(data: Dict) -> Optional[Catalog]:
+    """
+    Общий каталог прайс-листа текущей сессии.
+    
+    Args:
+        data: Данные состояния
+        
+    Returns:
+        Optional[Catalog]: Позиции только для чтения или None, если файл не загружен
+        или каталог вытеснен и из памяти, и из кэша парсинга (см. catalog_expired)
+    """
+    key = data.get('catalog_key')
+    if not key:
+        return None
+    # Вытесненный из памяти каталог восстанавливается с диска - вне цикла событий
+    return await asyncio.to_thread(catalog_store.get, key)
+
+
+async def catalog_expired(message: Message, state: FSMContext):
+    """
+    Каталога сессии больше нет: попросить загрузить прайс-лист заново и сбросить сессию.
+    
+    Заказ без каталога не собрать (номера позиций в журнале ссылаются на каталог).
+    
+    Args:
+        message: Сообщение для ответа
+        state: FSM состояние
+    """
+    await state.clear()
+    await message.answer(
+        "Прайс-лист больше недоступен. Загрузите файл заново.",
+        reply_markup=ReplyKeyboardRemove()
+    )
+
+
+def session_journal(data: Dict, catalog: Optional[Catalog] = None) -> CartJournal:
+    """
+    Журнал заказа пользователя из состояния диалога.
+    
+    Изменения журнала сохраняются через state.update_data(**journal.to_state()).
+    
+    Args:
+        data: Данные состояния
+        catalog: Каталог сессии (нужен для изменения заказа)
+        
+    Returns:
+        CartJournal: Журнал (пустой, если заказа еще нет)
+    """
+    return CartJournal.from_state(data, catalog)
+
+
+def session_cart(data: Dict) -> Tuple[CartJournal, Dict[int, int], Dict[str, int]]:
+    """
+    Текущий заказ и итоги корзины (хранятся в журнале готовыми, без пересчета).
+    
+    Args:
+        data: Данные состояния
+        
+    Returns:
+        Tuple[CartJournal, Dict[int, int], Dict[str, int]]: Журнал, заказ {номер позиции: количество} и итоги
+    """
+    journal = session_journal(data)
+    return journal, journal.order, journal.cart
+
+
+async def session_facets(data: Dict) -> Optional[CatalogFacets]:
+    """
+    Фасеты каталога текущей сессии (строятся один раз на каталог, вне цикла событий).
+    
+    Args:
+        data: Данные состояния
+        
+    Returns:
+        Optional[CatalogFacets]: Фасеты или None, если каталога нет
+    """
+    key = data.get('catalog_key')
+    if not key:
+        return None
+    return await asyncio.to_thread(catalog_store.facets, key)
+
+
+async def session_sorts(data: Dict) -> Optional[CatalogSorts]:
+    """
+    Сортировки каталога текущей сессии (строятся один раз на каталог, вне цикла событий).
+    
+    Args:
+        data: Данные состояния
+        
+    Returns:
+        Optional[CatalogSorts]: Сортировки или None, если каталога нет
+    """
+    key = data.get('catalog_key')
+    if not key:
+        return None
+    return await asyncio.to_thread(catalog_store.sorts, key)
+
+
+async def session_view(data: Dict, items: Catalog, filters: Dict[str, str], sort: str,
+                       state: FSMContext = None) -> Sequence[int]:
+    """
+    Представление каталога для списка - номера позиций (_pos) в порядке показа.
+    
+    Без фильтров это готовая перестановка сортировки. С фильтрами - ее
+    выборка по маске фасетов: она строится один раз при смене фильтров
+    или сортировки и хранится в состоянии, листание берет из нее срез.
+    
+    Args:
+        data: Данные состояния
+        items: Каталог
+        filters: Фильтры {фасет: значение}
+        sort: Сортировка
+        state: FSM состояние (для сохранения выборки)
+        
+    Returns:
+        Sequence[int]: Номера позиций
+    """
+    if not filters and sort == SORT_CATALOG:
+        return range(len(items))
+    
+    sorts = await session_sorts(data)
+    if sorts is None:
+        return []
+    if not filters:
+        return sorts.order(sort)
+    
+    view_key = [sort, filters]
+    if data.get('view_key') == view_key and data.get('view') is not None:
+        return data['view']
+    facets = await session_facets(data)
+    view = sorts.view(sort, facets.mask(filters)) if facets else []
+    if state:
+        await state.update_data(view=view, view_key=[sort, dict(filters)])
+    return view
+
+
+def format_item(idx: int, item, qty: int, details: List[str] = None) -> str:
+    """
+    Строки позиции в списке: номер, отметка, название и подробности.
+    
+    Args:
+        idx: Номер позиции в списке (с 1)
+        item: Позиция каталога
+        qty: Количество в заказе
+        details: Поля перед объемом и ценой (пивоварня, цена за литр)
+        
+    Returns:
+        str: Две строки текста
+    """
+    name = item['название']
+    display_name = name[:35] + "..." if len(name) > 35 else name
+    checkbox = "✓" if qty > 0 else " "
+    
+    text = f"`{idx:3d}` [{checkbox}] {display_name}"
+    if qty > 0:
+        text += f" **x{qty}**"
+    text += "\n"
+    
+    stock = item.get('остаток', '')
+    stock_text = "      " + " | ".join([*(details or []), f"{item.get('объем', '')}", f"{item.get('цена', '')}"])
+    if stock:
+        if isinstance(stock, int):
+            stock_text += f" | Остаток: {stock} шт"
+        else:
+            stock_text += f" | {stock}"
+    return text + stock_text + "\n"
+
+
+# Позиций на странице списка
+ITEMS_PER_PAGE = 20
+
+
+async def show_items_page(message: Message, items: Catalog, page: int, items_per_page: int = ITEMS_PER_PAGE, filters: Dict[str, str] = None, edit_message_id: int = None, state: FSMContext = None):
     """Показать страницу с позициями."""
-    # Фильтруем по пивоварне если задан фильтр
-    if brewery_filter:
-        filtered_items = [item for item in items if item.get('пивоварня') == brewery_filter]
-    else:
-        filtered_items = items
+    data = await state.get_data() if state else {}
+    sort = data.get('sort') or SORT_CATALOG
+    
+    # Представление - номера позиций в порядке сортировки; страница - его срез
+    view = await session_view(data, items, filters, sort, state)
     
-    total_items = len(filtered_items)
+    total_items = len(view)
     total_pages = (total_items + items_per_page - 1) // items_per_page if total_items > 0 else 1
     
     if page >= total_pages:
@@ -114,37 +344,43 @@ async def show_items_page(message: Message, items: List[Dict], page: int, items_
     
     start_idx = page * items_per_page
     end_idx = min(start_idx + items_per_page, total_items)
-    page_items = filtered_items[start_idx:end_idx]
     
-    # Подсчет выбранных позиций
-    selected_items = [item for item in items if (item.get('заказ') or 0) > 0]
-    selected_count = len(selected_items)
-    total_qty_cans = sum((item.get('заказ') or 0) for item in selected_items if 'кег' not in str(item.get('объем', '')).lower())
-    total_qty_kegs = sum((item.get('заказ') or 0) for item in selected_items if 'кег' in str(item.get('объем', '')).lower())
+    # Итоги корзины обновляются при каждом изменении количества (core.cart),
+    # поэтому страница не пересчитывает их по всем позициям
+    _, order, cart = session_cart(data)
+    selected_count = cart['positions']
+    total_qty_cans = cart['cans']
+    total_qty_kegs = cart['kegs']
     
     # Формируем текст
     text = f"**Найдено позиций: {len(items)}**"
-    if brewery_filter:
-        text += f" | Фильтр: {brewery_filter}"
+    if filters:
+        text += f" | Фильтр: {', '.join(filters.values())}"
+    if sort != SORT_CATALOG:
+        text += f" | Сортировка: {SORT_TITLES.get(sort, sort)}"
     text += "\n\n"
     text += f"Страница {page + 1} из {total_pages} (позиции {start_idx + 1}-{end_idx})\n\n"
     
-    # Группируем по пивоварням и сохраняем глобальные индексы
+    # Номер позиции в списке - _pos + 1
+    page_items_with_global_idx = [
+        (int(pos) + 1, items[pos]) for pos in page_positions(view, page, items_per_page)
+    ]
+    
+    if sort != SORT_CATALOG:
+        # Отсортированный список показываем одним столбцом в порядке сортировки
+        for idx, item in page_items_with_global_idx:
+            details = [item.get('пивоварня') or 'Без пивоварни']
+            if sort == SORT_PRICE_PER_LITER:
+                per_liter = price_per_liter_kop(item)
+                if per_liter is not None:
+                    details.append(f"{per_liter / 100:.0f} руб./л")
+            text += format_item(idx, item, order.get(idx - 1, 0), details)
+        text += "\n"
+    
+    # В порядке прайса группируем по пивоварням
     breweries = {}
-    page_items_with_global_idx = []  # (global_idx, item)
-    
-    for item in page_items:
-        # Находим глобальный индекс в полном списке items
-        global_idx = None
-        for i, full_item in enumerate(items):
-            if (full_item.get('название') == item.get('название') and 
-                full_item.get('объем') == item.get('объем') and
-                full_item.get('_row_index') == item.get('_row_index')):
-                global_idx = i + 1
-                break
-        
-        if global_idx:
-            page_items_with_global_idx.append((global_idx, item))
+    if sort == SORT_CATALOG:
+        for global_idx, item in page_items_with_global_idx:
             brewery = item.get('пивоварня', 'Без пивоварни')
             if brewery not in breweries:
                 breweries[brewery] = []
@@ -158,8 +394,7 @@ async def show_items_page(message: Message, items: List[Dict], page: int, items_
         cans_bottles = []
         
         for idx, item in items_list:
-            volume_lower = str(item.get('объем', '')).lower()
-            if 'кег' in volume_lower or 'keg' in volume_lower:
+            if item.get('_is_keg'):
                 kegs.append((idx, item))
             else:
                 cans_bottles.append((idx, item))
@@ -168,59 +403,13 @@ async def show_items_page(message: Message, items: List[Dict], page: int, items_
         if kegs:
             text += "\n**КЕГИ:**\n"
             for idx, item in kegs:
-                name = item['название']
-                if len(name) > 35:
-                    display_name = name[:35] + "..."
-                else:
-                    display_name = name
-                
-                qty = item.get('заказ') or 0
-                checkbox = "✓" if qty > 0 else " "
-                volume = item.get('объем', '')
-                price = item.get('цена', '')
-                stock = item.get('остаток', '')
-                
-                text += f"`{idx:3d}` [{checkbox}] {display_name}"
-                if qty > 0:
-                    text += f" **x{qty}**"
-                text += "\n"
-                
-                stock_text = f"      {volume} | {price}"
-                if stock:
-                    if isinstance(stock, int):
-                        stock_text += f" | Остаток: {stock} шт"
-                    else:
-                        stock_text += f" | {stock}"
-                text += stock_text + "\n"
+                text += format_item(idx, item, order.get(idx - 1, 0))
         
         # Потом банки и бутылки
         if cans_bottles:
             text += "\n**БАНКИ/БУТЫЛКИ:**\n"
             for idx, item in cans_bottles:
-                name = item['название']
-                if len(name) > 35:
-                    display_name = name[:35] + "..."
-                else:
-                    display_name = name
-                
-                qty = item.get('заказ') or 0
-                checkbox = "✓" if qty > 0 else " "
-                volume = item.get('объем', '')
-                price = item.get('цена', '')
-                stock = item.get('остаток', '')
-                
-                text += f"`{idx:3d}` [{checkbox}] {display_name}"
-                if qty > 0:
-                    text += f" **x{qty}**"
-                text += "\n"
-                
-                stock_text = f"      {volume} | {price}"
-                if stock:
-                    if isinstance(stock, int):
-                        stock_text += f" | Остаток: {stock} шт"
-                    else:
-                        stock_text += f" | {stock}"
-                text += stock_text + "\n"
+                text += format_item(idx, item, order.get(idx - 1, 0))
         
         text += "\n"
     
@@ -238,19 +427,8 @@ async def show_items_page(message: Message, items: List[Dict], page: int, items_
     text += "Введите номер позиции для выбора количества\n"
     text += "Или используйте формат: `номер:кол-во` (например: `1:12`)"
     
-    # Получаем уникальные пивоварни для фильтра (с кэшированием)
-    all_breweries = None
-    if state:
-        data = await state.get_data()
-        all_breweries = data.get('cached_breweries')
-    
-    if not all_breweries:
-        all_breweries = list(set(item.get('пивоварня', 'Без пивоварни') for item in items))
-        if state:
-            await state.update_data(cached_breweries=all_breweries)
-    
     # Кнопки пагинации + быстрый выбор
-    keyboard = get_pagination_keyboard(page, total_pages, "page", selected_count, all_breweries, brewery_filter, page_items_with_global_idx)
+    keyboard = get_pagination_keyboard(page, total_pages, "page", selected_count, filters, page_items_with_global_idx)
     
     # Редактируем существующее сообщение или отправляем новое
     if edit_message_id:
@@ -271,7 +449,7 @@ async def show_items_page(message: Message, items: List[Dict], page: int, items_
 
 
 def get_pagination_keyboard(current_page: int, total_pages: int, prefix: str, selected_count: int = 0, 
-                           breweries: List[str] = None, current_brewery: str = None, 
+                           filters: Dict[str, str] = None, 
                            page_items_with_idx: List = None) -> InlineKeyboardMarkup:
     """Создать улучшенную клавиатуру навигации."""
     builder = InlineKeyboardBuilder()
@@ -328,22 +506,26 @@ def get_pagination_keyboard(current_page: int, total_pages: int, prefix: str, se
         callback_data="start_search"
     ))
     
-    # Кнопка фильтра по пивоварням (если их не слишком много)
-    if breweries and len(breweries) <= 10:
-        row2.append(InlineKeyboardButton(
-            text="Пивоварни",
-            callback_data="show_breweries"
-        ))
+    # Кнопка фильтров (пивоварня, стиль, тара, цена)
+    row2.append(InlineKeyboardButton(
+        text="Фильтры",
+        callback_data="show_filters"
+    ))
     
     for btn in row2:
         builder.add(btn)
     
-    # Третий ряд: сброс фильтра (если активен)
-    if current_brewery:
-        builder.row(InlineKeyboardButton(
+    # Третий ряд: сортировка и сброс фильтров (если активны)
+    row3 = [InlineKeyboardButton(
+        text="Сортировка",
+        callback_data="show_sort"
+    )]
+    if filters:
+        row3.append(InlineKeyboardButton(
             text="Показать все",
             callback_data="clear_filter"
         ))
+    builder.row(*row3)
     
     # Кнопки быстрого выбора убраны - теперь только через ввод номера позиции
     
@@ -383,6 +565,20 @@ def get_quantity_keyboard(is_keg: bool) -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
 
 
+def get_undo_keyboard(journal: CartJournal) -> Optional[InlineKeyboardBuilder]:
+    """Создать ряд кнопок отмены/повтора изменений корзины (None, если нечего отменять и повторять)."""
+    buttons = []
+    if journal.can_undo:
+        buttons.append(InlineKeyboardButton(text="Отменить изменение", callback_data="cart_undo"))
+    if journal.can_redo:
+        buttons.append(InlineKeyboardButton(text="Повторить", callback_data="cart_redo"))
+    if not buttons:
+        return None
+    builder = InlineKeyboardBuilder()
+    builder.row(*buttons)
+    return builder
+
+
 @router.message(QuickOrderStates.viewing_page)
 async def handle_position_selection(message: Message, state: FSMContext):
     """Обработка выбора позиции для заказа."""
@@ -399,12 +595,16 @@ async def handle_position_selection(message: Message, state: FSMContext):
             qty = int(parts[1].strip())
             
             data = await state.get_data()
-            items = data.get('items', [])
+            items = await session_catalog(data)
+            if items is None:
+                await catalog_expired(message, state)
+                return
             
             if 1 <= item_idx <= len(items):
                 # Обновляем количество
-                items[item_idx - 1]['заказ'] = qty
-                await state.update_data(items=items)
+                journal = session_journal(data, items)
+                journal.set(item_idx - 1, qty)
+                await state.update_data(**journal.to_state())
                 
                 item_name = items[item_idx - 1]['название']
                 short_name = item_name[:25] + "..." if len(item_name) > 25 else item_name
@@ -413,9 +613,9 @@ async def handle_position_selection(message: Message, state: FSMContext):
                 
                 # Обновляем список
                 current_page = data.get('current_page', 0)
-                brewery_filter = data.get('brewery_filter', None)
+                filters = data.get('filters') or {}
                 list_message_id = data.get('list_message_id')
-                await show_items_page(message, items, current_page, brewery_filter=brewery_filter, edit_message_id=list_message_id, state=state)
+                await show_items_page(message, items, current_page, filters=filters, edit_message_id=list_message_id, state=state)
             else:
                 await message.answer("Ошибка: позиция не найдена")
         except ValueError:
@@ -426,14 +626,17 @@ async def handle_position_selection(message: Message, state: FSMContext):
     try:
         item_idx = int(text)
         data = await state.get_data()
-        items = data.get('items', [])
+        items = await session_catalog(data)
+        if items is None:
+            await catalog_expired(message, state)
+            return
         
         if 1 <= item_idx <= len(items):
             item = items[item_idx - 1]
             item_name = item['название']
             
             # Определяем тип позиции (кега или банка)
-            is_keg = 'кег' in str(item.get('объем', '')).lower()
+            is_keg = bool(item.get('_is_keg'))
             
             # Сохраняем выбранную позицию
             await state.update_data(selected_item_idx=item_idx)
@@ -478,13 +681,17 @@ async def handle_quantity_selection(message: Message, state: FSMContext):
         return
     
     data = await state.get_data()
-    items = data.get('items', [])
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(message, state)
+        return
     selected_item_idx = data.get('selected_item_idx')
     
     if selected_item_idx and 1 <= selected_item_idx <= len(items):
         # Обновляем количество
-        items[selected_item_idx - 1]['заказ'] = qty
-        await state.update_data(items=items)
+        journal = session_journal(data, items)
+        journal.set(selected_item_idx - 1, qty)
+        await state.update_data(**journal.to_state())
         
         item_name = items[selected_item_idx - 1]['название']
         short_name = item_name[:25] + "..." if len(item_name) > 25 else item_name
@@ -493,9 +700,9 @@ async def handle_quantity_selection(message: Message, state: FSMContext):
         
         # Обновляем список
         current_page = data.get('current_page', 0)
-        brewery_filter = data.get('brewery_filter', None)
+        filters = data.get('filters') or {}
         list_message_id = data.get('list_message_id')
-        await show_items_page(message, items, current_page, brewery_filter=brewery_filter, edit_message_id=list_message_id, state=state)
+        await show_items_page(message, items, current_page, filters=filters, edit_message_id=list_message_id, state=state)
         
         await state.set_state(QuickOrderStates.viewing_page)
     else:
@@ -508,12 +715,16 @@ async def handle_pagination(callback: CallbackQuery, state: FSMContext):
     """Обработка пагинации."""
     page = int(callback.data.split(":")[1])
     data = await state.get_data()
-    items = data.get('items', [])
-    brewery_filter = data.get('brewery_filter', None)
+    items = await session_catalog(data)
+    if items is None:
+        await callback.answer()
+        await catalog_expired(callback.message, state)
+        return
+    filters = data.get('filters') or {}
     list_message_id = data.get('list_message_id')
     
     await state.update_data(current_page=page)
-    await show_items_page(callback.message, items, page, brewery_filter=brewery_filter, edit_message_id=list_message_id, state=state)
+    await show_items_page(callback.message, items, page, filters=filters, edit_message_id=list_message_id, state=state)
     await callback.answer()
 
 
@@ -536,36 +747,37 @@ async def handle_finish_callback(callback: CallbackQuery, state: FSMContext):
     await finish_order(callback.message, state)
 
 
-async def show_cart_message(message: Message, items: List[Dict], state: FSMContext):
+async def show_cart_message(message: Message, items: Catalog, state: FSMContext):
     """Показать корзину (вспомогательная функция)."""
-    # Получаем выбранные позиции
-    selected_items = [(i+1, item) for i, item in enumerate(items) if (item.get('заказ') or 0) > 0]
+    # Выбранные позиции - только из заказа пользователя, без прохода по каталогу
+    data = await state.get_data()
+    journal, order, cart = session_cart(data)
+    selected_items = [(pos + 1, items[pos], qty) for pos, qty in sorted(order.items())]
     
     if not selected_items:
-        await message.answer("Корзина пуста\n\nВыберите позиции для заказа.")
+        # Очистку корзины можно отменить прямо отсюда
+        undo_keyboard = get_undo_keyboard(journal)
+        await message.answer(
+            "Корзина пуста\n\nВыберите позиции для заказа.",
+            reply_markup=undo_keyboard.as_markup() if undo_keyboard else None
+        )
         await state.set_state(QuickOrderStates.viewing_page)
         return
     
     # Формируем текст корзины
     text = f"**ВАША КОРЗИНА** ({len(selected_items)} позиций)\n\n"
     
-    # Группируем по пивоварням
+    # Группируем по пивоварням; цена уже в копейках (_price_kop), итог - из итогов корзины
     breweries = {}
-    total_sum = 0.0
+    total_sum = cart['sum_kop'] / 100
     
-    for idx, item in selected_items:
+    for idx, item, qty in selected_items:
         brewery = item.get('пивоварня', 'Без пивоварни')
         if brewery not in breweries:
             breweries[brewery] = []
         
-        qty = item.get('заказ') or 0
-        price_str = str(item.get('цена', '')).replace('руб.', '').strip()
-        try:
-            price = float(price_str)
-            sum_price = price * qty
-            total_sum += sum_price
-        except:
-            sum_price = None
+        price_kop = item.get('_price_kop')
+        sum_price = price_kop * qty / 100 if price_kop is not None else None
         
         breweries[brewery].append((idx, item, qty, sum_price))
     
@@ -603,6 +815,9 @@ async def show_cart_message(message: Message, items: List[Dict], state: FSMConte
     keyboard_builder.row(
         InlineKeyboardButton(text="Завершить заказ", callback_data="finish_order")
     )
+    undo_keyboard = get_undo_keyboard(journal)
+    if undo_keyboard:
+        keyboard_builder.attach(undo_keyboard)
     
     await message.answer(text, parse_mode="Markdown", reply_markup=keyboard_builder.as_markup())
     await state.set_state(QuickOrderStates.viewing_cart)
@@ -613,8 +828,32 @@ async def handle_show_cart(callback: CallbackQuery, state: FSMContext):
     """Показать корзину."""
     await callback.answer()
     data = await state.get_data()
-    items = data.get('items', [])
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(callback.message, state)
+        return
+    
+    await show_cart_message(callback.message, items, state)
+
+
+@router.callback_query(F.data.in_({"cart_undo", "cart_redo"}))
+async def handle_cart_undo_redo(callback: CallbackQuery, state: FSMContext):
+    """Отменить или повторить последнее изменение корзины."""
+    data = await state.get_data()
+    items = await session_catalog(data)
+    if items is None:
+        await callback.answer()
+        await catalog_expired(callback.message, state)
+        return
+    journal = session_journal(data, items)
+    
+    changed = journal.undo() if callback.data == "cart_undo" else journal.redo()
+    if not changed:
+        await callback.answer("Нечего отменять" if callback.data == "cart_undo" else "Нечего повторять")
+        return
     
+    await state.update_data(**journal.to_state())
+    await callback.answer("Изменение отменено" if callback.data == "cart_undo" else "Изменение повторено")
     await show_cart_message(callback.message, items, state)
 
 
@@ -623,12 +862,15 @@ async def handle_back_to_list(callback: CallbackQuery, state: FSMContext):
     """Вернуться к списку позиций."""
     await callback.answer()
     data = await state.get_data()
-    items = data.get('items', [])
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(callback.message, state)
+        return
     current_page = data.get('current_page', 0)
-    brewery_filter = data.get('brewery_filter', None)
+    filters = data.get('filters') or {}
     list_message_id = data.get('list_message_id')
     
-    await show_items_page(callback.message, items, current_page, brewery_filter=brewery_filter, edit_message_id=list_message_id, state=state)
+    await show_items_page(callback.message, items, current_page, filters=filters, edit_message_id=list_message_id, state=state)
     await state.set_state(QuickOrderStates.viewing_page)
 
 
@@ -636,88 +878,274 @@ async def handle_back_to_list(callback: CallbackQuery, state: FSMContext):
 async def handle_clear_cart(callback: CallbackQuery, state: FSMContext):
     """Очистить корзину."""
     data = await state.get_data()
-    items = data.get('items', [])
-    
-    # Очищаем все заказы
-    for item in items:
-        item['заказ'] = 0
+    items = await session_catalog(data)
+    if items is None:
+        await callback.answer()
+        await catalog_expired(callback.message, state)
+        return
     
-    await state.update_data(items=items)
+    # Очищаем заказ (каталог общий и не изменяется); очистку можно отменить
+    journal = session_journal(data, items)
+    journal.clear()
+    await state.update_data(**journal.to_state())
     await callback.answer("Корзина очищена")
     
     current_page = data.get('current_page', 0)
-    brewery_filter = data.get('brewery_filter', None)
+    filters = data.get('filters') or {}
     list_message_id = data.get('list_message_id')
-    await show_items_page(callback.message, items, current_page, brewery_filter=brewery_filter, edit_message_id=list_message_id, state=state)
+    await show_items_page(callback.message, items, current_page, filters=filters, edit_message_id=list_message_id, state=state)
     await state.set_state(QuickOrderStates.viewing_page)
 
 
-@router.callback_query(F.data == "show_breweries")
-async def handle_show_breweries(callback: CallbackQuery, state: FSMContext):
-    """Показать список пивоварен для фильтрации."""
+# Значений фасета на одной странице клавиатуры
+FACET_VALUES_PER_PAGE = 10
+
+
+def get_filters_menu(filters: Dict[str, str]):
+    """
+    Меню фильтров: текущие значения фасетов и кнопки выбора.
+
+    Args:
+        filters: Текущие фильтры {фасет: значение}
+
+    Returns:
+        tuple: Текст и клавиатура
+    """
+    text = "**ФИЛЬТРЫ**\n\n"
+    for facet, title in FACET_TITLES.items():
+        text += f"{title}: {filters.get(facet, 'все')}\n"
+    text += "\nВыберите, по чему фильтровать:"
+    
+    builder = InlineKeyboardBuilder()
+    for facet, title in FACET_TITLES.items():
+        builder.add(InlineKeyboardButton(text=title, callback_data=f"facet:{facet}:0"))
+    builder.adjust(2)
+    if filters:
+        builder.row(InlineKeyboardButton(text="Показать все", callback_data="clear_filter"))
+    builder.row(InlineKeyboardButton(text="< Назад", callback_data="back_to_list"))
+    return text, builder.as_markup()
+
+
+@router.callback_query(F.data == "show_filters")
+async def handle_show_filters(callback: CallbackQuery, state: FSMContext):
+    """Показать фильтры: пивоварня, стиль, тара, цена."""
     await callback.answer()
     data = await state.get_data()
-    items = data.get('items', [])
-    
-    # Получаем уникальные пивоварни с подсчетом позиций
-    breweries_count = {}
-    for item in items:
-        brewery = item.get('пивоварня', 'Без пивоварни')
-        breweries_count[brewery] = breweries_count.get(brewery, 0) + 1
+    text, markup = get_filters_menu(data.get('filters') or {})
+    await callback.message.answer(text, parse_mode="Markdown", reply_markup=markup)
+
+
+@router.callback_query(F.data == "filters_menu")
+async def handle_filters_menu(callback: CallbackQuery, state: FSMContext):
+    """Вернуться из значений фасета в меню фильтров."""
+    await callback.answer()
+    data = await state.get_data()
+    text, markup = get_filters_menu(data.get('filters') or {})
+    await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=markup)
+
+
+@router.callback_query(F.data.startswith("facet:"))
+async def handle_facet_values(callback: CallbackQuery, state: FSMContext):
+    """Показать значения фасета с количеством позиций (с учетом остальных фильтров)."""
+    _, facet, page = callback.data.split(":")
+    page = int(page)
+    data = await state.get_data()
+    filters = data.get('filters') or {}
+    facets = await session_facets(data)
+    if facets is None or facet not in FACET_TITLES:
+        await callback.answer("Сначала загрузите прайс-лист")
+        return
+    await callback.answer()
     
-    # Формируем текст
-    text = "**ФИЛЬТР ПО ПИВОВАРНЯМ**\n\n"
-    text += "Выберите пивоварню для фильтрации:\n\n"
+    # Счетчики - одна операция над матрицей фасета, без прохода по позициям
+    counts = facets.counts(facet, filters)
+    values = [
+        (value_idx, value, counts[value])
+        for value_idx, value in enumerate(facets.values(facet))
+        if counts[value] > 0 or filters.get(facet) == value
+    ]
+    total_pages = max(1, (len(values) + FACET_VALUES_PER_PAGE - 1) // FACET_VALUES_PER_PAGE)
+    page = min(max(page, 0), total_pages - 1)
+    start = page * FACET_VALUES_PER_PAGE
     
-    # Кнопки пивоварен
     builder = InlineKeyboardBuilder()
-    for brewery, count in sorted(breweries_count.items()):
+    for value_idx, value, count in values[start:start + FACET_VALUES_PER_PAGE]:
+        mark = "✓ " if filters.get(facet) == value else ""
         builder.row(InlineKeyboardButton(
-            text=f"{brewery} ({count})",
-            callback_data=f"filter_brewery:{brewery}"
+            text=f"{mark}{value} ({count})",
+            callback_data=f"facet_set:{facet}:{value_idx}"
         ))
     
-    builder.row(InlineKeyboardButton(
-        text="< Назад",
-        callback_data="back_to_list"
-    ))
-    
-    await callback.message.answer(text, parse_mode="Markdown", reply_markup=builder.as_markup())
+    if total_pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton(text="◀️", callback_data=f"facet:{facet}:{page - 1}"))
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="page_info"))
+        if page < total_pages - 1:
+            nav.append(InlineKeyboardButton(text="▶️", callback_data=f"facet:{facet}:{page + 1}"))
+        builder.row(*nav)
+    
+    if facet in filters:
+        builder.row(InlineKeyboardButton(text="Любая", callback_data=f"facet_clear:{facet}"))
+    builder.row(InlineKeyboardButton(text="< Назад", callback_data="filters_menu"))
+    
+    # Меню фильтров и листание значений - одно и то же сообщение
+    text = f"**ФИЛЬТР: {FACET_TITLES[facet].upper()}**\n\nВыберите значение:"
+    await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=builder.as_markup())
 
 
-@router.callback_query(F.data.startswith("filter_brewery:"))
-async def handle_filter_brewery(callback: CallbackQuery, state: FSMContext):
-    """Применить фильтр по пивоварне."""
-    brewery = callback.data.split(":", 1)[1]
-    await callback.answer(f"Фильтр: {brewery}")
+async def apply_list_view(callback: CallbackQuery, state: FSMContext, page: int = 0, **changes):
+    """
+    Сохранить фильтры или сортировку и показать страницу списка.
     
+    Args:
+        callback: Callback query
+        state: FSM состояние
+        page: Номер страницы
+        **changes: Новые значения filters и/или sort
+    """
+    await state.update_data(**changes, current_page=page)
     data = await state.get_data()
-    items = data.get('items', [])
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(callback.message, state)
+        return
     list_message_id = data.get('list_message_id')
     
-    # Сохраняем фильтр
-    await state.update_data(brewery_filter=brewery, current_page=0)
-    
-    sent_msg = await show_items_page(callback.message, items, 0, brewery_filter=brewery, edit_message_id=list_message_id, state=state)
+    sent_msg = await show_items_page(callback.message, items, page, filters=data.get('filters') or {}, edit_message_id=list_message_id, state=state)
     if sent_msg:
         await state.update_data(list_message_id=sent_msg.message_id)
     await state.set_state(QuickOrderStates.viewing_page)
 
 
+@router.callback_query(F.data.startswith("facet_set:"))
+async def handle_facet_set(callback: CallbackQuery, state: FSMContext):
+    """Применить значение фасета (вместе с остальными фильтрами)."""
+    _, facet, value_idx = callback.data.split(":")
+    data = await state.get_data()
+    facets = await session_facets(data)
+    values = facets.values(facet) if facets and facet in FACET_TITLES else []
+    if not 0 <= int(value_idx) < len(values):
+        await callback.answer("Фильтр устарел, откройте фильтры заново")
+        return
+    
+    value = values[int(value_idx)]
+    await callback.answer(f"Фильтр: {value}")
+    # Новый словарь: сохраненный в состоянии не изменяем на месте
+    filters = {**(data.get('filters') or {}), facet: value}
+    await apply_list_view(callback, state, filters=filters)
+
+
+@router.callback_query(F.data.startswith("facet_clear:"))
+async def handle_facet_clear(callback: CallbackQuery, state: FSMContext):
+    """Снять фильтр одного фасета."""
+    facet = callback.data.split(":", 1)[1]
+    await callback.answer("Фильтр снят")
+    data = await state.get_data()
+    filters = {key: value for key, value in (data.get('filters') or {}).items() if key != facet}
+    await apply_list_view(callback, state, filters=filters)
+
+
 @router.callback_query(F.data == "clear_filter")
 async def handle_clear_filter(callback: CallbackQuery, state: FSMContext):
-    """Сбросить фильтр по пивоварне."""
-    await callback.answer("Фильтр сброшен")
+    """Сбросить все фильтры."""
+    await callback.answer("Фильтры сброшены")
+    await apply_list_view(callback, state, filters={})
+
+
+def get_sort_menu(sort: str):
+    """
+    Меню сортировки: варианты (текущий отмечен) и переход к букве.
+
+    Args:
+        sort: Текущая сортировка
+
+    Returns:
+        tuple: Текст и клавиатура
+    """
+    text = f"**СОРТИРОВКА**\n\nСейчас: {SORT_TITLES.get(sort, sort)}"
     
+    builder = InlineKeyboardBuilder()
+    for key, title in SORT_TITLES.items():
+        mark = "✓ " if key == sort else ""
+        builder.add(InlineKeyboardButton(text=f"{mark}{title}", callback_data=f"sort_set:{key}"))
+    builder.adjust(2)
+    builder.row(InlineKeyboardButton(text="К букве", callback_data="sort_letters"))
+    builder.row(InlineKeyboardButton(text="< Назад", callback_data="back_to_list"))
+    return text, builder.as_markup()
+
+
+@router.callback_query(F.data == "show_sort")
+async def handle_show_sort(callback: CallbackQuery, state: FSMContext):
+    """Показать варианты сортировки списка."""
+    await callback.answer()
     data = await state.get_data()
-    items = data.get('items', [])
-    list_message_id = data.get('list_message_id')
+    text, markup = get_sort_menu(data.get('sort') or SORT_CATALOG)
+    await callback.message.answer(text, parse_mode="Markdown", reply_markup=markup)
+
+
+@router.callback_query(F.data == "sort_menu")
+async def handle_sort_menu(callback: CallbackQuery, state: FSMContext):
+    """Вернуться из выбора буквы в меню сортировки."""
+    await callback.answer()
+    data = await state.get_data()
+    text, markup = get_sort_menu(data.get('sort') or SORT_CATALOG)
+    await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=markup)
+
+
+@router.callback_query(F.data.startswith("sort_set:"))
+async def handle_sort_set(callback: CallbackQuery, state: FSMContext):
+    """Применить сортировку (перестановка готова, список не сортируется заново)."""
+    sort = callback.data.split(":", 1)[1]
+    if sort not in SORT_TITLES:
+        await callback.answer()
+        return
+    await callback.answer(f"Сортировка: {SORT_TITLES[sort]}")
+    await apply_list_view(callback, state, sort=sort)
+
+
+@router.callback_query(F.data == "sort_letters")
+async def handle_sort_letters(callback: CallbackQuery, state: FSMContext):
+    """Показать первые буквы названий для перехода."""
+    data = await state.get_data()
+    sorts = await session_sorts(data)
+    if sorts is None:
+        await callback.answer("Сначала загрузите прайс-лист")
+        return
+    await callback.answer()
     
-    await state.update_data(brewery_filter=None, current_page=0)
-    sent_msg = await show_items_page(callback.message, items, 0, edit_message_id=list_message_id, state=state)
-    if sent_msg:
-        await state.update_data(list_message_id=sent_msg.message_id)
-    await state.set_state(QuickOrderStates.viewing_page)
+    builder = InlineKeyboardBuilder()
+    for letter_idx, letter in enumerate(sorts.letters()):
+        builder.add(InlineKeyboardButton(text=letter, callback_data=f"sort_letter:{letter_idx}"))
+    builder.adjust(8)
+    builder.row(InlineKeyboardButton(text="< Назад", callback_data="sort_menu"))
+    
+    await callback.message.edit_text(
+        "**ПЕРЕХОД К БУКВЕ**\n\nСписок будет отсортирован по названию.",
+        parse_mode="Markdown", reply_markup=builder.as_markup()
+    )
+
+
+@router.callback_query(F.data.startswith("sort_letter:"))
+async def handle_sort_letter(callback: CallbackQuery, state: FSMContext):
+    """Отсортировать по названию и открыть страницу с первой позицией на букву."""
+    letter_idx = int(callback.data.split(":", 1)[1])
+    data = await state.get_data()
+    sorts = await session_sorts(data)
+    letters = sorts.letters() if sorts else []
+    if not 0 <= letter_idx < len(letters):
+        await callback.answer("Список устарел, откройте сортировку заново")
+        return
+    
+    letter = letters[letter_idx]
+    await callback.answer(f"Буква {letter}")
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(callback.message, state)
+        return
+    view = await session_view(data, items, data.get('filters') or {}, SORT_NAME, state)
+    page = min(sorts.letter_index(view, letter), max(len(view) - 1, 0)) // ITEMS_PER_PAGE
+    await apply_list_view(callback, state, page=page, sort=SORT_NAME)
 
 
 @router.callback_query(F.data == "start_search")
@@ -742,10 +1170,13 @@ async def process_search(message: Message, state: FSMContext):
     """Обработать поисковый запрос."""
     if message.text == "/cancel":
         data = await state.get_data()
-        items = data.get('items', [])
+        items = await session_catalog(data)
+        if items is None:
+            await catalog_expired(message, state)
+            return
         current_page = data.get('current_page', 0)
-        brewery_filter = data.get('brewery_filter', None)
-        sent_msg = await show_items_page(message, items, current_page, brewery_filter=brewery_filter, state=state)
+        filters = data.get('filters') or {}
+        sent_msg = await show_items_page(message, items, current_page, filters=filters, state=state)
         if sent_msg:
             await state.update_data(list_message_id=sent_msg.message_id)
         await state.set_state(QuickOrderStates.viewing_page)
@@ -753,17 +1184,19 @@ async def process_search(message: Message, state: FSMContext):
     
     search_query = message.text.lower().strip()
     data = await state.get_data()
-    items = data.get('items', [])
-    
-    # Ищем совпадения
-    found_items = []
-    for i, item in enumerate(items):
-        name = item.get('название', '').lower()
-        brewery = item.get('пивоварня', '').lower()
-        style = item.get('стиль', '').lower()
-        
-        if search_query in name or search_query in brewery or search_query in style:
-            found_items.append((i+1, item))
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(message, state)
+        return
+    _, order, _ = session_cart(data)
+    
+    # Ищем по триграммному индексу каталога (строится один раз, при первом поиске):
+    # результаты ранжированы, "хеллес" находит "Helles", опечатка в букве не мешает
+    index = None
+    if items:
+        index = await asyncio.to_thread(catalog_store.search_index, data.get('catalog_key'))
+    positions = index.search(search_query) if index else []
+    found_items = [(pos + 1, items[pos]) for pos in positions]
     
     if not found_items:
         await message.answer(f"Ничего не найдено по запросу: `{search_query}`\n\nПопробуйте другой запрос.", parse_mode="Markdown")
@@ -779,7 +1212,7 @@ async def process_search(message: Message, state: FSMContext):
         if len(name) > 35:
             name = name[:35] + "..."
         
-        qty = item.get('заказ') or 0
+        qty = order.get(idx - 1, 0)
         checkbox = "✓" if qty > 0 else " "
         
         brewery = item.get('пивоварня', '')
@@ -812,7 +1245,10 @@ async def process_search(message: Message, state: FSMContext):
 async def process_cart_edit(message: Message, state: FSMContext):
     """Обработать редактирование из корзины."""
     data = await state.get_data()
-    items = data.get('items', [])
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(message, state)
+        return
     
     # Парсим изменения
     text = message.text.replace(',', ' ')
@@ -835,11 +1271,12 @@ async def process_cart_edit(message: Message, state: FSMContext):
     
     # Применяем изменения
     updated_items = []
+    journal = session_journal(data, items)
+    journal.bulk((num - 1, qty) for num, qty in changes.items())
     for num, qty in changes.items():
-        items[num - 1]['заказ'] = qty
         updated_items.append((num, qty, items[num-1]['название']))
     
-    await state.update_data(items=items)
+    await state.update_data(**journal.to_state())
     
     # Сообщаем об изменениях
     change_text = "Обновлено:\n"
@@ -866,7 +1303,10 @@ async def process_quantities(message: Message, state: FSMContext):
         return
     
     data = await state.get_data()
-    items = data.get('items', [])
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(message, state)
+        return
     
     # Парсим введенные номера с количеством
     text = message.text.replace(',', ' ')
@@ -902,13 +1342,12 @@ async def process_quantities(message: Message, state: FSMContext):
         )
         return
     
-    # Обновляем количество в items
-    for num, qty in quantities.items():
-        if 1 <= num <= len(items):
-            items[num - 1]['заказ'] = qty  # Индексация с 0
+    # Обновляем количество в заказе
+    journal = session_journal(data, items)
+    journal.bulk((num - 1, qty) for num, qty in quantities.items() if 1 <= num <= len(items))  # Индексация с 0
     
-    # Сохраняем обновленные данные
-    await state.update_data(items=items)
+    # Сохраняем обновленные данные (в журнал дописывается одна операция)
+    await state.update_data(**journal.to_state())
     
     # Показываем что добавлено
     selected_count = len(quantities)
@@ -939,19 +1378,24 @@ async def process_quantities(message: Message, state: FSMContext):
 async def finish_order(message: Message, state: FSMContext):
     """Завершить заказ и сгенерировать Excel."""
     data = await state.get_data()
-    file_path = data.get('file_path')
     filename = data.get('filename')
-    items = data.get('items', [])
+    items = await session_catalog(data)
+    if items is None:
+        await catalog_expired(message, state)
+        return
     
-    # Проверяем есть ли выбранные позиции
-    selected_items = [item for item in items if (item.get('заказ') or 0) > 0]
+    # Выбранные позиции: копии позиций каталога с количеством из заказа пользователя
+    _, order, _ = session_cart(data)
+    selected_items = order_lines(items, order)
     if not selected_items:
         await message.answer("Вы не выбрали ни одной позиции для заказа.\n\nСоздается пустой файл.")
     
     await message.answer("Генерация Excel файла...")
     
-    # Генерируем Excel с заполненной колонкой "Заказ"
-    excel_bytes = generate_excel_with_order(items, file_path)
+    # Оригинал не хранится между сообщениями - скачиваем его в память заново
+    with await download_document(message, data.get('file_id')) as original:
+        # Генерируем Excel с заполненной колонкой "Заказ"
+        excel_bytes = await asyncio.to_thread(generate_excel_with_order, selected_items, original, filename)
     
     # Формируем имя файла: Число.месяц.год-название поставщика.расширение
     now = datetime.now()
@@ -1005,7 +1449,7 @@ async def finish_order(message: Message, state: FSMContext):
             session,
             user_id=user.id,
             filename=filename,
-            original_data=json.dumps(items, ensure_ascii=False),
+            original_data=json.dumps([dict(item) for item in items], ensure_ascii=False),
             order_data=json.dumps(selected_items, ensure_ascii=False)
         )
     
@@ -1022,14 +1466,15 @@ async def finish_order(message: Message, state: FSMContext):
     await state.clear()
 
 
-def generate_excel_with_order(items: List[Dict], original_file_path: str) -> BytesIO:
+def generate_excel_with_order(items: List[Dict], original_file_path: Union[str, BinaryIO], filename: str = None) -> BytesIO:
     """
     Сгенерировать Excel файл с заполненной колонкой "Заказ" в оригинальных листах.
     Сохраняет ВСЁ форматирование оригинала.
     
     Args:
         items: Список позиций с количеством заказа
-        original_file_path: Путь к оригинальному файлу
+        original_file_path: Путь к оригинальному файлу или его содержимое (двоичный поток)
+        filename: Имя файла, если оригинал передан потоком
         
     Returns:
         BytesIO: Excel файл в памяти
@@ -1043,19 +1488,20 @@ def generate_excel_with_order(items: List[Dict], original_file_path: str) -> Byt
         if name and qty and qty > 0:
             name_to_qty[(name, sheet_idx)] = qty
     
-    # Если файл в формате .xls, конвертируем в .xlsx
     file_to_open = original_file_path
-    temp_xlsx_path = None
+    if hasattr(original_file_path, 'seek'):
+        original_file_path.seek(0)
     
-    if original_file_path.endswith('.xls'):
+    # Если файл в формате .xls, конвертируем в .xlsx (в памяти)
+    if (filename or str(original_file_path)).lower().endswith('.xls'):
         # Конвертируем .xls в .xlsx через pandas
-        temp_xlsx_path = original_file_path.replace('.xls', '_temp.xlsx')
+        file_to_open = BytesIO()
         xls = pd.ExcelFile(original_file_path, engine='xlrd')
-        with pd.ExcelWriter(temp_xlsx_path, engine='openpyxl') as writer:
+        with pd.ExcelWriter(file_to_open, engine='openpyxl') as writer:
             for sheet_name in xls.sheet_names:
                 df = pd.read_excel(xls, sheet_name=sheet_name)
                 df.to_excel(writer, sheet_name=sheet_name, index=False)
-        file_to_open = temp_xlsx_path
+        file_to_open.seek(0)
     
     # Открываем файл через openpyxl (сохраняет форматирование для .xlsx)
     wb = load_workbook(file_to_open)
@@ -1123,12 +1569,5 @@ def generate_excel_with_order(items: List[Dict], original_file_path: str) -> Byt
     wb.save(output)
     output.seek(0)
     
-    # Удаляем временный файл если он был создан
-    if temp_xlsx_path and os.path.exists(temp_xlsx_path):
-        try:
-            os.remove(temp_xlsx_path)
-        except Exception:
-            pass  # Игнорируем ошибки удаления
-    
     return output
 
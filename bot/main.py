@@ -8,6 +8,10 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 from bot.handlers import start, quick_order
 from database.crud import init_db
+from core.column_detector import column_model
+from core.parser import shutdown_process_pool
+from core.scheduler import parse_scheduler
+from ml.vectorizer import online_learner
 import config
 
 logger = logging.getLogger(__name__)
@@ -26,6 +30,14 @@ async def main():
     logger.info("Инициализация базы данных...")
     await init_db()
     
+    # Модель классификатора колонок загружается один раз при запуске,
+    # а не при каждой загрузке прайс-листа
+    logger.info("Загрузка модели классификатора колонок...")
+    await asyncio.to_thread(column_model.get)
+    # Модель дообучается на сохраненных примерах до первой загрузки,
+    # дальше - в фоне, после паузы в загрузках прайс-листов
+    await asyncio.to_thread(online_learner.start)
+    
     # Инициализация бота и диспетчера
     bot = Bot(token=config.TELEGRAM_BOT_TOKEN)
     storage = MemoryStorage()
@@ -50,6 +62,9 @@ async def main():
         await dp.start_polling(bot)
     finally:
         await bot.session.close()
+        parse_scheduler.shutdown()
+        shutdown_process_pool()
+        online_learner.shutdown()
 
 
 if __name__ == "__main__":
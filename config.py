@@ -28,9 +28,53 @@ TEMP_DIR = BASE_DIR / "temp_files"
 for directory in [DATA_DIR, UPLOADS_DIR, PROJECTS_DIR, ML_MODELS_DIR, TEMP_DIR]:
     directory.mkdir(parents=True, exist_ok=True)
 
+# Parsing
+# Количество процессов для параллельного разбора листов (0 или 1 - последовательно)
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", "0"))
+
+# Планировщик парсинга: одновременных задач и длина очереди ожидания
+PARSE_MAX_CONCURRENT = int(os.getenv("PARSE_MAX_CONCURRENT", "2"))
+PARSE_MAX_QUEUE = int(os.getenv("PARSE_MAX_QUEUE", "20"))
+
+# Кэш результатов парсинга: LRU в памяти (байты) и каталог на диске
+PARSE_CACHE_DIR = DATA_DIR / "parse_cache"
+PARSE_CACHE_MEMORY_BYTES = int(os.getenv("PARSE_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+PARSE_CACHE_DISK_BYTES = int(os.getenv("PARSE_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+# Загрузка документов: до этого размера (байты) файл держится в памяти, больше - во временном файле
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(32 * 1024 * 1024)))
+
+# Индекс file_unique_id -> хэш: время жизни записи (секунды) и размер
+DOCUMENT_INDEX_TTL = int(os.getenv("DOCUMENT_INDEX_TTL", str(7 * 24 * 3600)))
+DOCUMENT_INDEX_MAX_ENTRIES = int(os.getenv("DOCUMENT_INDEX_MAX_ENTRIES", "10000"))
+
+# Размер LRU-кэша нормализации объема и цены (по исходному значению ячейки)
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "4096"))
+
+# Общие каталоги прайс-листов в памяти (по хэшу файла) вместе с поисковыми индексами,
+# фасетами и сортировками: лимит по оценке размера в байтах
+CATALOG_STORE_MEMORY_BYTES = int(os.getenv("CATALOG_STORE_MEMORY_BYTES", str(128 * 1024 * 1024)))
+
+# Журнал корзины: сколько последних изменений можно отменить
+CART_JOURNAL_MAX_UNDO = int(os.getenv("CART_JOURNAL_MAX_UNDO", "20"))
+
+# Реестр раскладок поставщиков (отпечаток заголовков -> типы колонок)
+LAYOUT_REGISTRY_PATH = DATA_DIR / "layouts.json"
+LAYOUT_REGISTRY_MAX_ENTRIES = int(os.getenv("LAYOUT_REGISTRY_MAX_ENTRIES", "1000"))
+
 # ML Model
 COLUMN_CLASSIFIER_PATH = ML_MODELS_DIR / "column_classifier.pkl"
+# Выгрузка модели для бота (numpy/JSON, без sklearn)
+COLUMN_CLASSIFIER_EXPORT_PATH = ML_MODELS_DIR / "column_classifier.json"
 VECTORIZER_PATH = ML_MODELS_DIR / "vectorizer.pkl"
+# Сколько решений классификатора (название колонки -> тип) хранится в памяти
+COLUMN_TYPE_CACHE_SIZE = int(os.getenv("COLUMN_TYPE_CACHE_SIZE", "4096"))
+
+# Дообучение классификатора колонок: примеры с загруженных прайс-листов,
+# их максимум и задержка фонового дообучения после последнего нового примера
+COLUMN_SAMPLES_PATH = DATA_DIR / "column_samples.json"
+COLUMN_SAMPLES_MAX_ENTRIES = int(os.getenv("COLUMN_SAMPLES_MAX_ENTRIES", "5000"))
+ONLINE_LEARNING_DEBOUNCE_SECONDS = float(os.getenv("ONLINE_LEARNING_DEBOUNCE_SECONDS", "30"))
 
 # Beer styles keywords
 BEER_STYLES = [
@@ -0,0 +1,296 @@
+"""
+Заказ пользователя поверх общего каталога.
+
+Каталог прайс-листа один на всех пользователей и не изменяется
+(core.catalog). Заказ пользователя - разреженный словарь {номер позиции:
+количество}, в нем только выбранные позиции. Итоги корзины (позиции,
+банки, кеги, сумма в копейках) обновляются за O(1) при каждом изменении
+количества: вклад позиции со старым количеством вычитается, с новым -
+прибавляется. Экран списка и корзина читают готовые итоги и не
+перебирают все позиции прайса.
+
+В состоянии диалога заказ хранится журналом операций (CartJournal).
+Текущий заказ и итоги корзины хранятся готовыми вместе с курсором журнала
+(ключ "cart") и обновляются каждой операцией, поэтому экраны их только
+читают. Операция помнит прежние количества, отмена и повтор применяют ее
+в обратную или прямую сторону за время, пропорциональное размеру операции.
+Операции лежат в отдельных ключах состояния - кольцевом буфере из
+max_undo ячеек, поэтому изменение записывает одну операцию и заголовок,
+а не весь журнал.
+"""
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import config
+
+# Операции журнала - короткие списки (сериализуются в JSON как есть),
+# с прежними количествами для отмены:
+# ["s", номер, количество, было] - задать количество позиции
+# ["c", [[номер, было], ...]] - очистить корзину
+# ["b", [[номер, количество, было], ...]] - задать количество нескольким позициям
+OP_SET = "s"
+OP_CLEAR = "c"
+OP_BULK = "b"
+
+# Ключи журнала в данных диалога: заголовок и ячейки операций
+CART_STATE_KEY = "cart"
+CART_OP_KEY = "cart_op_{}"
+
+
+def empty_cart() -> Dict[str, int]:
+    """
+    Итоги пустой корзины.
+
+    Returns:
+        Dict[str, int]: Счетчики positions, cans, kegs и sum_kop
+    """
+    return {"positions": 0, "cans": 0, "kegs": 0, "sum_kop": 0}
+
+
+def initial_order(catalog: Sequence[Mapping]) -> Dict[int, int]:
+    """
+    Заказ, уже заполненный в загруженном файле (колонка "Заказ").
+
+    Args:
+        catalog: Позиции каталога
+
+    Returns:
+        Dict[int, int]: {номер позиции: количество}
+    """
+    return {pos: item['заказ'] for pos, item in enumerate(catalog) if (item.get('заказ') or 0) > 0}
+
+
+def cart_totals(catalog: Sequence[Mapping], order: Dict[int, int]) -> Dict[str, int]:
+    """
+    Посчитать итоги корзины по заказу (проход только по выбранным позициям).
+
+    Args:
+        catalog: Позиции каталога
+        order: Заказ {номер позиции: количество}
+
+    Returns:
+        Dict[str, int]: Итоги корзины
+    """
+    cart = empty_cart()
+    for pos, qty in order.items():
+        _apply(cart, catalog[pos], qty, 1)
+    return cart
+
+
+def set_quantity(catalog: Sequence[Mapping], order: Dict[int, int], cart: Dict[str, int],
+                 pos: int, qty: Optional[int]):
+    """
+    Изменить количество позиции в заказе и обновить итоги корзины за O(1).
+
+    Нулевое или отрицательное количество удаляет позицию из заказа.
+
+    Args:
+        catalog: Позиции каталога
+        order: Заказ (изменяется на месте)
+        cart: Итоги корзины (изменяются на месте)
+        pos: Номер позиции (с 0)
+        qty: Новое количество
+    """
+    item = catalog[pos]
+    _apply(cart, item, order.pop(pos, None), -1)
+    if (qty or 0) > 0:
+        order[pos] = qty
+        _apply(cart, item, qty, 1)
+
+
+def order_lines(catalog: Sequence[Mapping], order: Dict[int, int]) -> List[Dict]:
+    """
+    Выбранные позиции с количеством (в порядке каталога).
+
+    Args:
+        catalog: Позиции каталога
+        order: Заказ {номер позиции: количество}
+
+    Returns:
+        List[Dict]: Копии позиций с заполненным полем "заказ"
+    """
+    return [{**catalog[pos], 'заказ': qty} for pos, qty in sorted(order.items())]
+
+
+def _apply(cart: Dict[str, int], item: Mapping, qty: Optional[int], sign: int):
+    """Прибавить (sign=1) или вычесть (sign=-1) вклад позиции в итоги."""
+    qty = qty or 0
+    if qty <= 0:
+        return
+    cart["positions"] += sign
+    if item.get('_is_keg'):
+        cart["kegs"] += sign * qty
+    else:
+        cart["cans"] += sign * qty
+    price_kop = item.get('_price_kop')
+    if price_kop:
+        cart["sum_kop"] += sign * price_kop * qty
+
+
+class CartJournal:
+    """Журнал изменений заказа с готовым текущим заказом, отменой и повтором."""
+
+    def __init__(self, catalog: Optional[Sequence[Mapping]] = None, order: Optional[Dict[int, int]] = None,
+                 max_undo: int = config.CART_JOURNAL_MAX_UNDO):
+        """
+        Новый журнал (например, при загрузке прайс-листа).
+
+        Args:
+            catalog: Позиции каталога (нужны для изменений и итогов; без него журнал только читается)
+            order: Начальный заказ {номер позиции: количество}
+            max_undo: Сколько последних операций можно отменить (размер кольцевого буфера)
+        """
+        self.catalog = catalog
+        self.max_undo = max_undo
+        self.order = dict(order or {})
+        self.cart = cart_totals(catalog, self.order) if self.order else empty_cart()
+        self.start = 0  # Номер самой старой операции, которую можно отменить
+        self.cursor = 0  # Количество примененных операций
+        self.end = 0  # Количество записанных операций (после курсора - отмененные)
+        self._data: Mapping = {}
+        self._ops: Dict[int, list] = {}  # Прочитанные и новые операции по номеру
+        self._written: Dict[int, list] = {}  # Операции, которые нужно записать
+        self._order_copied = True
+
+    @classmethod
+    def from_state(cls, data: Optional[Mapping], catalog: Optional[Sequence[Mapping]] = None,
+                   max_undo: int = config.CART_JOURNAL_MAX_UNDO) -> "CartJournal":
+        """
+        Восстановить журнал из данных диалога (операции читаются только при отмене и повторе).
+
+        Args:
+            data: Данные состояния (None - пустой журнал)
+            catalog: Позиции каталога (нужны для изменений)
+            max_undo: Размер кольцевого буфера операций
+
+        Returns:
+            CartJournal: Журнал
+        """
+        journal = cls(catalog, max_undo=max_undo)
+        head = (data or {}).get(CART_STATE_KEY)
+        if not head:
+            return journal
+        order = head["order"]
+        # Хранилище с JSON превращает ключи словаря в строки
+        if order and isinstance(next(iter(order)), str):
+            order = {int(pos): qty for pos, qty in order.items()}
+        journal.order = order
+        journal.cart = head["totals"]
+        journal.start, journal.cursor, journal.end = head["start"], head["cursor"], head["end"]
+        journal._data = data
+        journal._order_copied = False
+        return journal
+
+    def to_state(self) -> Dict:
+        """
+        Изменения для состояния диалога (state.update_data): заголовок и новые операции.
+
+        Заказ и итоги в заголовке - новые объекты при каждом изменении,
+        сохраненные значения не изменяются на месте.
+
+        Returns:
+            Dict: {ключ: значение}
+        """
+        state = {
+            CART_STATE_KEY: {
+                "order": self.order,
+                "totals": self.cart,
+                "start": self.start,
+                "cursor": self.cursor,
+                "end": self.end,
+            }
+        }
+        for index, op in self._written.items():
+            state[CART_OP_KEY.format(index % self.max_undo)] = op
+        self._written = {}
+        # Следующее изменение не должно менять переданные в состояние объекты
+        self._order_copied = False
+        return state
+
+    def set(self, pos: int, qty: Optional[int]):
+        """Задать количество позиции (0 - удалить из корзины)."""
+        self._append([OP_SET, pos, qty, self.order.get(pos)])
+
+    def clear(self):
+        """Очистить корзину."""
+        self._append([OP_CLEAR, [[pos, qty] for pos, qty in self.order.items()]])
+
+    def bulk(self, changes: Iterable[Tuple[int, Optional[int]]]):
+        """Задать количество нескольким позициям одной операцией (отменяется целиком)."""
+        before = dict(self.order)
+        op = []
+        for pos, qty in changes:
+            op.append([pos, qty, before.get(pos)])
+            before[pos] = qty
+        self._append([OP_BULK, op])
+
+    @property
+    def can_undo(self) -> bool:
+        return self.cursor > self.start
+
+    @property
+    def can_redo(self) -> bool:
+        return self.cursor < self.end
+
+    def undo(self) -> bool:
+        """
+        Отменить последнюю операцию.
+
+        Returns:
+            bool: True, если было что отменять
+        """
+        if not self.can_undo:
+            return False
+        self.cursor -= 1
+        for pos, _, old in reversed(_op_changes(self._op(self.cursor))):
+            self._set(pos, old)
+        return True
+
+    def redo(self) -> bool:
+        """
+        Повторить отмененную операцию.
+
+        Returns:
+            bool: True, если было что повторять
+        """
+        if not self.can_redo:
+            return False
+        for pos, new, _ in _op_changes(self._op(self.cursor)):
+            self._set(pos, new)
+        self.cursor += 1
+        return True
+
+    def _append(self, op: list):
+        """Применить операцию и дописать ее: отмененные операции отбрасываются, старые вытесняются."""
+        for pos, new, _ in _op_changes(op):
+            self._set(pos, new)
+        self.end = self.cursor = self.cursor + 1
+        self.start = max(self.start, self.end - self.max_undo)
+        if self.max_undo:
+            self._ops[self.cursor - 1] = op
+            self._written[self.cursor - 1] = op
+
+    def _op(self, index: int) -> list:
+        """Операция по номеру (из ячейки кольцевого буфера)."""
+        op = self._ops.get(index)
+        if op is None:
+            op = self._data[CART_OP_KEY.format(index % self.max_undo)]
+            self._ops[index] = op
+        return op
+
+    def _set(self, pos: int, qty: Optional[int]):
+        """Изменить количество в заказе и итоги (сохраненные заказ и итоги не изменяются)."""
+        if self.catalog is None:
+            raise ValueError("для изменения заказа нужен каталог")
+        if not self._order_copied:
+            self.order = dict(self.order)
+            self.cart = dict(self.cart)
+            self._order_copied = True
+        set_quantity(self.catalog, self.order, self.cart, pos, qty)
+
+
+def _op_changes(op: list) -> List[list]:
+    """Изменения количества в операции журнала: [[номер, количество, было], ...]."""
+    if op[0] == OP_SET:
+        return [op[1:]]
+    if op[0] == OP_BULK:
+        return op[1]
+    return [[pos, None, old] for pos, old in op[1]]
@@ -0,0 +1,219 @@
+"""
+Каталог позиций прайс-листа.
+
+Каждая позиция получает при парсинге постоянный номер _pos - индекс
+в списке позиций (номер, который видит пользователь, на единицу больше).
+Отфильтрованные и отсортированные представления каталога - списки
+номеров позиций, поэтому страница списка собирается за O(размер
+страницы) без поиска позиций в полном списке.
+
+Каталог хранится один раз на процесс по хэшу содержимого файла и доступен
+только для чтения: пользователи, загрузившие один файл, читают одни и те же
+позиции, а заказ каждого хранится отдельно (core.cart).
+
+Память хранилища ограничена оценкой в байтах, как и у кэша парсинга:
+размер позиций (длина JSON) плюс размер поисковых индексов, фасетов
+и сортировок, построенных для каталога. Давно не использованные каталоги
+вытесняются вместе с производными структурами.
+"""
+import json
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+import config
+from core.parse_cache import ParseCache, parse_cache
+from core.facets import CatalogFacets
+from core.search import SearchIndex
+from core.sorting import CatalogSorts
+
+# Неизменяемый каталог: позиции только для чтения
+Catalog = Tuple[Mapping, ...]
+
+
+def freeze_catalog(items: List[Dict]) -> Catalog:
+    """
+    Сделать каталог неизменяемым (позиции не копируются).
+
+    Args:
+        items: Позиции после парсинга
+
+    Returns:
+        Catalog: Кортеж позиций только для чтения
+    """
+    return tuple(MappingProxyType(item) for item in items)
+
+
+class CatalogStore:
+    """Общие каталоги по хэшу файла; при промахе каталог берется из кэша парсинга."""
+
+    def __init__(self, max_memory_bytes: int, source: Optional[ParseCache] = None):
+        """
+        Инициализация хранилища.
+
+        Args:
+            max_memory_bytes: Лимит памяти каталогов и их производных структур (по оценке);
+                последний использованный каталог остается, даже если он один больше лимита
+            source: Кэш парсинга, из которого восстанавливаются вытесненные каталоги
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.source = source
+        self._catalogs = OrderedDict()  # {хэш: каталог}
+        # Производные структуры каталога {(вид, хэш): объект}: поисковый индекс, фасеты
+        # и сортировки, строятся при первом обращении и вытесняются вместе с каталогом
+        self._derived = {}
+        self._sizes = {}  # {хэш: оценка памяти каталога и его производных структур}
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Catalog]:
+        """
+        Найти каталог по хэшу файла.
+
+        Args:
+            key: Хэш содержимого файла
+
+        Returns:
+            Optional[Catalog]: Каталог или None, если его нет ни в памяти, ни в кэше парсинга
+        """
+        with self._lock:
+            catalog = self._catalogs.get(key)
+            if catalog is not None:
+                self._catalogs.move_to_end(key)
+                return catalog
+
+        items = self.source.get(key) if self.source else None
+        if not items:
+            return None
+        return self.put(key, items)
+
+    def put(self, key: str, items: List[Dict]) -> Catalog:
+        """
+        Сохранить каталог (если он уже есть - вернуть существующий).
+
+        Args:
+            key: Хэш содержимого файла
+            items: Позиции после парсинга
+
+        Returns:
+            Catalog: Общий каталог
+        """
+        with self._lock:
+            catalog = self._catalogs.get(key)
+            if catalog is not None:
+                self._catalogs.move_to_end(key)
+                return catalog
+
+        # Оценка как в кэше парсинга (длина JSON позиций) - вне блокировки
+        size = len(json.dumps(items, ensure_ascii=False))
+        with self._lock:
+            catalog = self._catalogs.get(key)
+            if catalog is None:
+                catalog = freeze_catalog(items)
+                self._catalogs[key] = catalog
+                self._sizes[key] = size
+                self._memory_bytes += size
+            self._catalogs.move_to_end(key)
+            self._trim()
+            return catalog
+
+    def search_index(self, key: str) -> Optional[SearchIndex]:
+        """
+        Поисковый индекс каталога (строится один раз на каталог).
+
+        Args:
+            key: Хэш содержимого файла
+
+        Returns:
+            Optional[SearchIndex]: Индекс или None, если каталога нет
+        """
+        return self._get_derived("search", key, SearchIndex)
+
+    def facets(self, key: str) -> Optional[CatalogFacets]:
+        """
+        Фасеты каталога для фильтров (строятся один раз на каталог).
+
+        Args:
+            key: Хэш содержимого файла
+
+        Returns:
+            Optional[CatalogFacets]: Фасеты или None, если каталога нет
+        """
+        return self._get_derived("facets", key, CatalogFacets)
+
+    def sorts(self, key: str) -> Optional[CatalogSorts]:
+        """
+        Перестановки сортировок каталога (строятся один раз на каталог).
+
+        Args:
+            key: Хэш содержимого файла
+
+        Returns:
+            Optional[CatalogSorts]: Сортировки или None, если каталога нет
+        """
+        return self._get_derived("sorts", key, CatalogSorts)
+
+    def _get_derived(self, kind: str, key: str, factory):
+        """Получить или построить производную структуру каталога."""
+        with self._lock:
+            derived = self._derived.get((kind, key))
+        if derived is not None:
+            return derived
+
+        catalog = self.get(key)
+        if catalog is None:
+            return None
+        derived = factory(catalog)
+        with self._lock:
+            if key in self._catalogs:
+                if (kind, key) in self._derived:
+                    return self._derived[(kind, key)]
+                self._derived[(kind, key)] = derived
+                self._sizes[key] += derived.nbytes
+                self._memory_bytes += derived.nbytes
+                self._trim()
+        return derived
+
+    def _trim(self):
+        """Вытеснить давно не использованные каталоги сверх лимита памяти (под блокировкой)."""
+        while self._memory_bytes > self.max_memory_bytes and len(self._catalogs) > 1:
+            evicted, _ = self._catalogs.popitem(last=False)
+            self._memory_bytes -= self._sizes.pop(evicted)
+            for derived_key in [k for k in self._derived if k[1] == evicted]:
+                del self._derived[derived_key]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Размер хранилища.
+
+        Returns:
+            Dict[str, int]: Количество каталогов, поисковых индексов, позиций в каталогах
+                и оценка занятой памяти
+        """
+        with self._lock:
+            return {
+                "entries": len(self._catalogs),
+                "indexes": sum(kind == "search" for kind, _ in self._derived),
+                "items": sum(len(catalog) for catalog in self._catalogs.values()),
+                "memory_bytes": self._memory_bytes,
+            }
+
+
+def page_positions(view: Sequence[int], page: int, items_per_page: int) -> Sequence[int]:
+    """
+    Номера позиций одной страницы представления.
+
+    Args:
+        view: Номера позиций представления
+        page: Номер страницы (с 0)
+        items_per_page: Позиций на странице
+
+    Returns:
+        Sequence[int]: Номера позиций страницы
+    """
+    start = page * items_per_page
+    return view[start:start + items_per_page]
+
+
+# Общее хранилище процесса
+catalog_store = CatalogStore(max_memory_bytes=config.CATALOG_STORE_MEMORY_BYTES, source=parse_cache)
@@ -1,28 +1,475 @@
 """
 ML-классификатор для определения типа колонок в Excel.
+
+Обученная модель загружается один раз на процесс (SharedModel) и только
+читается всеми парсерами и потоками. Перед использованием проверяется
+отметка файла модели (время изменения и размер): модель загружается
+заново, только если файл изменился, например после дообучения.
+
+Во время работы бота модель читается из выгрузки в JSON (словарь n-грамм,
+веса IDF и логарифмы вероятностей классов) и считается на numpy
+(ExportedClassifier), поэтому sklearn нужен только для обучения.
 """
-import pickle
-from typing import Optional
+import json
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
 from pathlib import Path
+import numpy as np
 import config
 
+# Версия формата выгрузки модели (ml.train_detector.export_classifier)
+EXPORT_FORMAT_VERSION = 1
+
+# Последовательности пробельных символов (как в TfidfVectorizer для analyzer='char')
+_WHITE_SPACES_RE = re.compile(r"\s\s+")
+
+# Отметка "модель еще не загружалась" (отличается от None - "файла нет")
+_NOT_LOADED = object()
+
+
+class ColumnRule(NamedTuple):
+    """Правило классификации колонки по названию (в нижнем регистре)."""
+    col_type: str
+    words: Tuple[str, ...]
+    exact: bool = False  # True - название целиком равно одному из слов, иначе содержит слово
+    unless: Tuple[str, ...] = ()  # правило не срабатывает, если название содержит одно из этих слов
+
+
+# Служебные и технические колонки, которые явно игнорируются (точное совпадение)
+IGNORE_COLUMNS = (
+    'этикетка', 'etiquette', 'label', 'картинка', 'фото',
+    'abv', 'og', 'ibu', 'ebc',  # Технические параметры пива
+    'наличие', 'availability', 'stock', 'склад', 'остаток',  # Статус наличия
+    'годен до', 'expiry', 'expires', 'срок годности',  # Сроки
+    'скидки', 'акции', 'discount', 'promo',  # Промо
+    'стоимость', 'сумма',  # Дублирует цену
+    'код', 'sku', 'артикул', 'id',  # Коды и артикулы
+    'описание', 'description', 'комментарий',  # Описания
+    'вид продукции', 'категория', 'category',  # Категории
+    'unnamed',  # Безымянные колонки
+    'abv / og / ibu',  # Комбинированная техническая колонка
+)
+
+# Явные правила до ML-модели; срабатывает первое подходящее
+COLUMN_RULES = (
+    # PRICE - любое упоминание цены (первым!), включая "цена за литр", но не "сумма"
+    ColumnRule("PRICE", ('цена',), unless=('сумма',)),
+    ColumnRule("PRICE", ('price', 'стоимость')),
+    # BREWERY - раньше NAME: "Наименование пивоварни" - это пивоварня
+    ColumnRule("BREWERY", ('пивоварня', 'brewery', 'производитель'), exact=True),
+    ColumnRule("BREWERY", ('пивоварн', 'brewery')),
+    # NAME - только точные совпадения (не "наличие" и не "пивоварни")
+    ColumnRule("NAME", ('название', 'наименование', 'name', 'номенклатура', 'продукт', 'товар'), exact=True),
+    ColumnRule("STYLE", ('стиль', 'style', 'сорт', 'тип'), exact=True),
+    ColumnRule("VOLUME", ('объем', 'объём', 'volume', 'тип тары', 'тара', 'вид упаковки', 'упаковка',
+                          'тип фасовки', 'фасовка', 'литраж'), exact=True),
+    ColumnRule("VOLUME", ('тара', 'упаковк', 'фасовк', 'литраж')),
+    # ORDER_QUANTITY - колонка для заказа
+    ColumnRule("ORDER_QUANTITY", ('заказ', 'order', 'количество заказа', 'заказать'), exact=True),
+    ColumnRule("ORDER_QUANTITY", ('заказ',), unless=('заказать',)),
+    ColumnRule("IGNORE", IGNORE_COLUMNS, exact=True),
+    ColumnRule("IGNORE", ('unnamed', 'остаток', 'сумма', 'код', 'срок', 'годн', 'abv', 'ibu', 'og', 'наличи')),
+)
+
+# Резервные правила без модели; если ни одно не сработало - IGNORE
+FALLBACK_RULES = (
+    ColumnRule("PRICE", ('цена', 'price', 'стоимость', 'cost', 'руб', '₽', 'rub')),
+    ColumnRule("BREWERY", ('пивоварня', 'brewery', 'производитель', 'бренд', 'brand')),
+    ColumnRule("NAME", ('название', 'наименование', 'name', 'пиво', 'beer', 'продукт', 'product')),
+    # VOLUME - перед STYLE, чтобы "тип тары" не считался стилем
+    ColumnRule("VOLUME", ('объем', 'объём', 'volume', 'литр', 'мл', 'ml', 'упаковка', 'тара')),
+    ColumnRule("STYLE", ('стиль', 'style', 'тип', 'type', 'сорт')),
+)
+
+
+class RuleMatcher:
+    """
+    Таблица правил, скомпилированная в одно регулярное выражение.
+    
+    Все слова правил "содержит" ищутся за один проход выражения
+    (с просмотром вперед, поэтому находятся и перекрывающиеся слова),
+    после чего правила проверяются по порядку на множестве найденных
+    слов. Результат совпадает с проверкой правил цепочкой условий.
+    """
+    
+    def __init__(self, rules: Iterable[ColumnRule]):
+        """
+        Инициализация и компиляция таблицы.
+        
+        Args:
+            rules: Правила в порядке приоритета
+        """
+        self._rules = [
+            (rule.col_type, frozenset(rule.words), rule.exact, frozenset(rule.unless))
+            for rule in rules
+        ]
+        keywords = set()
+        for _, words, exact, unless in self._rules:
+            if not exact:
+                keywords.update(words)
+            keywords.update(unless)
+        
+        # На одной позиции выражение находит самое длинное слово; слова внутри
+        # найденного (например, "заказ" в "заказать") добавляются по таблице
+        self._contained = {word: frozenset(other for other in keywords if other in word) for word in keywords}
+        ordered = sorted(keywords, key=len, reverse=True)
+        self._pattern = re.compile(f"(?=({'|'.join(map(re.escape, ordered))}))") if ordered else None
+    
+    def match(self, text: str) -> Optional[str]:
+        """
+        Тип колонки по первому сработавшему правилу.
+        
+        Args:
+            text: Название колонки в нижнем регистре
+            
+        Returns:
+            Optional[str]: Тип колонки или None, если ни одно правило не сработало
+        """
+        found = set()
+        if self._pattern is not None:
+            for match in self._pattern.finditer(text):
+                found |= self._contained[match.group(1)]
+        
+        for col_type, words, exact, unless in self._rules:
+            hit = text in words if exact else not found.isdisjoint(words)
+            if hit and found.isdisjoint(unless):
+                return col_type
+        return None
+
+
+_column_rules = RuleMatcher(COLUMN_RULES)
+_fallback_rules = RuleMatcher(FALLBACK_RULES)
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (1, 3), lowercase: bool = True) -> List[str]:
+    """
+    n-граммы символов названия (как TfidfVectorizer/HashingVectorizer с analyzer='char').
+    
+    Args:
+        text: Название колонки
+        ngram_range: Длины n-грамм (мин, макс)
+        lowercase: Привести к нижнему регистру
+        
+    Returns:
+        List[str]: n-граммы (с повторами)
+    """
+    if lowercase:
+        text = text.lower()
+    text = _WHITE_SPACES_RE.sub(" ", text)
+    min_n, max_n = ngram_range
+    return [
+        text[start:start + n]
+        for n in range(min_n, min(max_n, len(text)) + 1)
+        for start in range(len(text) - n + 1)
+    ]
+
+
+class ExportedClassifier:
+    """
+    Классификатор колонок из выгрузки обученной модели.
+    
+    Повторяет TfidfVectorizer(analyzer='char') + MultinomialNB:
+    n-граммы символов -> TF-IDF с L2-нормой -> сумма логарифмов
+    вероятностей n-грамм и априорной вероятности класса.
+    """
+    
+    def __init__(self, vocabulary: Dict[str, int], idf: Sequence[float], classes: Sequence[str],
+                 class_log_prior: Sequence[float], feature_log_prob: Sequence[Sequence[float]],
+                 ngram_range: Tuple[int, int] = (1, 3), lowercase: bool = True,
+                 sublinear_tf: bool = False, norm: Optional[str] = "l2"):
+        """
+        Инициализация.
+        
+        Args:
+            vocabulary: n-грамма -> номер признака
+            idf: Веса IDF признаков
+            classes: Типы колонок
+            class_log_prior: Логарифмы априорных вероятностей классов
+            feature_log_prob: Логарифмы вероятностей признаков (классы x признаки)
+            ngram_range: Длины n-грамм (мин, макс)
+            lowercase: Приводить ли текст к нижнему регистру
+            sublinear_tf: 1 + log(tf) вместо tf
+            norm: Нормировка строк ("l2" или None)
+        """
+        self.vocabulary = vocabulary
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.classes = list(classes)
+        self.class_log_prior = np.asarray(class_log_prior, dtype=np.float64)
+        self.feature_log_prob = np.asarray(feature_log_prob, dtype=np.float64)
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+    
+    @classmethod
+    def load(cls, path: Path) -> "ExportedClassifier":
+        """
+        Загрузить выгрузку модели.
+        
+        Args:
+            path: JSON файл выгрузки
+            
+        Returns:
+            ExportedClassifier: Классификатор
+            
+        Raises:
+            ValueError: Неизвестный формат выгрузки
+        """
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        if data.get("version") != EXPORT_FORMAT_VERSION:
+            raise ValueError(f"неизвестная версия выгрузки: {data.get('version')}")
+        return cls(
+            data["vocabulary"], data["idf"], data["classes"],
+            data["class_log_prior"], data["feature_log_prob"],
+            ngram_range=data["ngram_range"], lowercase=data["lowercase"],
+            sublinear_tf=data["sublinear_tf"], norm=data["norm"],
+        )
+    
+    def transform(self, names: Sequence[str]) -> np.ndarray:
+        """
+        Признаки TF-IDF названий.
+        
+        Args:
+            names: Названия колонок
+            
+        Returns:
+            np.ndarray: Матрица (названия x признаки)
+        """
+        features = np.zeros((len(names), len(self.idf)), dtype=np.float64)
+        for row, name in enumerate(names):
+            for ngram in char_ngrams(name, self.ngram_range, self.lowercase):
+                col = self.vocabulary.get(ngram)
+                if col is not None:
+                    features[row, col] += 1
+        
+        if self.sublinear_tf:
+            present = features > 0
+            features[present] = np.log(features[present]) + 1
+        features *= self.idf
+        if self.norm == "l2":
+            norms = np.sqrt(np.einsum('ij,ij->i', features, features))
+            norms[norms == 0] = 1
+            features /= norms[:, None]
+        return features
+    
+    def predict(self, names: Sequence[str]) -> List[str]:
+        """
+        Типы колонок.
+        
+        Args:
+            names: Названия колонок
+            
+        Returns:
+            List[str]: Тип с наибольшим правдоподобием для каждого названия
+        """
+        if not len(names):
+            return []
+        scores = self.transform(names) @ self.feature_log_prob.T + self.class_log_prior
+        return [self.classes[idx] for idx in np.argmax(scores, axis=1)]
+
+
+class SharedModel:
+    """Модель классификатора колонок, общая для всех парсеров процесса."""
+    
+    def __init__(self, path: Path, max_cached_types: int = 4096, loader=ExportedClassifier.load):
+        """
+        Инициализация.
+        
+        Args:
+            path: Файл модели
+            max_cached_types: Максимум запомненных решений (название колонки -> тип)
+            loader: Функция загрузки модели из файла (путь -> объект с predict)
+        """
+        self.path = Path(path)
+        self.loader = loader
+        self.max_cached_types = max_cached_types
+        self.version = 0  # номер загрузки: растет при каждой перезагрузке
+        self._model = None
+        self._stamp = _NOT_LOADED
+        # Отметка текущей модели: по ней реестр раскладок узнает о смене модели
+        self._tag = "none"
+        self._lock = threading.Lock()
+        # Решения текущей модели; сбрасываются при перезагрузке
+        self._types = OrderedDict()
+    
+    def get(self):
+        """
+        Текущая модель (загружается при первом обращении и при изменении файла).
+        
+        Returns:
+            Модель или None, если файла модели нет
+        """
+        self._refresh()
+        return self._model
+    
+    def current(self) -> Tuple[object, str]:
+        """
+        Текущая модель вместе с ее отметкой (согласованная пара).
+        
+        Returns:
+            Tuple[object, str]: (модель или None, отметка модели)
+        """
+        self._refresh()
+        with self._lock:
+            return self._model, self._tag
+    
+    @property
+    def tag(self) -> str:
+        """
+        Отметка текущей модели: меняется при каждой загрузке и замене модели.
+        
+        Для модели из файла это время изменения и размер файла, поэтому
+        в разных процессах одна и та же выгрузка дает одну и ту же отметку.
+        """
+        return self.current()[1]
+    
+    def reload(self):
+        """Загрузить модель заново, даже если отметка файла не изменилась."""
+        with self._lock:
+            self._load(self._file_stamp())
+    
+    def swap(self, model, tag: Optional[str] = None):
+        """
+        Атомарно заменить модель (например, дообученной в фоне).
+        
+        Модель остается до следующего изменения файла модели.
+        
+        Args:
+            model: Новая модель (объект с predict)
+            tag: Отметка модели (по умолчанию - новая уникальная)
+        """
+        with self._lock:
+            if self._stamp is _NOT_LOADED:
+                # Файл еще не читался: иначе первое обращение заменит модель файлом
+                self._stamp = self._file_stamp()
+            self._model = model
+            self._tag = tag if tag is not None else f"swap:{uuid.uuid4().hex}"
+            self._types.clear()
+            self.version += 1
+    
+    def adopt(self, model, tag: str):
+        """
+        Взять модель другого процесса, если модели с такой отметкой еще нет.
+        
+        Args:
+            model: Модель (объект с predict)
+            tag: Ее отметка в исходном процессе
+        """
+        self._refresh()
+        with self._lock:
+            if self._tag == tag:
+                return
+        self.swap(model, tag)
+    
+    def cached_type(self, key: str, tag: Optional[str] = None) -> Optional[str]:
+        """
+        Запомненный тип колонки.
+        
+        Args:
+            key: Нормализованное название колонки
+            tag: Отметка модели, для которой нужно решение (None - текущая)
+            
+        Returns:
+            Optional[str]: Тип или None, если решения нет (или модель уже другая)
+        """
+        with self._lock:
+            if tag is not None and tag != self._tag:
+                return None
+            col_type = self._types.get(key)
+            if col_type is not None:
+                self._types.move_to_end(key)
+            return col_type
+    
+    def remember_type(self, key: str, col_type: str, tag: Optional[str] = None):
+        """
+        Запомнить тип колонки (давно не встречавшиеся названия вытесняются).
+        
+        Решение модели, которую уже заменили, не запоминается: иначе
+        кэш новой модели отдавал бы типы старой.
+        
+        Args:
+            key: Нормализованное название колонки
+            col_type: Тип колонки
+            tag: Отметка модели, которая приняла решение (None - текущая)
+        """
+        with self._lock:
+            if tag is not None and tag != self._tag:
+                return
+            self._types[key] = col_type
+            self._types.move_to_end(key)
+            while len(self._types) > self.max_cached_types:
+                self._types.popitem(last=False)
+    
+    def _file_stamp(self) -> Optional[tuple]:
+        """Отметка файла модели: (время изменения, размер) или None, если файла нет."""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _refresh(self):
+        """Загрузить модель, если файл изменился с прошлой загрузки."""
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    self._load(stamp)
+    
+    def _load(self, stamp: Optional[tuple]):
+        """Загрузить модель (вызывается под блокировкой)."""
+        self._stamp = stamp
+        if stamp is None:
+            self._model = None
+            self._tag = "none"
+            self._types.clear()
+            print(f"Модель не найдена: {self.path}")
+            print("Запустите ml/train_detector.py для обучения модели")
+            return
+        try:
+            model = self.loader(self.path)
+        except Exception as e:
+            # Файл мог быть испорчен - оставляем прежнюю модель до следующего изменения
+            print(f"Ошибка загрузки модели {self.path}: {e}")
+            return
+        self._model = model
+        self._tag = "file:{}:{}".format(*stamp)
+        self._types.clear()
+        self.version += 1
+
+
+# Общая модель процесса
+column_model = SharedModel(config.COLUMN_CLASSIFIER_EXPORT_PATH, max_cached_types=config.COLUMN_TYPE_CACHE_SIZE)
+
 
 class ColumnDetector:
     """Детектор типов колонок с использованием ML."""
     
-    def __init__(self):
-        """Инициализация детектора."""
-        self.model = None
-        self._load_model()
-    
-    def _load_model(self):
-        """Загрузить обученную модель."""
-        if config.COLUMN_CLASSIFIER_PATH.exists():
-            with open(config.COLUMN_CLASSIFIER_PATH, 'rb') as f:
-                self.model = pickle.load(f)
-        else:
-            print(f"Модель не найдена: {config.COLUMN_CLASSIFIER_PATH}")
-            print("Запустите ml/train_detector.py для обучения модели")
+    def __init__(self, shared: Optional[SharedModel] = None):
+        """
+        Инициализация детектора.
+        
+        Args:
+            shared: Общая модель (None - модель процесса)
+        """
+        self.shared = column_model if shared is None else shared
+    
+    @property
+    def model(self):
+        """Текущая модель (None, если модели нет)."""
+        return self.shared.get()
+    
+    @property
+    def model_tag(self) -> str:
+        """Отметка текущей модели (см. SharedModel.tag)."""
+        return self.shared.tag
+    
+    def reload(self):
+        """Перезагрузить модель после дообучения."""
+        self.shared.reload()
     
     def detect_column_type(self, column_name: str) -> str:
         """
@@ -34,82 +481,94 @@ class ColumnDetector:
         Returns:
             str: Тип колонки (BREWERY, NAME, STYLE, VOLUME, PRICE, IGNORE)
         """
-        if not column_name or not isinstance(column_name, str):
-            return "IGNORE"
-        
-        # Очистка названия
-        cleaned_name = str(column_name).strip()
-        
-        if not cleaned_name:
-            return "IGNORE"
-        
-        # ЯВНО определяем важные колонки ДО ML-модели (точные совпадения)
-        cleaned_lower = cleaned_name.lower()
-        
-        # PRICE - любое упоминание цены (ПЕРВЫМ!), но НЕ "сумма"
-        # Включаем "цена за литр", "цена за шт" и т.д.
-        if 'цена' in cleaned_lower and 'сумма' not in cleaned_lower:
-            return "PRICE"
-        if 'price' in cleaned_lower or 'стоимость' in cleaned_lower:
-            return "PRICE"
-        
-        # BREWERY - проверяем РАНЬШЕ NAME (более специфичный термин!)
-        # "Наименование пивоварни" должно распознаться как BREWERY, а не NAME
-        if cleaned_lower in ['пивоварня', 'brewery', 'производитель']:
-            return "BREWERY"
-        if 'пивоварн' in cleaned_lower or 'brewery' in cleaned_lower:
-            return "BREWERY"
-        
-        # NAME - точные совпадения (но НЕ "наличие" и НЕ "пивоварни"!)
-        if cleaned_lower in ['название', 'наименование', 'name', 'номенклатура', 'продукт', 'товар']:
-            return "NAME"
-        
-        # STYLE - точные совпадения
-        if cleaned_lower in ['стиль', 'style', 'сорт', 'тип']:
-            return "STYLE"
-        
-        # VOLUME - точные совпадения
-        if cleaned_lower in ['объем', 'объём', 'volume', 'тип тары', 'тара', 'вид упаковки', 'упаковка', 'тип фасовки', 'фасовка', 'литраж']:
-            return "VOLUME"
-        if 'тара' in cleaned_lower or 'упаковк' in cleaned_lower or 'фасовк' in cleaned_lower or 'литраж' in cleaned_lower:
-            return "VOLUME"
-        
-        # ORDER_QUANTITY - колонка для заказа
-        if cleaned_lower in ['заказ', 'order', 'количество заказа', 'заказать']:
-            return "ORDER_QUANTITY"
-        if 'заказ' in cleaned_lower and 'заказать' not in cleaned_lower:
-            return "ORDER_QUANTITY"
-        
-        # ЯВНО игнорируем служебные и технические колонки
-        ignore_columns = [
-            'этикетка', 'etiquette', 'label', 'картинка', 'фото',
-            'abv', 'og', 'ibu', 'ebc',  # Технические параметры пива
-            'наличие', 'availability', 'stock', 'склад', 'остаток',  # Статус наличия
-            'годен до', 'expiry', 'expires', 'срок годности',  # Сроки
-            'скидки', 'акции', 'discount', 'promo',  # Промо
-            'стоимость', 'сумма',  # Дублирует цену
-            'код', 'sku', 'артикул', 'id',  # Коды и артикулы
-            'описание', 'description', 'комментарий',  # Описания
-            'вид продукции', 'категория', 'category',  # Категории
-            'unnamed',  # Безымянные колонки
-            'abv / og / ibu',  # Комбинированная техническая колонка
-        ]
-        # Проверяем точное совпадение и вхождение
-        if cleaned_lower in ignore_columns:
-            return "IGNORE"
-        if any(ignored in cleaned_lower for ignored in ['unnamed', 'остаток', 'сумма', 'код', 'срок', 'годн', 'abv', 'ibu', 'og', 'наличи']):
-            return "IGNORE"
-        
-        # Использование ML-модели
-        if self.model:
+        return self.detect_column_types([column_name])[0]
+    
+    def detect_column_types(self, column_names: Sequence) -> List[str]:
+        """
+        Определить типы нескольких колонок за один проход.
+        
+        Названия нормализуются (пробелы по краям, нижний регистр), повторы
+        и уже встречавшиеся названия берутся из кэша решений текущей модели,
+        явные правила применяются без модели, а оставшиеся названия уходят
+        в модель одним вызовом predict.
+        
+        Args:
+            column_names: Названия колонок
+            
+        Returns:
+            List[str]: Типы колонок в том же порядке
+        """
+        shared = self.shared
+        # Модель и ее отметка берутся вместе: если модель заменят во время
+        # классификации, решения старой модели не попадут в кэш новой
+        model, tag = shared.current()
+        types = [None] * len(column_names)
+        pending = {}  # нормализованное название -> (название для модели, индексы)
+        
+        for idx, column_name in enumerate(column_names):
+            if not column_name or not isinstance(column_name, str):
+                types[idx] = "IGNORE"
+                continue
+            
+            # Очистка названия
+            cleaned_name = column_name.strip()
+            if not cleaned_name:
+                types[idx] = "IGNORE"
+                continue
+            
+            # Решения зависят только от названия в нижнем регистре
+            # (векторизатор модели тоже приводит текст к нижнему регистру)
+            key = cleaned_name.lower()
+            if key in pending:
+                pending[key][1].append(idx)
+                continue
+            cached = shared.cached_type(key, tag)
+            if cached is None:
+                cached = self._rule_type(key)
+                if cached is not None:
+                    shared.remember_type(key, cached, tag)
+            if cached is not None:
+                types[idx] = cached
+            else:
+                pending[key] = (cleaned_name, [idx])
+        
+        if pending:
+            names = [cleaned_name for cleaned_name, _ in pending.values()]
+            for key, (_, indices), col_type in zip(pending, pending.values(), self._predict(model, names)):
+                shared.remember_type(key, col_type, tag)
+                for idx in indices:
+                    types[idx] = col_type
+        return types
+    
+    def _predict(self, model, names: List[str]) -> List[str]:
+        """
+        Типы колонок, не решенных правилами: одним вызовом модели или по ключевым словам.
+        
+        Args:
+            model: Модель (None - резервный метод)
+            names: Очищенные названия колонок
+            
+        Returns:
+            List[str]: Типы колонок
+        """
+        if model:
             try:
-                prediction = self.model.predict([cleaned_name])[0]
-                return prediction
+                return list(model.predict(names))
             except Exception as e:
                 print(f"Ошибка при предсказании: {e}")
-                return self._fallback_detection(cleaned_name)
-        else:
-            return self._fallback_detection(cleaned_name)
+        return [self._fallback_detection(name) for name in names]
+    
+    def _rule_type(self, cleaned_lower: str) -> Optional[str]:
+        """
+        Тип колонки по явным правилам (до ML-модели).
+        
+        Args:
+            cleaned_lower: Очищенное название в нижнем регистре
+            
+        Returns:
+            Optional[str]: Тип колонки или None, если правила не сработали
+        """
+        return _column_rules.match(cleaned_lower)
     
     def _fallback_detection(self, column_name: str) -> str:
         """
@@ -121,34 +580,4 @@ class ColumnDetector:
         Returns:
             str: Тип колонки
         """
-        name_lower = column_name.lower()
-        
-        # PRICE - проверяем ПЕРВЫМ и ТОЧНО
-        # Точное совпадение имеет приоритет
-        if name_lower in ["цена", "price", "стоимость", "cost"]:
-            return "PRICE"
-        if any(word in name_lower for word in ["цена", "price", "стоимость", "cost", "руб", "₽", "rub"]):
-            return "PRICE"
-        
-        # BREWERY
-        if any(word in name_lower for word in ["пивоварня", "brewery", "производитель", "бренд", "brand"]):
-            return "BREWERY"
-        
-        # NAME
-        if any(word in name_lower for word in ["название", "наименование", "name", "пиво", "beer", "продукт", "product"]):
-            return "NAME"
-        
-        # VOLUME - проверяем ПЕРЕД STYLE чтобы "тип тары" не считался стилем
-        volume_keywords = ["объем", "объём", "volume", "литр", "мл", "ml", "упаковка"]
-        if any(word in name_lower for word in volume_keywords):
-            return "VOLUME"
-        # "Тип тары" и "Тара" - это объем (ВАЖНО: до проверки STYLE!)
-        if "тара" in name_lower:
-            return "VOLUME"
-        
-        # STYLE (после VOLUME!)
-        if any(word in name_lower for word in ["стиль", "style", "тип", "type", "сорт"]):
-            return "STYLE"
-        
-        return "IGNORE"
-
+        return _fallback_rules.match(column_name.lower()) or "IGNORE"
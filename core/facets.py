@@ -0,0 +1,181 @@
+"""
+Фасеты каталога для фильтров списка позиций.
+
+Для каждого фасета (пивоварня, категория стиля, тара, диапазон цены)
+один раз на каталог строится матрица битовых масок: строка - значение
+фасета, столбец - позиция. Комбинация фильтров - пересечение масок,
+количество позиций для каждого значения (с учетом остальных фильтров) -
+одна операция над матрицей, поэтому клавиатура фильтров любого размера
+строится без прохода по позициям.
+"""
+from typing import Dict, List, Mapping, Optional, Sequence
+import numpy as np
+from core.beer_categories import get_categories_list, get_category_for_style
+from core.filters import Container
+
+FACET_BREWERY = "brewery"
+FACET_CATEGORY = "category"
+FACET_CONTAINER = "container"
+FACET_PRICE = "price"
+
+# Фасеты в порядке показа и их подписи
+FACET_TITLES = {
+    FACET_BREWERY: "Пивоварня",
+    FACET_CATEGORY: "Стиль",
+    FACET_CONTAINER: "Тара",
+    FACET_PRICE: "Цена",
+}
+
+CONTAINER_TITLES = {
+    Container.CAN: "Банки",
+    Container.BOTTLE: "Бутылки",
+    Container.KEG: "Кеги",
+    Container.PET_KEG: "ПЭТ-кеги",
+    None: "Другая тара",
+}
+
+# Границы диапазонов цены (рубли): банки и бутылки - первые диапазоны, кеги - последний
+PRICE_BOUNDS_RUB = (150, 250, 400, 1000)
+NO_PRICE = "Без цены"
+
+
+def price_bucket(price_kop: Optional[int]) -> str:
+    """
+    Диапазон цены позиции.
+
+    Args:
+        price_kop: Цена в копейках
+
+    Returns:
+        str: Подпись диапазона ("до 150 ₽", "150-250 ₽", ..., "от 1000 ₽")
+    """
+    if price_kop is None:
+        return NO_PRICE
+    rubles = price_kop / 100
+    lower = None
+    for bound in PRICE_BOUNDS_RUB:
+        if rubles < bound:
+            return f"до {bound} ₽" if lower is None else f"{lower}-{bound} ₽"
+        lower = bound
+    return f"от {lower} ₽"
+
+
+def _price_bucket_order() -> List[str]:
+    """Подписи диапазонов цены по возрастанию."""
+    labels = [price_bucket(0)]
+    labels += [price_bucket(bound * 100) for bound in PRICE_BOUNDS_RUB]
+    return labels + [NO_PRICE]
+
+
+class CatalogFacets:
+    """Битовые маски значений фасетов по позициям каталога."""
+
+    def __init__(self, items: Sequence[Mapping]):
+        """
+        Построить фасеты.
+
+        Args:
+            items: Позиции каталога (номер позиции - индекс в списке)
+        """
+        self._size = len(items)
+        categories = {}  # стиль -> категория (стилей в прайсе немного)
+        for item in items:
+            style = item.get('стиль')
+            if style not in categories:
+                categories[style] = get_category_for_style(style)
+
+        labels = {
+            FACET_BREWERY: [item.get('пивоварня') or 'Без пивоварни' for item in items],
+            FACET_CATEGORY: [categories[item.get('стиль')] for item in items],
+            FACET_CONTAINER: [CONTAINER_TITLES[item.get('_container')] for item in items],
+            FACET_PRICE: [price_bucket(item.get('_price_kop')) for item in items],
+        }
+        order = {
+            FACET_BREWERY: sorted(set(labels[FACET_BREWERY])),
+            FACET_CATEGORY: get_categories_list(),
+            FACET_CONTAINER: list(CONTAINER_TITLES.values()),
+            FACET_PRICE: _price_bucket_order(),
+        }
+
+        self._values: Dict[str, List[str]] = {}
+        self._matrices: Dict[str, np.ndarray] = {}
+        for facet, column in labels.items():
+            column = np.array(column, dtype=object)
+            present = set(column.tolist())
+            values = [value for value in order[facet] if value in present]
+            self._values[facet] = values
+            # Строка матрицы - маска позиций с этим значением
+            self._matrices[facet] = (
+                np.vstack([column == value for value in values]) if values
+                else np.zeros((0, self._size), dtype=bool)
+            )
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Оценка памяти фасетов в байтах (матрицы масок и подписи значений)."""
+        return sum(matrix.nbytes for matrix in self._matrices.values()) + sum(
+            len(value) for values in self._values.values() for value in values
+        )
+
+    def values(self, facet: str) -> List[str]:
+        """
+        Значения фасета, встречающиеся в каталоге (индекс значения стабилен для каталога).
+
+        Args:
+            facet: Фасет
+
+        Returns:
+            List[str]: Значения
+        """
+        return self._values[facet]
+
+    def mask(self, filters: Mapping[str, str], exclude: Optional[str] = None) -> np.ndarray:
+        """
+        Маска позиций, подходящих под все фильтры.
+
+        Args:
+            filters: {фасет: значение}
+            exclude: Фасет, фильтр которого не учитывается
+
+        Returns:
+            np.ndarray: Булева маска по позициям
+        """
+        mask = np.ones(self._size, dtype=bool)
+        for facet, value in filters.items():
+            if facet == exclude:
+                continue
+            values = self._values.get(facet, [])
+            if value not in values:
+                return np.zeros(self._size, dtype=bool)
+            mask &= self._matrices[facet][values.index(value)]
+        return mask
+
+    def view(self, filters: Mapping[str, str]) -> List[int]:
+        """
+        Номера позиций, подходящих под фильтры (в порядке каталога).
+
+        Args:
+            filters: {фасет: значение}
+
+        Returns:
+            List[int]: Номера позиций
+        """
+        return np.flatnonzero(self.mask(filters)).tolist()
+
+    def counts(self, facet: str, filters: Mapping[str, str]) -> Dict[str, int]:
+        """
+        Количество позиций для каждого значения фасета с учетом остальных фильтров.
+
+        Args:
+            facet: Фасет
+            filters: Текущие фильтры {фасет: значение}
+
+        Returns:
+            Dict[str, int]: {значение: количество} в порядке values(facet)
+        """
+        others = self.mask(filters, exclude=facet)
+        counts = np.count_nonzero(self._matrices[facet] & others, axis=1)
+        return dict(zip(self._values[facet], counts.tolist()))
@@ -2,35 +2,194 @@
 Фильтры для извлечения и обработки данных о пиве.
 """
 import re
-from typing import Optional
+from bisect import bisect_right
+from enum import StrEnum
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+import pandas as pd
 import config
+from core.beer_categories import BEER_CATEGORIES
+
+# Паттерны для литров и дробных чисел (0,33 0,5 и т.д.)
+_LITER_PATTERNS = [
+    re.compile(r'(\d+(?:[.,]\d+)?)\s*л(?:итр)?', re.IGNORECASE),
+    re.compile(r'(\d+(?:[.,]\d+)?)\s*l(?:iter)?', re.IGNORECASE),
+    re.compile(r'(\d[.,]\d+)', re.IGNORECASE),  # Дробные числа типа 0,33 или 0.5
+]
+
+# Паттерны для миллилитров
+_ML_PATTERNS = [
+    re.compile(r'(\d+)\s*мл', re.IGNORECASE),
+    re.compile(r'(\d+)\s*ml', re.IGNORECASE),
+]
+
+# Первое число в ячейке с ценой
+_PRICE_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)')
+
+# Число в начале нормализованной цены ("250 руб.", "175.5 руб.")
+_PRICE_VALUE_RE = re.compile(r'^(\d+)(?:\.(\d+))?')
+
+# Литраж в начале нормализованного объема ("0.5 л (банка)", "30 л (кега)")
+_LITERS_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*л')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class Container(StrEnum):
+    """Тип тары."""
+    KEG = "keg"
+    PET_KEG = "pet_keg"
+    CAN = "can"
+    BOTTLE = "bottle"
+
+
+class VolumeFields(NamedTuple):
+    """Типизированные поля объема позиции."""
+    liters: Optional[float]
+    container: Optional[Container]
+    is_keg: bool
+
+
+_NO_VOLUME = VolumeFields(None, None, False)
+
+
+class StyleMatcher:
+    """
+    Поиск стиля пива одним скомпилированным регулярным выражением.
+    
+    Возвращает самый длинный из найденных стилей (при равной длине - более
+    ранний в словаре). Выражение просматривает совпадения со всех позиций
+    текста (включая перекрывающиеся), поэтому результат совпадает с
+    проверкой "style in text" для каждого стиля по убыванию длины.
+    """
+    
+    def __init__(self, styles: Iterable[str], word_styles: Iterable[str] = ()):
+        """
+        Инициализация и компиляция словаря.
+        
+        Args:
+            styles: Стили, которые ищутся как подстрока
+            word_styles: Дополнительные стили, которые ищутся как отдельное слово
+                (короткие обозначения вроде "БА" или "RIS" иначе находятся внутри слов)
+        """
+        terms = {}  # {стиль в верхнем регистре: (стиль, только целым словом)}
+        for style in styles:
+            terms.setdefault(style.upper(), (style, False))
+        for style in word_styles:
+            terms.setdefault(style.upper(), (style, True))
+        
+        # Порядок как у сортировки по длине: при равной длине - порядок словаря
+        ordered = sorted(terms.items(), key=lambda term: len(term[0]), reverse=True)
+        self._styles = {key: (rank, style) for rank, (key, (style, _)) in enumerate(ordered)}
+        
+        alternatives = []
+        for key, (_, whole_word) in ordered:
+            pattern = re.escape(key)
+            if whole_word:
+                pattern = rf'(?<!\w){pattern}(?!\w)'
+            alternatives.append(pattern)
+        # Просмотр вперед дает совпадение на каждой позиции, в том числе перекрывающееся
+        self._pattern = re.compile(f"(?=({'|'.join(alternatives)}))") if alternatives else None
+    
+    def match(self, text: str) -> Optional[str]:
+        """
+        Найти стиль в тексте.
+        
+        Args:
+            text: Текст для анализа
+            
+        Returns:
+            Optional[str]: Найденный стиль или None
+        """
+        if not text or not isinstance(text, str) or self._pattern is None:
+            return None
+        
+        best = None
+        for found in self._pattern.finditer(text.upper()):
+            candidate = self._styles[found.group(1)]
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+        return best[1] if best else None
+    
+    def match_many(self, texts: Sequence) -> List[Optional[str]]:
+        """
+        Найти стили в наборе текстов за один проход регулярного выражения.
+        
+        Args:
+            texts: Тексты (не-строки и пустые значения дают None)
+            
+        Returns:
+            List[Optional[str]]: Стиль для каждого текста
+        """
+        results = [None] * len(texts)
+        if self._pattern is None:
+            return results
+        
+        # Тексты склеиваются через перевод строки: стили его не содержат, поэтому
+        # совпадение не переходит через границу текстов, а переводы строк внутри
+        # текста остаются как есть (как в match)
+        indices = [i for i, text in enumerate(texts) if text and isinstance(text, str)]
+        if not indices:
+            return results
+        upper = [texts[i].upper() for i in indices]
+        joined = "\n".join(upper)
+        
+        starts = []
+        offset = 0
+        for text in upper:
+            starts.append(offset)
+            offset += len(text) + 1
+        
+        best = {}
+        for found in self._pattern.finditer(joined):
+            position = bisect_right(starts, found.start()) - 1
+            candidate = self._styles[found.group(1)]
+            current = best.get(position)
+            if current is None or candidate[0] < current[0]:
+                best[position] = candidate
+        
+        for position, (_, style) in best.items():
+            results[indices[position]] = style
+        return results
+
+
+def _build_style_matcher() -> StyleMatcher:
+    """Словарь стилей: config.BEER_STYLES и стили из категорий заказа."""
+    category_styles = [style for styles in BEER_CATEGORIES.values() for style in styles]
+    return StyleMatcher(config.BEER_STYLES, category_styles)
+
+
+# Компилируется один раз при импорте
+_style_matcher = _build_style_matcher()
 
 
 def extract_beer_style(text: str) -> Optional[str]:
     """
     Извлечь стиль пива из текста.
     
+    Стили ищутся от длинных к коротким: например, "Imperial Stout"
+    находится раньше "Stout".
+    
     Args:
         text: Текст для анализа
         
     Returns:
         Optional[str]: Найденный стиль или None
     """
-    if not text or not isinstance(text, str):
-        return None
-    
-    text_upper = text.upper()
-    
-    # Сортируем стили по длине (от длинных к коротким) для правильного поиска
-    # Например, "Imperial Stout" должен находиться раньше "Stout"
-    sorted_styles = sorted(config.BEER_STYLES, key=len, reverse=True)
-    
-    # Поиск по известным стилям
-    for style in sorted_styles:
-        if style.upper() in text_upper:
-            return style
+    return _style_matcher.match(text)
+
+
+def extract_beer_styles(texts: Sequence) -> List[Optional[str]]:
+    """
+    Извлечь стили пива для набора текстов (например, колонки названий).
     
-    return None
+    Args:
+        texts: Тексты для анализа
+        
+    Returns:
+        List[Optional[str]]: Найденный стиль или None для каждого текста
+    """
+    return _style_matcher.match_many(texts)
 
 
 def extract_brewery_from_filename(filename: str) -> Optional[str]:
@@ -81,12 +240,36 @@ def extract_volume(text: str) -> Optional[str]:
     """
     Извлечь объем из текста.
     
+    Результат запоминается по исходному значению ячейки: одни и те же
+    "0,5 л банка" или "кега 30" повторяются в прайс-листе тысячи раз.
+    
     Args:
         text: Текст для анализа
         
     Returns:
         Optional[str]: Объем в стандартизированном виде
     """
+    try:
+        return _extract_volume_cached(text)
+    except TypeError:  # Нехэшируемое значение
+        return _extract_volume(text)
+
+
+def extract_volumes(values: pd.Series) -> pd.Series:
+    """
+    Извлечь объем для всех значений колонки.
+    
+    Args:
+        values: Значения ячеек
+        
+    Returns:
+        pd.Series: Объем в стандартизированном виде (None, если не найден)
+    """
+    return _map_series(values, extract_volume)
+
+
+def _extract_volume(text) -> Optional[str]:
+    """Извлечь объем из текста (без кэша)."""
     if not text:
         return None
     
@@ -120,16 +303,9 @@ def extract_volume(text: str) -> Optional[str]:
     elif 'банка' in text_clean or 'can' in text_clean or 'банку' in text_clean or 'ж/б' in text_clean:
         container_type = 'банка'
     
-    # Паттерны для литров и дробных чисел (0,33 0,5 и т.д.)
-    liter_patterns = [
-        r'(\d+(?:[.,]\d+)?)\s*л(?:итр)?',
-        r'(\d+(?:[.,]\d+)?)\s*l(?:iter)?',
-        r'(\d[.,]\d+)',  # Дробные числа типа 0,33 или 0.5
-    ]
-    
     # Ищем в очищенном тексте (без переносов)
-    for pattern in liter_patterns:
-        match = re.search(pattern, text_clean, re.IGNORECASE)
+    for pattern in _LITER_PATTERNS:
+        match = pattern.search(text_clean)
         if match:
             volume = match.group(1).replace(',', '.')
             if is_keg:
@@ -138,14 +314,8 @@ def extract_volume(text: str) -> Optional[str]:
                 return f"{volume} л ({container_type})"
             return f"{volume} л"
     
-    # Паттерны для миллилитров
-    ml_patterns = [
-        r'(\d+)\s*мл',
-        r'(\d+)\s*ml',
-    ]
-    
-    for pattern in ml_patterns:
-        match = re.search(pattern, text_clean, re.IGNORECASE)
+    for pattern in _ML_PATTERNS:
+        match = pattern.search(text_clean)
         if match:
             ml = int(match.group(1))
             liters = ml / 1000
@@ -175,6 +345,43 @@ def extract_volume(text: str) -> Optional[str]:
     return None
 
 
+@lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE)
+def volume_fields(volume: Optional[str]) -> VolumeFields:
+    """
+    Разобрать объем позиции (результат extract_volume или исходный текст тары)
+    на литраж, тип тары и признак кеги.
+    
+    Вычисляется один раз при парсинге, чтобы интерфейс и фильтры
+    не искали "кег" в строке объема при каждом обновлении экрана.
+    
+    Args:
+        volume: Объем позиции
+        
+    Returns:
+        VolumeFields: Литраж (None, если не указан), тип тары и признак кеги
+    """
+    if not volume:
+        return _NO_VOLUME
+    
+    text = str(volume).lower()
+    match = _LITERS_RE.match(text)
+    liters = float(match.group(1)) if match else None
+    
+    if 'пэт-кег' in text:
+        container = Container.PET_KEG
+    elif 'кег' in text or 'keg' in text:
+        container = Container.KEG
+    elif 'бутылка' in text or 'bottle' in text or 'бут' in text:
+        container = Container.BOTTLE
+    elif 'банка' in text or 'can' in text or 'банку' in text or 'ж/б' in text:
+        container = Container.CAN
+    else:
+        container = None
+    
+    is_keg = container in (Container.KEG, Container.PET_KEG)
+    return VolumeFields(liters, container, is_keg)
+
+
 def extract_price(text: str, volume_text: Optional[str] = None) -> Optional[str]:
     """
     Извлечь цену из текста.
@@ -186,27 +393,87 @@ def extract_price(text: str, volume_text: Optional[str] = None) -> Optional[str]
     Returns:
         Optional[str]: Цена в стандартизированном виде
     """
-    if not text:
+    # Не добавляем расчет цены за литр - пользователь сам это видит
+    try:
+        return _extract_price_cached(text)
+    except TypeError:  # Нехэшируемое значение
+        return _extract_price(text)
+
+
+@lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE)
+def price_kopecks(price: Optional[str]) -> Optional[int]:
+    """
+    Перевести цену (результат extract_price) в целое число копеек.
+    
+    Вычисляется один раз при парсинге, чтобы корзина суммировала целые
+    числа, а не разбирала строку "250 руб." при каждом открытии.
+    
+    Args:
+        price: Цена в стандартизированном виде
+        
+    Returns:
+        Optional[int]: Цена в копейках или None, если цены нет
+    """
+    if not price:
         return None
     
-    text = str(text)
+    match = _PRICE_VALUE_RE.match(str(price))
+    if not match:
+        return None
+    rubles, fraction = match.groups()
+    fraction = (fraction or "")[:3].ljust(3, "0")
+    # Округляем до копейки по третьему знаку дроби (175.555 -> 17556)
+    return int(rubles) * 100 + (int(fraction) + 5) // 10
+
+
+def extract_prices(values: pd.Series) -> pd.Series:
+    """
+    Извлечь цену для всех значений колонки.
     
-    # Паттерны для цены
-    price_patterns = [
-        r'(\d+(?:[.,]\d+)?)\s*(?:руб|₽|rub)?',
-        r'(\d+(?:[.,]\d+)?)',
-    ]
+    Args:
+        values: Значения ячеек
+        
+    Returns:
+        pd.Series: Цена в стандартизированном виде (None, если не найдена)
+    """
+    return _map_series(values, extract_price)
+
+
+def _extract_price(text) -> Optional[str]:
+    """Извлечь цену из текста (без кэша): первое число + " руб."."""
+    if not text:
+        return None
     
-    price = None
-    for pattern in price_patterns:
-        match = re.search(pattern, text)
-        if match:
-            price_value = match.group(1).replace(',', '.')
-            price = f"{price_value} руб."
-            break
+    match = _PRICE_PATTERN.search(str(text))
+    if match:
+        price_value = match.group(1).replace(',', '.')
+        return f"{price_value} руб."
+    return None
+
+
+# Кэш по исходному значению ячейки; typed=True: 300 и 300.0 дают разные строки
+_extract_volume_cached = lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE, typed=True)(_extract_volume)
+_extract_price_cached = lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE, typed=True)(_extract_price)
+
+
+def _map_series(values: pd.Series, func) -> pd.Series:
+    """
+    Применить нормализатор к колонке: пустые ячейки дают None.
     
-    # Не добавляем расчет цены за литр - пользователь сам это видит
-    return price
+    Args:
+        values: Значения ячеек
+        func: Нормализатор значения
+        
+    Returns:
+        pd.Series: Результаты (object) с индексом исходной колонки
+    """
+    values = pd.Series(values, dtype=object)
+    missing = values.isna().tolist()
+    return pd.Series(
+        [None if empty else func(value) for value, empty in zip(values.tolist(), missing)],
+        index=values.index,
+        dtype=object,
+    )
 
 
 def clean_text(text) -> str:
@@ -230,7 +497,7 @@ def clean_text(text) -> str:
         text = text.split('\n')[0].strip()
     
     # Удаление множественных пробелов
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE_RE.sub(' ', text)
     
     # Удаление спецсимволов
     text = text.replace('\r', ' ').replace('\t', ' ')
@@ -0,0 +1,296 @@
+"""
+Реестр раскладок прайс-листов поставщиков.
+
+Раскладка листа (какая колонка что содержит) у поставщика почти не меняется
+от недели к неделе. Реестр запоминает типы колонок по отпечатку строки
+заголовков, чтобы при повторной загрузке не искать заголовки по баллам
+и не классифицировать колонки заново.
+
+Процессы пула парсинга не пишут в файл реестра: они получают снимок
+раскладок (snapshot), а новые раскладки возвращают родительскому
+процессу, который добавляет их в реестр (merge) и сохраняет файл.
+
+Раскладки верны только для модели, которая классифицировала колонки.
+Реестр привязан к отметке модели (SharedModel.tag). Когда модель меняется
+(перезагружена из файла или дообучена в фоне), парсер перепроверяет
+раскладки (revalidate): названия колонок классифицируются новой моделью
+одним пакетом, и остаются только раскладки, типы которых не изменились.
+Обращение с чужой отметкой без перепроверки забывает все раскладки.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+import config
+
+# Версия формата записей: при изменении правил классификации старые раскладки игнорируются
+LAYOUT_REGISTRY_VERSION = 1
+
+
+def fingerprint_row(cells: Sequence) -> Optional[str]:
+    """
+    Отпечаток строки заголовков: позиции и текст ячеек.
+
+    Args:
+        cells: Значения ячеек строки (NaN/None - пустые)
+
+    Returns:
+        Optional[str]: Хэш строки или None для пустой строки
+    """
+    normalized = []
+    for cell in cells:
+        if cell is None or cell != cell:  # None или NaN
+            normalized.append("")
+        else:
+            normalized.append(str(cell).strip())
+
+    # Пустые ячейки в конце зависят от ширины листа, а не от раскладки
+    while normalized and not normalized[-1]:
+        normalized.pop()
+    if not normalized:
+        return None
+    payload = json.dumps(normalized, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class LayoutRegistry:
+    """Отпечаток строки заголовков -> типы колонок, с сохранением на диск."""
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = 1000):
+        """
+        Инициализация реестра.
+
+        Args:
+            path: JSON файл реестра (None - только в памяти)
+            max_entries: Максимум раскладок (давно не встречавшиеся вытесняются)
+        """
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self._layouts = OrderedDict()  # {отпечаток: {колонка: тип}}
+        self._model = None  # отметка модели, давшей раскладки (None - неизвестна)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._load()
+
+    @property
+    def model(self) -> Optional[str]:
+        """Отметка модели, к которой привязан реестр."""
+        with self._lock:
+            return self._model
+
+    def bind(self, model: str):
+        """
+        Привязать реестр к модели: раскладки другой модели забываются.
+
+        Args:
+            model: Отметка модели (SharedModel.tag)
+        """
+        with self._lock:
+            payload = self._payload() if self._bind(model) else None
+        if payload is not None:
+            self._save(payload)
+
+    def revalidate(self, model: str, classify: Callable[[List[str]], List[str]]) -> int:
+        """
+        Привязать реестр к новой модели, оставив раскладки, которые она классифицирует так же.
+
+        Args:
+            model: Отметка новой модели
+            classify: Типы колонок по названиям (классификация новой моделью)
+
+        Returns:
+            int: Сколько раскладок забыто
+        """
+        with self._lock:
+            if model == self._model:
+                return 0
+            layouts = {fingerprint: dict(column_types) for fingerprint, column_types in self._layouts.items()}
+
+        # Классификация - вне блокировки, все названия одним пакетом
+        names = list(dict.fromkeys(name for column_types in layouts.values() for name in column_types))
+        decided = dict(zip(names, classify(names))) if names else {}
+
+        with self._lock:
+            if model == self._model:
+                return 0
+            # Раскладки, добавленные во время перепроверки, не проверены - тоже забываются
+            kept = OrderedDict(
+                (fingerprint, column_types)
+                for fingerprint, column_types in self._layouts.items()
+                if layouts.get(fingerprint) == column_types
+                and all(decided.get(name) == col_type for name, col_type in column_types.items())
+            )
+            dropped = len(self._layouts) - len(kept)
+            self._layouts = kept
+            self._model = model
+            payload = self._payload()
+        self._save(payload)
+        return dropped
+
+    def get(self, fingerprint: str, model: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """
+        Найти раскладку по отпечатку строки заголовков.
+
+        Промахом считается только вызов record_miss: при поиске строки
+        заголовков проверяются несколько строк листа.
+
+        Args:
+            fingerprint: Отпечаток строки
+            model: Отметка текущей модели (None - не проверять)
+
+        Returns:
+            Optional[Dict[str, str]]: Типы колонок или None
+        """
+        if model is not None:
+            self.bind(model)
+        with self._lock:
+            column_types = self._layouts.get(fingerprint)
+            if column_types is not None:
+                self._layouts.move_to_end(fingerprint)
+                self._stats["hits"] += 1
+            return column_types
+
+    def record_miss(self):
+        """Учесть лист, для которого раскладка не найдена."""
+        with self._lock:
+            self._stats["misses"] += 1
+
+    def put(self, fingerprint: str, column_types: Dict[str, str], model: Optional[str] = None):
+        """
+        Запомнить раскладку листа.
+
+        Args:
+            fingerprint: Отпечаток строки заголовков
+            column_types: Типы колонок
+            model: Отметка модели, классифицировавшей колонки
+        """
+        with self._lock:
+            rebound = model is not None and self._bind(model)
+            if not rebound and self._layouts.get(fingerprint) == column_types:
+                return
+            self._store(fingerprint, column_types)
+            self._stats["stores"] += 1
+            payload = self._payload()
+        self._save(payload)
+
+    def snapshot(self, model: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+        """
+        Копия всех раскладок (для передачи в процесс пула).
+
+        Args:
+            model: Отметка текущей модели (None - не проверять)
+
+        Returns:
+            Dict[str, Dict[str, str]]: {отпечаток: {колонка: тип}}
+        """
+        with self._lock:
+            payload = self._payload() if model is not None and self._bind(model) else None
+            layouts = {fingerprint: dict(column_types) for fingerprint, column_types in self._layouts.items()}
+        if payload is not None:
+            self._save(payload)
+        return layouts
+
+    def merge(
+        self,
+        layouts: Dict[str, Dict[str, str]],
+        stats: Optional[Dict[str, int]] = None,
+        model: Optional[str] = None,
+    ):
+        """
+        Добавить раскладки и счетчики из процесса пула (файл записывается один раз).
+
+        Args:
+            layouts: Новые раскладки {отпечаток: {колонка: тип}}
+            stats: Счетчики попаданий, промахов и записей процесса
+            model: Отметка модели, классифицировавшей колонки
+        """
+        with self._lock:
+            changed = model is not None and self._bind(model)
+            for fingerprint, column_types in layouts.items():
+                if self._layouts.get(fingerprint) != column_types:
+                    self._store(fingerprint, column_types)
+                    changed = True
+            for name, value in (stats or {}).items():
+                if name in self._stats:
+                    self._stats[name] += value
+            payload = self._payload() if changed else None
+        if payload is not None:
+            self._save(payload)
+
+    def clear(self):
+        """Забыть все раскладки (например, после переобучения модели)."""
+        with self._lock:
+            self._layouts.clear()
+        if self.path:
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счетчики попаданий и промахов.
+
+        Returns:
+            Dict[str, int]: Статистика реестра
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._layouts)
+        return stats
+
+    def _bind(self, model: str) -> bool:
+        """Сменить модель реестра (вызывается под блокировкой); True - если сменилась."""
+        if model == self._model:
+            return False
+        self._layouts.clear()
+        self._model = model
+        return True
+
+    def _store(self, fingerprint: str, column_types: Dict[str, str]):
+        """Запомнить раскладку и вытеснить лишние (вызывается под блокировкой)."""
+        self._layouts[fingerprint] = dict(column_types)
+        self._layouts.move_to_end(fingerprint)
+        while len(self._layouts) > self.max_entries:
+            self._layouts.popitem(last=False)
+
+    def _payload(self) -> str:
+        """Содержимое файла реестра (вызывается под блокировкой)."""
+        return json.dumps(
+            {"version": LAYOUT_REGISTRY_VERSION, "model": self._model, "layouts": self._layouts},
+            ensure_ascii=False,
+        )
+
+    def _load(self):
+        """Загрузить реестр с диска (устаревший формат игнорируется)."""
+        if not self.path:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != LAYOUT_REGISTRY_VERSION:
+            return
+        self._model = data.get("model")
+        self._layouts.update(data.get("layouts", {}))
+
+    def _save(self, payload: str):
+        """Атомарно записать реестр на диск."""
+        if not self.path:
+            return
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(payload, encoding='utf-8')
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Не удалось сохранить реестр раскладок {self.path}: {e}")
+
+
+# Общий реестр процесса
+layout_registry = LayoutRegistry(
+    path=config.LAYOUT_REGISTRY_PATH,
+    max_entries=config.LAYOUT_REGISTRY_MAX_ENTRIES,
+)
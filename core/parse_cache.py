@@ -0,0 +1,291 @@
+"""
+Кэш результатов парсинга прайс-листов.
+
+Ключ - хэш SHA-256 содержимого файла: он считается при скачивании
+документа (UploadBuffer.hexdigest), поэтому файл не читается повторно.
+Два уровня: LRU в памяти, ограниченный оценкой размера в байтах,
+и каталог на диске, который переживает перезапуск бота.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import config
+
+# Версия формата позиций: при изменении структуры item или правил извлечения старые записи на диске игнорируются
+PARSE_CACHE_VERSION = 5
+
+class ParseCache:
+    """Двухуровневый кэш результатов парсинга (память + диск)."""
+
+    def __init__(self, max_memory_bytes: int, cache_dir: Optional[Path] = None, max_disk_bytes: int = 0):
+        """
+        Инициализация кэша.
+
+        Args:
+            max_memory_bytes: Лимит памяти (по оценке размера JSON позиций)
+            cache_dir: Каталог дискового уровня (None - только память)
+            max_disk_bytes: Лимит дискового уровня (0 - без ограничения)
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = OrderedDict()  # {ключ: (позиции, размер)}
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """
+        Получить позиции по хэшу файла.
+
+        Args:
+            key: Хэш содержимого файла
+
+        Returns:
+            Optional[List[Dict]]: Позиции или None, если в кэше нет
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[0]
+
+        stored = self._read_disk(key)
+        if stored is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        items, size = stored
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            self._remember(key, items, size)
+        return items
+
+    def put(self, key: str, items: List[Dict]):
+        """
+        Сохранить позиции в кэш.
+
+        Args:
+            key: Хэш содержимого файла
+            items: Позиции после парсинга
+        """
+        payload = json.dumps({"version": PARSE_CACHE_VERSION, "items": items}, ensure_ascii=False)
+        with self._lock:
+            self._stats["stores"] += 1
+            self._remember(key, items, len(payload))
+        self._write_disk(key, payload)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счетчики попаданий и промахов.
+
+        Returns:
+            Dict[str, int]: Статистика кэша
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["memory_bytes"] = self._memory_bytes
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        return stats
+
+    def clear(self):
+        """Очистить уровень в памяти (файлы на диске остаются)."""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def _remember(self, key: str, items: List[Dict], size: int):
+        """Положить запись в LRU и вытеснить старые по лимиту байт (под блокировкой)."""
+        if key in self._entries:
+            self._memory_bytes -= self._entries.pop(key)[1]
+
+        # Запись больше всего лимита держим только на диске
+        if size > self.max_memory_bytes:
+            return
+
+        self._entries[key] = (items, size)
+        self._memory_bytes += size
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self._stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> Path:
+        """Путь к файлу записи на диске."""
+        return self.cache_dir / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[tuple]:
+        """Прочитать запись с диска: (позиции, размер) или None, если нет или устарела."""
+        if not self.cache_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            payload = path.read_text(encoding='utf-8')
+            data = json.loads(payload)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("version") != PARSE_CACHE_VERSION:
+            return None
+
+        # Обновляем время доступа для вытеснения старых файлов
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data["items"], len(payload)
+
+    def _write_disk(self, key: str, payload: str):
+        """Атомарно записать запись на диск и ограничить размер каталога."""
+        if not self.cache_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(payload, encoding='utf-8')
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш парсинга {path}: {e}")
+            return
+
+        if self.max_disk_bytes:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        """Удалить самые давно использованные файлы сверх лимита."""
+        files = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                continue
+
+
+class DocumentIndex:
+    """
+    Индекс Telegram file_unique_id -> хэш содержимого с вытеснением по TTL.
+
+    Позволяет не скачивать и не хэшировать повторно пересланный документ:
+    по хэшу сразу берется результат из ParseCache.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, clock=time.monotonic):
+        """
+        Инициализация индекса.
+
+        Args:
+            ttl_seconds: Время жизни записи
+            max_entries: Максимум записей (самые старые вытесняются)
+            clock: Источник времени (для тестов)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # {file_unique_id: (хэш, истекает)}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0}
+
+    def get(self, file_unique_id: str) -> Optional[str]:
+        """
+        Получить хэш содержимого документа.
+
+        Args:
+            file_unique_id: Постоянный идентификатор файла в Telegram
+
+        Returns:
+            Optional[str]: Хэш или None, если документ не встречался или запись истекла
+        """
+        with self._lock:
+            entry = self._entries.get(file_unique_id)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            file_hash, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[file_unique_id]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._stats["hits"] += 1
+            return file_hash
+
+    def put(self, file_unique_id: str, file_hash: str):
+        """
+        Запомнить хэш содержимого документа.
+
+        Args:
+            file_unique_id: Постоянный идентификатор файла в Telegram
+            file_hash: Хэш содержимого
+        """
+        with self._lock:
+            now = self._clock()
+            self._entries.pop(file_unique_id, None)
+            self._entries[file_unique_id] = (file_hash, now + self.ttl_seconds)
+
+            # Записи добавляются по времени, поэтому истекшие - в начале
+            while self._entries:
+                oldest_id, (_, expires_at) = next(iter(self._entries.items()))
+                if expires_at > now and len(self._entries) <= self.max_entries:
+                    break
+                del self._entries[oldest_id]
+                if expires_at <= now:
+                    self._stats["expired"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счетчики попаданий и промахов.
+
+        Returns:
+            Dict[str, int]: Статистика индекса
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+# Общий кэш процесса бота
+parse_cache = ParseCache(
+    max_memory_bytes=config.PARSE_CACHE_MEMORY_BYTES,
+    cache_dir=config.PARSE_CACHE_DIR,
+    max_disk_bytes=config.PARSE_CACHE_DISK_BYTES,
+)
+
+# Общий индекс документов Telegram
+document_index = DocumentIndex(
+    ttl_seconds=config.DOCUMENT_INDEX_TTL,
+    max_entries=config.DOCUMENT_INDEX_MAX_ENTRIES,
+)
@@ -1,132 +1,462 @@
 """
 Парсер Excel файлов с прайс-листами пива.
 """
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional
+from itertools import islice
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+from typing import BinaryIO, Iterator, List, Dict, Optional, Union
 from pathlib import Path
+import config
 from core.column_detector import ColumnDetector
+from core.layout_registry import LayoutRegistry, fingerprint_row, layout_registry
 from core.filters import (
     extract_beer_style,
+    extract_beer_styles,
     extract_brewery_from_filename,
     extract_volume,
     extract_price,
-    clean_text
+    price_kopecks,
+    clean_text,
+    volume_fields
 )
+from ml.vectorizer import AdaptiveColumnClassifier, online_learner
+
+
+# Сколько первых строк листа просматривается при поиске заголовков
+HEADER_SEARCH_ROWS = 11
+
+# Размер блока строк в потоковом режиме (iter_items)
+STREAM_CHUNK_ROWS = 1000
+
+# Источник книги: путь к файлу, байты в памяти или двоичный поток
+ExcelSource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
+
+# Сигнатура OLE2 (формат .xls)
+XLS_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# Явный мусор вместо названий (заголовки разделов, примечания, категории)
+IGNORE_KEYWORDS = [
+    "уважаемые партнеры",
+    "внимание",
+    "примечание",
+    "этикетка",
+    "честный знак",
+    "введением",
+    "отгрузка",
+    "упаковке",
+    "кратно упаковке",
+    "two peaks brew lab",
+    "сидры incider",
+    "otherlab",
+    "платиновая коллекция",
+    "специальные сорта и коллаб",
+    "бокалы и мерч",
+    "крафт фасовка",
+    "крафт розлив",
+    "классическое розлив",
+    "классическое фасовка",
+]
+
+# Короткие служебные слова (статусы), которые не могут быть названием
+SHORT_IGNORE_NAMES = ["много", "мало", "нет в наличии", "достаточно", "н/д", "нет", "ё", ""]
 
 
 class ExcelParser:
     """Парсер Excel файлов с данными о пиве."""
     
-    def __init__(self, auto_learn: bool = True):
+    def __init__(self, auto_learn: bool = True, vectorized: bool = True, workers: Optional[int] = None,
+                 layouts: Optional[LayoutRegistry] = None, learner: Optional[AdaptiveColumnClassifier] = None):
         """
         Инициализация парсера.
         
         Args:
             auto_learn: Автоматически обучаться на новых таблицах
+            vectorized: Извлекать позиции по колонкам (False - старый построчный путь)
+            workers: Процессов для разбора листов (None - из config.PARSER_WORKERS)
+            layouts: Реестр раскладок поставщиков (None - общий реестр процесса)
+            learner: Дообучение модели (None - общее дообучение процесса)
         """
         self.detector = ColumnDetector()
+        self.layouts = layout_registry if layouts is None else layouts
+        self.learner = online_learner if learner is None else learner
         self.auto_learn = auto_learn
-        self.learned_columns = []  # Для накопления обучающих данных
+        self.vectorized = vectorized
+        self.workers = config.PARSER_WORKERS if workers is None else workers
     
-    def parse_file(self, file_path: str, brewery_override: Optional[str] = None) -> List[Dict]:
+    def parse_file(self, file_path: ExcelSource, brewery_override: Optional[str] = None,
+                   filename: Optional[str] = None) -> List[Dict]:
         """
         Парсинг Excel файла (все листы).
         
         Args:
-            file_path: Путь к Excel файлу
+            file_path: Путь к Excel файлу или его содержимое (bytes, memoryview, BytesIO)
             brewery_override: Переопределить пивоварню (если None, извлекается из имени файла)
+            filename: Имя файла для содержимого в памяти
             
         Returns:
             List[Dict]: Список позиций пива
         """
-        path = Path(file_path)
+        name = _source_name(file_path, filename)
         
         # Определение пивоварни
-        brewery = brewery_override or extract_brewery_from_filename(path.name)
+        brewery = brewery_override or extract_brewery_from_filename(name)
         
         # Получаем все листы
         all_beer_items = []
         
         try:
-            xls = pd.ExcelFile(file_path)
-            sheet_names = xls.sheet_names
-            
-            print(f"Обработка {len(sheet_names)} листов...")
-            
-            for sheet_idx, sheet_name in enumerate(sheet_names):
-                # Читаем каждый лист
-                result = self._read_excel_with_header_detection(file_path, sheet_name=sheet_name)
-                
-                if result is None:
-                    continue
+            # Книга открывается один раз: все листы читаются из одного ExcelFile
+            with pd.ExcelFile(_open_source(file_path)) as xls:
+                sheet_names = xls.sheet_names
                 
-                df, header_row_idx = result
+                print(f"Обработка {len(sheet_names)} листов...")
                 
-                if df is None or df.empty:
+                if self.workers > 1 and len(sheet_names) > 1:
+                    sheet_results = self._parse_sheets_parallel(file_path, sheet_names, brewery)
+                else:
+                    sheet_results = [
+                        self._parse_sheet(xls, sheet_idx, sheet_name, brewery)
+                        for sheet_idx, sheet_name in enumerate(sheet_names)
+                    ]
+            
+            for sheet_name, (beer_items, column_types) in zip(sheet_names, sheet_results):
+                if column_types is None:
                     continue
                 
-                # Классификация колонок
-                column_types = self._classify_columns(df)
-                
                 # Автоматическое обучение на новых данных
                 if self.auto_learn:
                     self._learn_from_columns(column_types)
                 
-                # Извлечение данных (передаем sheet_index и header_row_idx)
-                beer_items = self._extract_beer_items(df, column_types, brewery, sheet_index=sheet_idx, header_row_idx=header_row_idx)
                 all_beer_items.extend(beer_items)
                 
                 print(f"  • {sheet_name}: {len(beer_items)} позиций")
         
         except Exception as e:
-            print(f"Ошибка при чтении файла {file_path}: {e}")
+            print(f"Ошибка при чтении файла {name}: {e}")
             return []
         
+        # Постоянный номер позиции в каталоге (номер в списке = _pos + 1)
+        for pos, item in enumerate(all_beer_items):
+            item["_pos"] = pos
+        
         return all_beer_items
     
+    def _parse_sheet(self, xls: pd.ExcelFile, sheet_idx: int, sheet_name, brewery: Optional[str]) -> tuple:
+        """
+        Прочитать, классифицировать и извлечь позиции одного листа.
+        
+        Args:
+            xls: Открытая книга Excel
+            sheet_idx: Индекс листа в Excel файле
+            sheet_name: Название листа
+            brewery: Название пивоварни
+            
+        Returns:
+            tuple: (позиции листа, типы колонок или None для пустого листа)
+        """
+        # Читаем лист (сырая сетка без заголовков и приведения типов)
+        df_grid = xls.parse(sheet_name=sheet_name, header=None, dtype=object)
+        
+        # Известная раскладка: строка заголовков и типы колонок из реестра
+        # (отметка модели берется до классификации: раскладка относится к ней)
+        df = None
+        model_tag = self.detector.model_tag
+        layout = self._match_layout(df_grid.values[:HEADER_SEARCH_ROWS], model_tag)
+        if layout is not None:
+            header_row, column_types = layout
+            df = self._frame_at_header(df_grid, header_row)
+            header_row_idx = header_row + 1
+            if not _layout_matches(df, column_types):
+                df = None
+        
+        if df is None:
+            df, header_row_idx = self._frame_with_header_detection(df_grid)
+            
+            if df is None or df.empty:
+                return [], None
+            
+            # Классификация колонок
+            column_types = self._classify_columns(df)
+            
+            # Заголовки найдены по баллам - запоминаем раскладку
+            if header_row_idx:
+                self._remember_layout(df_grid.values[header_row_idx - 1], column_types, model_tag)
+        
+        if df.empty:
+            return [], None
+        
+        # Извлечение данных (передаем sheet_index и header_row_idx)
+        beer_items = self._extract_beer_items(df, column_types, brewery, sheet_index=sheet_idx, header_row_idx=header_row_idx)
+        return beer_items, column_types
+    
+    def _parse_sheets_parallel(self, file_path: ExcelSource, sheet_names: List, brewery: Optional[str]) -> List[tuple]:
+        """
+        Разобрать листы книги в пуле процессов.
+        
+        Листы распределяются между процессами по кругу, каждый процесс
+        открывает книгу один раз. Результаты возвращаются в порядке листов.
+        Процессы получают снимок реестра раскладок и текущую модель этого
+        процесса (в том числе дообученную в фоне), а найденные ими новые
+        раскладки добавляются в реестр здесь вместе с отметкой модели,
+        которой процесс классифицировал колонки.
+        
+        Args:
+            file_path: Путь к Excel файлу или его содержимое
+            sheet_names: Названия листов
+            brewery: Название пивоварни
+            
+        Returns:
+            List[tuple]: Результаты _parse_sheet для каждого листа
+        """
+        workers = min(self.workers, len(sheet_names))
+        sheets = list(enumerate(sheet_names))
+        groups = [sheets[i::workers] for i in range(workers)]
+        
+        # Процессам передается путь или копия байтов книги
+        source = _picklable_source(file_path)
+        model, model_tag = self.detector.shared.current()
+        self._revalidate_layouts(model_tag)
+        layouts = self.layouts.snapshot(model_tag)
+        executor = _get_process_pool(self.workers)
+        futures = [
+            executor.submit(_parse_sheet_group, source, group, brewery, self.vectorized, layouts, model, model_tag)
+            for group in groups
+        ]
+        
+        results = {}
+        for future in futures:
+            group_results, new_layouts, layout_stats, group_tag = future.result()
+            results.update(group_results)
+            self.layouts.merge(new_layouts, layout_stats, group_tag)
+        return [results[sheet_idx] for sheet_idx in range(len(sheet_names))]
+    
+    def iter_items(self, file_path: ExcelSource, brewery_override: Optional[str] = None,
+                   chunk_rows: int = STREAM_CHUNK_ROWS, filename: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Потоковый парсинг Excel файла: позиции отдаются по мере чтения листов.
+        
+        Книга читается через openpyxl в режиме read_only, в памяти держится
+        только текущий блок из chunk_rows строк. Заголовки ищутся в первых
+        строках листа. Значения ячеек не приводятся к общему типу колонки
+        (целая цена остается "250", а не "250.0"), поэтому результат не
+        зависит от размера блока.
+        
+        Args:
+            file_path: Путь к Excel файлу или его содержимое (bytes, memoryview, BytesIO)
+            brewery_override: Переопределить пивоварню (если None, извлекается из имени файла)
+            chunk_rows: Количество строк в одном блоке
+            filename: Имя файла для содержимого в памяти
+            
+        Yields:
+            Dict: Позиция пива
+        """
+        name = _source_name(file_path, filename)
+        brewery = brewery_override or extract_brewery_from_filename(name)
+        
+        # Формат .xls (xlrd) не поддерживает потоковое чтение
+        if _is_xls(file_path, name):
+            yield from self.parse_file(file_path, brewery_override, filename=filename)
+            return
+        
+        for pos, item in enumerate(self._iter_workbook_items(file_path, name, brewery, chunk_rows)):
+            item["_pos"] = pos
+            yield item
+    
+    def _iter_workbook_items(self, file_path: ExcelSource, name: str, brewery: Optional[str],
+                             chunk_rows: int) -> Iterator[Dict]:
+        """
+        Позиции всех листов книги в режиме read_only (без номеров позиций).
+        
+        Raises:
+            Exception: Ошибка чтения посреди книги (часть позиций уже отдана,
+                поэтому оборванный список не выдается за полный)
+        """
+        try:
+            wb = load_workbook(_open_source(file_path), read_only=True, data_only=True)
+        except Exception as e:
+            print(f"Ошибка при чтении файла {name}: {e}")
+            return
+        
+        try:
+            for sheet_idx, ws in enumerate(wb.worksheets):
+                yield from self._iter_sheet_items(ws, brewery, sheet_idx, chunk_rows)
+        except Exception as e:
+            print(f"Ошибка при чтении файла {name}: {e}")
+            raise
+        finally:
+            wb.close()
+    
+    def _iter_sheet_items(self, ws, brewery: Optional[str], sheet_idx: int, chunk_rows: int) -> Iterator[Dict]:
+        """
+        Потоково извлечь позиции одного листа.
+        
+        Args:
+            ws: Лист openpyxl (read_only)
+            brewery: Название пивоварни
+            sheet_idx: Индекс листа в Excel файле
+            chunk_rows: Количество строк в одном блоке
+            
+        Yields:
+            Dict: Позиция пива
+        """
+        ws.reset_dimensions()
+        rows = ([_convert_cell(cell) for cell in row] for row in ws.iter_rows())
+        
+        # Заголовки ищем в первых строках листа
+        head = list(islice(rows, HEADER_SEARCH_ROWS))
+        if not head:
+            return
+        # Известная раскладка - заголовки не ищем
+        model_tag = self.detector.model_tag
+        layout = self._match_layout(head, model_tag)
+        layout_types = None
+        detected = False
+        if layout is not None:
+            header_row, layout_types = layout
+        else:
+            df_head = _grid_from_rows(head).dropna(how='all').dropna(axis=1, how='all')
+            header_row = self._detect_header_row(df_head) if not df_head.empty else None
+            detected = header_row is not None
+            if header_row is None:
+                header_row = 0
+        
+        header = head[header_row]
+        if not header:
+            return
+        
+        # Строки после заголовка: остаток буфера + поток
+        data_rows = iter(head[header_row + 1:])
+        first_row = header_row + 2  # Номер первой строки данных в Excel
+        column_types = None
+        carry = {}
+        
+        while True:
+            chunk = list(islice(data_rows, chunk_rows))
+            if not chunk:
+                chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                break
+            
+            df = _frame_from_rows(header, chunk)
+            df['_original_row'] = range(first_row, first_row + len(df))
+            first_row += len(df)
+            
+            # Колонки одинаковы для всех блоков листа - классифицируем один раз
+            if column_types is None:
+                if layout_types is not None and _layout_matches(df, layout_types):
+                    column_types = layout_types
+                else:
+                    column_types = self._classify_columns(df)
+                    if detected:
+                        self._remember_layout(header, column_types, model_tag)
+                if self.auto_learn:
+                    self._learn_from_columns(column_types)
+            
+            yield from self._extract_beer_items(
+                df, column_types, brewery,
+                sheet_index=sheet_idx, header_row_idx=header_row + 1, carry=carry
+            )
+    
     def _learn_from_columns(self, column_types: Dict[str, str]):
         """
-        Накопить данные для обучения из классифицированных колонок.
+        Передать классифицированные колонки на дообучение (модель дообучается в фоне).
         
         Args:
             column_types: Классифицированные колонки
         """
-        for col_name, col_type in column_types.items():
-            if col_type != "IGNORE":
-                self.learned_columns.append((col_name, col_type))
+        self.learner.learn(column_types)
     
     def save_learned_data(self):
         """
-        Сохранить накопленные данные и переобучить модель.
+        Дообучить общую модель на накопленных примерах сразу, не дожидаясь фонового дообучения.
+        
+        Раскладки старой модели реестр забудет сам: у новой модели другая отметка.
         """
-        if not self.learned_columns or len(self.learned_columns) < 3:
-            return
+        self.learner.flush()
+    
+    def _match_layout(self, rows, model_tag: Optional[str] = None) -> Optional[tuple]:
+        """
+        Найти известную раскладку среди первых строк листа.
         
-        from ml.vectorizer import AdaptiveColumnClassifier
+        Args:
+            rows: Первые строки сырой сетки листа
+            model_tag: Отметка текущей модели (раскладки другой модели не подходят)
+            
+        Returns:
+            Optional[tuple]: (индекс строки заголовков, типы колонок) или None
+        """
+        self._revalidate_layouts(model_tag)
+        for idx, row in enumerate(rows):
+            fingerprint = fingerprint_row(row)
+            if fingerprint is None:
+                continue
+            column_types = self.layouts.get(fingerprint, model_tag)
+            if column_types is not None:
+                return idx, column_types
         
-        adaptive = AdaptiveColumnClassifier()
-        for col_name, col_type in self.learned_columns:
-            adaptive.training_samples.append(col_name)
-            adaptive.training_labels.append(col_type)
+        self.layouts.record_miss()
+        return None
+    
+    def _revalidate_layouts(self, model_tag: Optional[str]):
+        """
+        Перепроверить реестр раскладок, если модель сменилась.
         
-        adaptive.retrain_and_save()
+        Args:
+            model_tag: Отметка текущей модели
+        """
+        if model_tag is not None and self.layouts.model != model_tag:
+            self.layouts.revalidate(model_tag, self.detector.detect_column_types)
+    
+    def _remember_layout(self, header_cells, column_types: Dict[str, str], model_tag: Optional[str] = None):
+        """
+        Запомнить раскладку листа по строке заголовков.
         
-        # Перезагружаем детектор
-        self.detector._load_model()
+        Args:
+            header_cells: Ячейки строки заголовков
+            column_types: Типы колонок
+            model_tag: Отметка модели, классифицировавшей колонки
+        """
+        fingerprint = fingerprint_row(header_cells)
+        if fingerprint is not None:
+            self.layouts.put(fingerprint, column_types, model_tag)
     
-    def _read_excel_with_header_detection(self, file_path: str, sheet_name=0) -> Optional[tuple]:
+    def _read_excel_with_header_detection(self, xls: pd.ExcelFile, sheet_name=0) -> Optional[tuple]:
         """
-        Прочитать Excel с автоматическим определением строки заголовков.
+        Прочитать лист Excel с автоматическим определением строки заголовков.
+        
+        Лист читается из открытой книги один раз (сырая сетка без типизации),
+        итоговый DataFrame с заголовками строится из неё в памяти.
         
         Args:
-            file_path: Путь к файлу
+            xls: Открытая книга Excel
             sheet_name: Номер или название листа (по умолчанию 0)
             
         Returns:
             Optional[tuple]: Кортеж (DataFrame, header_row_index) или None
         """
-        # Сначала читаем без заголовков
-        df_raw = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+        # Сначала читаем без заголовков и без приведения типов
+        df_grid = xls.parse(sheet_name=sheet_name, header=None, dtype=object)
+        return self._frame_with_header_detection(df_grid)
+    
+    def _frame_with_header_detection(self, df_grid: pd.DataFrame) -> tuple:
+        """
+        Найти строку заголовков в сырой сетке листа и построить DataFrame.
+        
+        Args:
+            df_grid: Сырая сетка листа (header=None, dtype=object)
+            
+        Returns:
+            tuple: (DataFrame или None, индекс строки заголовка в Excel; 0 - заголовки не найдены)
+        """
+        df_raw = df_grid
         
         if df_raw.empty:
             return None, 0
@@ -136,6 +466,45 @@ class ExcelParser:
         if df_raw.empty:
             return None, 0
         
+        header_row = self._detect_header_row(df_raw)
+        
+        # Если нашли заголовки - строим DataFrame начиная с них
+        if header_row is not None:
+            # Возвращаем DataFrame и индекс строки заголовка (в нумерации Excel: +1)
+            return self._frame_at_header(df_grid, header_row), header_row + 1
+        else:
+            # Если не нашли - заголовок в первой строке
+            return self._frame_at_header(df_grid, 0), 0
+    
+    def _frame_at_header(self, df_grid: pd.DataFrame, header_row: int) -> pd.DataFrame:
+        """
+        Построить DataFrame с заголовками из строки header_row сырой сетки.
+        
+        Args:
+            df_grid: Сырая сетка листа
+            header_row: Индекс строки заголовков в сетке
+            
+        Returns:
+            pd.DataFrame: Данные листа с колонкой _original_row
+        """
+        df = self._frame_from_grid(df_grid, header_row)
+        # НЕ УДАЛЯЕМ пустые строки - нам нужны оригинальные индексы!
+        # Сохраняем оригинальные индексы строк из Excel
+        df['_original_row'] = range(header_row + 2, header_row + 2 + len(df))
+        # Очищаем имена колонок от пробелов
+        df.columns = [str(col).strip() if col != '_original_row' else col for col in df.columns]
+        return df
+    
+    def _detect_header_row(self, df_raw: pd.DataFrame) -> Optional[int]:
+        """
+        Найти строку заголовков среди первых строк сырой сетки листа.
+        
+        Args:
+            df_raw: Сырая сетка листа без полностью пустых строк и столбцов
+            
+        Returns:
+            Optional[int]: Индекс строки заголовков или None
+        """
         # Ищем строку с заголовками (содержит ключевые колонки)
         # Ищем строку, где есть явные заголовки колонок (название И цена)
         header_row = None
@@ -181,22 +550,28 @@ class ExcelParser:
                     best_match_score = score
                     header_row = idx
         
-        # Если нашли заголовки - читаем с них
-        if header_row is not None:
-            df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row)
-            # НЕ УДАЛЯЕМ пустые строки - нам нужны оригинальные индексы!
-            # Сохраняем оригинальные индексы строк из Excel
-            df['_original_row'] = range(header_row + 2, header_row + 2 + len(df))
-            # Очищаем имена колонок от пробелов
-            df.columns = [str(col).strip() if col != '_original_row' else col for col in df.columns]
-            # Возвращаем DataFrame и индекс строки заголовка (в нумерации Excel: +1)
-            return df, header_row + 1
-        else:
-            # Если не нашли - читаем как обычно
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            df['_original_row'] = range(2, 2 + len(df))
-            df.columns = [str(col).strip() if col != '_original_row' else col for col in df.columns]
-            return df, 0
+        return header_row
+    
+    @staticmethod
+    def _frame_from_grid(df_grid: pd.DataFrame, header_row: int) -> pd.DataFrame:
+        """
+        Построить DataFrame с заголовками из сырой сетки листа.
+        
+        Повторяет разбор pd.read_excel(header=header_row): имена колонок,
+        "Unnamed: N", дубликаты и приведение типов, но без повторного
+        чтения файла.
+        
+        Args:
+            df_grid: Сырая сетка листа (header=None, dtype=object)
+            header_row: Индекс строки заголовков в сетке
+            
+        Returns:
+            pd.DataFrame: Данные листа с заголовками
+        """
+        # Пустые ячейки возвращаем в исходный вид, как их отдает reader
+        rows = df_grid.astype(object).where(df_grid.notna(), "").values.tolist()
+        parser = TextParser(rows, header=header_row, skip_blank_lines=False)
+        return parser.read()
     
     def _classify_columns(self, df: pd.DataFrame) -> Dict[str, str]:
         """
@@ -208,44 +583,22 @@ class ExcelParser:
         Returns:
             Dict[str, str]: Маппинг {название_колонки: тип}
         """
-        column_types = {}
-        
-        for col in df.columns:
-            # Пропускаем служебные колонки
-            if col == '_original_row':
-                continue
-            col_type = self.detector.detect_column_type(str(col))
-            column_types[col] = col_type
-        
-        return column_types
+        # Пропускаем служебные колонки; все названия листа - одним пакетом
+        columns = [col for col in df.columns if col != '_original_row']
+        column_types = self.detector.detect_column_types([str(col) for col in columns])
+        return dict(zip(columns, column_types))
     
-    def _extract_beer_items(
-        self,
-        df: pd.DataFrame,
-        column_types: Dict[str, str],
-        brewery: Optional[str],
-        sheet_index: int = 0,
-        header_row_idx: int = 0
-    ) -> List[Dict]:
+    def _select_columns(self, df: pd.DataFrame, column_types: Dict[str, str]) -> Dict[str, List[str]]:
         """
-        Извлечь позиции пива из DataFrame.
+        Выбрать колонки-источники для каждого поля позиции.
         
         Args:
             df: DataFrame с данными
             column_types: Типы колонок
-            brewery: Название пивоварни
-            sheet_index: Индекс листа в Excel файле
-            header_row_idx: Индекс строки заголовка в Excel (для правильного расчета _row_index)
             
         Returns:
-            List[Dict]: Список позиций пива
+            Dict[str, List[str]]: Колонки по полям (в порядке приоритета)
         """
-        beer_items = []
-        
-        # Оптимизация: предварительно фильтруем DataFrame
-        # Убираем строки где нет названия или цены
-        df = df.dropna(subset=[col for col, typ in column_types.items() if typ in ["NAME", "PRICE"]], how='all')
-        
         # Найти колонки по типам
         name_cols = [col for col, typ in column_types.items() if typ == "NAME"]
         brewery_cols = [col for col, typ in column_types.items() if typ == "BREWERY"]
@@ -268,11 +621,221 @@ class ExcelParser:
         # Для объема: игнорируем колонку "заказ" - там количество, а не объем
         volume_cols = [col for col in volume_cols if 'заказ' not in col.lower() and 'order' not in col.lower()]
         
+        # Остаток / Наличие (в штуках или текстом: "много", "мало", "достаточно")
+        stock_cols = [col for col in df.columns if 'остаток' in col.lower() or 'остатк' in col.lower() or 'наличие' in col.lower() or 'наличи' in col.lower()]
+        
         # ORDER_QUANTITY - колонка для заказа
         order_cols = [col for col, typ in column_types.items() if typ == "ORDER_QUANTITY"]
         
+        return {
+            "name": name_cols,
+            "brewery": brewery_cols,
+            "style": style_cols,
+            "volume": volume_cols,
+            "price": price_cols,
+            "stock": stock_cols,
+            "order": order_cols,
+        }
+    
+    def _extract_beer_items(
+        self,
+        df: pd.DataFrame,
+        column_types: Dict[str, str],
+        brewery: Optional[str],
+        sheet_index: int = 0,
+        header_row_idx: int = 0,
+        carry: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Извлечь позиции пива из DataFrame.
+        
+        Args:
+            df: DataFrame с данными
+            column_types: Типы колонок
+            brewery: Название пивоварни
+            sheet_index: Индекс листа в Excel файле
+            header_row_idx: Индекс строки заголовка в Excel (для правильного расчета _row_index)
+            carry: Состояние между блоками строк одного листа (потоковый режим)
+            
+        Returns:
+            List[Dict]: Список позиций пива
+        """
+        if self.vectorized:
+            return self._extract_beer_items_vectorized(df, column_types, brewery, sheet_index, header_row_idx, carry)
+        return self._extract_beer_items_rowwise(df, column_types, brewery, sheet_index, header_row_idx, carry)
+    
+    def _extract_beer_items_vectorized(
+        self,
+        df: pd.DataFrame,
+        column_types: Dict[str, str],
+        brewery: Optional[str],
+        sheet_index: int = 0,
+        header_row_idx: int = 0,
+        carry: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Извлечь позиции пива по колонкам (pandas .str и numpy вместо iterrows).
+        
+        Результат совпадает с _extract_beer_items_rowwise: те же правила
+        выбора колонок, подхват названия для кег, нормализация и фильтрация.
+        
+        Args:
+            df: DataFrame с данными
+            column_types: Типы колонок
+            brewery: Название пивоварни
+            sheet_index: Индекс листа в Excel файле
+            header_row_idx: Индекс строки заголовка в Excel (для правильного расчета _row_index)
+            carry: Состояние между блоками строк одного листа (потоковый режим)
+            
+        Returns:
+            List[Dict]: Список позиций пива
+        """
+        df = df.dropna(subset=[col for col, typ in column_types.items() if typ in ["NAME", "PRICE"]], how='all')
+        if df.empty:
+            return []
+        
+        columns = self._select_columns(df, column_types)
+        positions = {col: i for i, col in enumerate(df.columns)}
+        
+        # Те же значения, что отдает iterrows (общий тип строки DataFrame)
+        values = df.values
+        n_rows = len(values)
+        
+        def pick(cols):
+            return _first_present(values, [positions[col] for col in cols])
+        
+        # Пропускаем пустые строки (кроме _original_row)
+        data_positions = [i for col, i in positions.items() if col != '_original_row']
+        non_empty = pd.notna(values[:, data_positions]).any(axis=1)
+        
+        if '_original_row' in positions:
+            row_index = _to_int(values[:, positions['_original_row']])
+        else:
+            row_index = np.arange(header_row_idx + 1, header_row_idx + 1 + n_rows).astype(object)
+        
+        # Название
+        name_raw, name_present = pick(columns["name"])
+        names = _clean_text_column(name_raw, name_present)
+        
+        # Объем (исходный текст ячейки нужен и для подхвата названия кег)
+        volume_raw, volume_present = pick(columns["volume"])
+        volume_text = _empty_column(n_rows)
+        volume_text[volume_present] = _str_column(volume_raw[volume_present], strip=True)
+        
+        # Пустое название + кега в объеме = альтернативная тара предыдущего пива
+        # Индекс последней строки с названием (forward-fill через накопленный максимум)
+        last_named = np.maximum.accumulate(np.where(name_present, np.arange(n_rows), -1))
+        last_names = np.where(last_named >= 0, names[last_named], None)
+        if carry is not None:
+            # Название последнего пива из предыдущего блока строк
+            last_names[last_named < 0] = carry.get("last_name")
+            if name_present.any():
+                carry["last_name"] = names[last_named[-1]]
+        volume_lower = pd.Series(volume_text, dtype=object).str.lower()
+        is_keg_row = (volume_lower.str.contains('кег', regex=False) | volume_lower.str.contains('keg', regex=False))
+        inherit = ~_truthy(names) & _truthy(last_names) & _truthy(volume_text) & is_keg_row.fillna(False).to_numpy(dtype=bool)
+        names[inherit] = last_names[inherit]
+        has_name = _truthy(names)
+        
+        # Пивоварня (если есть в колонках, переопределяет название из файла)
+        brewery_raw, brewery_present = pick(columns["brewery"])
+        breweries = np.full(n_rows, brewery, dtype=object)
+        breweries[brewery_present] = _clean_text_column(brewery_raw, brewery_present)[brewery_present]
+        
+        # Стиль; если не найден - извлекаем из названия
+        style_raw, style_present = pick(columns["style"])
+        styles = _clean_text_column(style_raw, style_present)
+        need_style = ~_truthy(styles) & has_name
+        extracted = _map_unique_batch(names[need_style], extract_beer_styles)
+        found = _truthy(extracted)
+        styles[np.flatnonzero(need_style)[found]] = extracted[found]
+        
+        # Объем (НЕ используем clean_text - он обрезает многострочный текст)
+        volumes = _empty_column(n_rows)
+        normalized = _map_unique(volume_text[volume_present], extract_volume)
+        volumes[volume_present] = np.where(_truthy(normalized), normalized, volume_text[volume_present])
+        need_volume = ~_truthy(volumes) & has_name
+        volumes[need_volume] = _map_unique(names[need_volume], extract_volume)
+        fields = [volume_fields(volume) for volume in volumes]
+        is_keg = np.fromiter((field.is_keg for field in fields), dtype=bool, count=n_rows)
+        
+        # Цена
+        price_raw, price_present = pick(columns["price"])
+        price_text = _clean_text_column(price_raw, price_present)
+        prices = _extract_price_column(price_text)
+        
+        # Остаток: число или текст ("много", "мало", "достаточно")
+        stock_raw, stock_present = pick(columns["stock"])
+        stocks = _empty_column(n_rows)
+        stocks[stock_present] = _to_stock(stock_raw[stock_present])
+        
+        # Заказ (колонка ORDER_QUANTITY)
+        order_raw, order_present = pick(columns["order"])
+        orders = _empty_column(n_rows)
+        orders[order_present] = _to_order(order_raw[order_present])
+        
+        # Фильтрация: добавляем только валидные позиции пива
+        keep = non_empty & _valid_items_mask(names, prices, stocks, is_keg)
+        
+        return [
+            {
+                "пивоварня": breweries[i],
+                "название": names[i],
+                "стиль": styles[i],
+                "объем": volumes[i],
+                "цена": prices[i],
+                "остаток": stocks[i],
+                "заказ": orders[i],
+                "_row_index": row_index[i],
+                "_sheet_index": sheet_index,
+                "_volume_l": fields[i].liters,
+                "_container": fields[i].container,
+                "_is_keg": fields[i].is_keg,
+                "_price_kop": price_kopecks(prices[i]),
+            }
+            for i in np.flatnonzero(keep)
+        ]
+    
+    def _extract_beer_items_rowwise(
+        self,
+        df: pd.DataFrame,
+        column_types: Dict[str, str],
+        brewery: Optional[str],
+        sheet_index: int = 0,
+        header_row_idx: int = 0,
+        carry: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Извлечь позиции пива из DataFrame построчно (исходный путь через iterrows).
+        
+        Args:
+            df: DataFrame с данными
+            column_types: Типы колонок
+            brewery: Название пивоварни
+            sheet_index: Индекс листа в Excel файле
+            header_row_idx: Индекс строки заголовка в Excel (для правильного расчета _row_index)
+            carry: Состояние между блоками строк одного листа (потоковый режим)
+            
+        Returns:
+            List[Dict]: Список позиций пива
+        """
+        beer_items = []
+        
+        # Оптимизация: предварительно фильтруем DataFrame
+        # Убираем строки где нет названия или цены
+        df = df.dropna(subset=[col for col, typ in column_types.items() if typ in ["NAME", "PRICE"]], how='all')
+        
+        columns = self._select_columns(df, column_types)
+        name_cols = columns["name"]
+        brewery_cols = columns["brewery"]
+        style_cols = columns["style"]
+        volume_cols = columns["volume"]
+        price_cols = columns["price"]
+        stock_cols = columns["stock"]
+        order_cols = columns["order"]
+        
         # Обработка каждой строки
-        last_beer_name = None  # Для подхвата названия для кег в следующих строках
+        last_beer_name = carry.get("last_name") if carry else None  # Для подхвата названия для кег в следующих строках
         
         for row_num, (idx, row) in enumerate(df.iterrows()):
             # Пропускаем пустые строки (кроме _original_row)
@@ -293,6 +856,10 @@ class ExcelParser:
                 "заказ": None,
                 "_row_index": excel_row,
                 "_sheet_index": sheet_index,
+                "_volume_l": None,
+                "_container": None,
+                "_is_keg": False,
+                "_price_kop": None,
             }
             
             # Название
@@ -357,6 +924,12 @@ class ExcelParser:
             if not item["объем"] and item["название"]:
                 item["объем"] = extract_volume(item["название"])
             
+            # Литраж, тара и признак кеги - один раз при парсинге
+            fields = volume_fields(item["объем"])
+            item["_volume_l"] = fields.liters
+            item["_container"] = fields.container
+            item["_is_keg"] = fields.is_keg
+            
             # Цена
             if price_cols:
                 for col in price_cols:
@@ -365,9 +938,9 @@ class ExcelParser:
                         price_text = clean_text(val)
                         item["цена"] = extract_price(price_text, item["объем"])
                         break
+            item["_price_kop"] = price_kopecks(item["цена"])
             
             # Остаток / Наличие (в штуках или текстом: "много", "мало", "достаточно")
-            stock_cols = [col for col in df.columns if 'остаток' in col.lower() or 'остатк' in col.lower() or 'наличие' in col.lower() or 'наличи' in col.lower()]
             if stock_cols:
                 for col in stock_cols:
                     val = row[col]
@@ -397,6 +970,9 @@ class ExcelParser:
             if self._is_valid_beer_item(item):
                 beer_items.append(item)
         
+        if carry is not None:
+            carry["last_name"] = last_beer_name
+        
         return beer_items
     
     def _is_valid_beer_item(self, item: Dict) -> bool:
@@ -412,14 +988,13 @@ class ExcelParser:
         name = item.get("название", "")
         price = item.get("цена", "")
         stock = item.get("остаток")
-        volume = item.get("объем", "")
         
         # Должно быть название
         if not name or len(name) < 2:
             return False
         
         # Проверяем это кега или нет
-        is_keg = 'кег' in str(volume).lower()
+        is_keg = item.get("_is_keg", False)
         
         # Фильтр по остаткам (НЕ применяется к кегам!)
         if stock is not None and not is_keg:
@@ -436,36 +1011,12 @@ class ExcelParser:
         
         name_lower = name.lower()
         
-        # Игнорируем ТОЛЬКО явный мусор (заголовки разделов, примечания, категории)
-        ignore_keywords = [
-            "уважаемые партнеры",
-            "внимание",
-            "примечание",
-            "этикетка",
-            "честный знак",
-            "введением",
-            "отгрузка",
-            "упаковке",
-            "кратно упаковке",
-            "two peaks brew lab",
-            "сидры incider",
-            "otherlab",
-            "платиновая коллекция",
-            "специальные сорта и коллаб",
-            "бокалы и мерч",
-            "крафт фасовка",
-            "крафт розлив",
-            "классическое розлив",
-            "классическое фасовка",
-        ]
-        
         # Проверяем на служебные записи
-        if any(keyword in name_lower for keyword in ignore_keywords):
+        if any(keyword in name_lower for keyword in IGNORE_KEYWORDS):
             return False
         
         # Игнорируем короткие служебные слова (статусы)
-        short_ignore = ["много", "мало", "нет в наличии", "достаточно", "н/д", "нет", "ё", ""]
-        if name_lower.strip() in short_ignore:
+        if name_lower.strip() in SHORT_IGNORE_NAMES:
             return False
         
         # Игнорируем строки из 1 символа
@@ -483,3 +1034,408 @@ class ExcelParser:
         
         return has_valid_name and has_valid_price
 
+
+# Пулы процессов создаются один раз на процесс бота (по пулу на число процессов)
+# и переиспользуются потоками планировщика парсинга
+_process_pools: Dict[int, ProcessPoolExecutor] = {}
+_process_pools_lock = threading.Lock()
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Получить общий пул процессов для разбора листов.
+    
+    Процессы запускаются через spawn: бот многопоточный (планировщик,
+    таймер дообучения, цикл событий), а fork копирует только текущий поток
+    вместе с чужими захваченными блокировками. Пул другого размера не
+    заменяет существующий: в тот может отправлять задачи другой поток.
+    
+    Args:
+        workers: Количество процессов
+        
+    Returns:
+        ProcessPoolExecutor: Пул процессов
+    """
+    with _process_pools_lock:
+        pool = _process_pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _process_pools[workers] = pool
+        return pool
+
+
+def shutdown_process_pool():
+    """Остановить пулы процессов разбора листов (при остановке бота)."""
+    with _process_pools_lock:
+        pools = list(_process_pools.values())
+        _process_pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _parse_sheet_group(file_path: Union[str, bytes], sheets: List[tuple], brewery: Optional[str], vectorized: bool,
+                       layouts: Dict[str, Dict[str, str]], model=None, model_tag: Optional[str] = None) -> tuple:
+    """
+    Разобрать группу листов в процессе пула.
+    
+    Реестр раскладок процесса - копия в памяти: файл реестра пишет только
+    родительский процесс, иначе процессы пула затирали бы записи друг друга.
+    Колонки классифицирует модель родительского процесса: дообученная в фоне
+    модель есть только у него.
+    
+    Args:
+        file_path: Путь к Excel файлу или байты книги
+        sheets: Пары (индекс листа, название листа)
+        brewery: Название пивоварни
+        vectorized: Векторное извлечение позиций
+        layouts: Снимок реестра раскладок родительского процесса
+        model: Модель классификатора колонок родительского процесса
+        model_tag: Отметка модели (раскладки снимка классифицированы ею)
+        
+    Returns:
+        tuple: Результаты _parse_sheet по индексу листа, новые раскладки, счетчики
+            реестра и отметка модели процесса
+    """
+    registry = LayoutRegistry(max_entries=max(len(layouts), 1) + len(sheets))
+    registry.merge(layouts, model=model_tag)
+    parser = ExcelParser(auto_learn=False, vectorized=vectorized, workers=0, layouts=registry)
+    if model_tag is not None:
+        parser.detector.shared.adopt(model, model_tag)
+    # Отметка модели процесса берется до разбора: раскладки относятся к ней
+    group_tag = parser.detector.model_tag
+    with pd.ExcelFile(_open_source(file_path)) as xls:
+        results = {
+            sheet_idx: parser._parse_sheet(xls, sheet_idx, sheet_name, brewery)
+            for sheet_idx, sheet_name in sheets
+        }
+    new_layouts = {
+        fingerprint: column_types
+        for fingerprint, column_types in registry.snapshot().items()
+        if group_tag != model_tag or layouts.get(fingerprint) != column_types
+    }
+    stats = registry.stats()
+    del stats["entries"]
+    return results, new_layouts, stats, group_tag
+
+
+def _open_source(source: ExcelSource):
+    """
+    Подготовить источник для pd.ExcelFile и load_workbook.
+    
+    Байты оборачиваются в BytesIO, поток перематывается в начало,
+    путь возвращается как есть.
+    
+    Args:
+        source: Путь, байты или двоичный поток
+        
+    Returns:
+        Путь или двоичный поток
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    if hasattr(source, 'read'):
+        source.seek(0)
+        return source
+    return str(source)
+
+
+def _picklable_source(source: ExcelSource) -> Union[str, bytes]:
+    """
+    Источник для передачи в процесс пула: путь или байты книги.
+    
+    Args:
+        source: Путь, байты или двоичный поток
+        
+    Returns:
+        Union[str, bytes]: Путь или содержимое книги
+    """
+    if isinstance(source, (str, Path)):
+        return str(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    source.seek(0)
+    return source.read()
+
+
+def _source_name(source: ExcelSource, filename: Optional[str] = None) -> str:
+    """
+    Имя файла источника (для пивоварни и сообщений об ошибках).
+    
+    Args:
+        source: Путь, байты или двоичный поток
+        filename: Явно переданное имя файла
+        
+    Returns:
+        str: Имя файла или пустая строка
+    """
+    if filename:
+        return filename
+    if isinstance(source, (str, Path)):
+        return Path(source).name
+    return ''
+
+
+def _is_xls(source: ExcelSource, name: str) -> bool:
+    """
+    Книга в старом формате .xls: по расширению или по сигнатуре содержимого.
+    
+    Args:
+        source: Путь, байты или двоичный поток
+        name: Имя файла
+        
+    Returns:
+        bool: True для .xls
+    """
+    if name:
+        return Path(name).suffix.lower() == '.xls'
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:len(XLS_SIGNATURE)]) == XLS_SIGNATURE
+    source.seek(0)
+    return source.read(len(XLS_SIGNATURE)) == XLS_SIGNATURE
+
+
+def _layout_matches(df: pd.DataFrame, column_types: Dict[str, str]) -> bool:
+    """
+    Проверить, что колонки листа совпадают с колонками запомненной раскладки.
+    
+    Args:
+        df: DataFrame листа
+        column_types: Типы колонок из реестра
+        
+    Returns:
+        bool: True если раскладку можно применить
+    """
+    return [col for col in df.columns if col != '_original_row'] == list(column_types)
+
+
+def _convert_cell(cell):
+    """
+    Значение ячейки openpyxl в том виде, в каком его отдает pd.read_excel.
+    
+    Args:
+        cell: Ячейка openpyxl
+        
+    Returns:
+        Значение ячейки ("" для пустой, int для целых чисел)
+    """
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    return value
+
+
+def _pad_rows(rows: List[list], width: int) -> List[list]:
+    """Дополнить строки пустыми ячейками до ширины."""
+    return [row + [""] * (width - len(row)) for row in rows]
+
+
+def _grid_from_rows(rows: List[list]) -> pd.DataFrame:
+    """Сырая сетка (header=None, без приведения типов) из строк листа."""
+    width = max(len(row) for row in rows)
+    if width == 0:
+        return pd.DataFrame()
+    return TextParser(_pad_rows(rows, width), header=None, dtype=object, skip_blank_lines=False).read()
+
+
+def _frame_from_rows(header: list, rows: List[list]) -> pd.DataFrame:
+    """
+    DataFrame блока строк с заголовками листа.
+    
+    Args:
+        header: Строка заголовков
+        rows: Строки данных блока
+        
+    Returns:
+        pd.DataFrame: Данные блока (значения без приведения к типу колонки);
+        ячейки правее заголовков - в колонках "Unnamed: N", как в pd.read_excel
+    """
+    width = max([len(header)] + [len(row) for row in rows])
+    parser = TextParser(_pad_rows([header] + rows, width), header=0, dtype=object, skip_blank_lines=False)
+    df = parser.read()
+    df.columns = [str(col).strip() for col in df.columns]
+    return df
+
+
+def _empty_column(size: int) -> np.ndarray:
+    """Колонка из None (object), заполняемая по маске."""
+    return np.full(size, None, dtype=object)
+
+
+def _truthy(values: np.ndarray) -> np.ndarray:
+    """Поэлементный bool(value) для object-колонки."""
+    if len(values) == 0:
+        return np.zeros(0, dtype=bool)
+    return np.frompyfunc(bool, 1, 1)(values).astype(bool)
+
+
+def _str_column(values: np.ndarray, strip: bool = False) -> np.ndarray:
+    """Поэлементный str(value) (опционально со strip) для object-колонки."""
+    result = np.frompyfunc(str, 1, 1)(values).astype(object)
+    if strip and len(result):
+        result = pd.Series(result, dtype=object).str.strip().to_numpy(dtype=object)
+    return result
+
+
+def _first_present(values: np.ndarray, col_positions: List[int]) -> tuple:
+    """
+    Взять первое непустое значение строки среди колонок (в порядке приоритета).
+    
+    Args:
+        values: Значения DataFrame (df.values)
+        col_positions: Позиции колонок
+        
+    Returns:
+        tuple: (значения, маска наличия значения)
+    """
+    picked = _empty_column(len(values))
+    present = np.zeros(len(values), dtype=bool)
+    for pos in col_positions:
+        column = values[:, pos]
+        take = ~present & pd.notna(column)
+        picked[take] = column[take]
+        present |= take
+    return picked, present
+
+
+def _clean_text_column(raw: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """
+    Векторный аналог clean_text для заполненных ячеек колонки.
+    
+    Args:
+        raw: Исходные значения ячеек
+        present: Маска заполненных ячеек
+        
+    Returns:
+        np.ndarray: Очищенный текст ("" для ложных значений, None для пустых ячеек)
+    """
+    result = _empty_column(len(raw))
+    if not present.any():
+        return result
+    
+    cells = raw[present]
+    text = (
+        pd.Series(_str_column(cells), dtype=object)
+        .str.strip()
+        # Многострочный текст - берём только первую строку (это название)
+        .str.split('\n', n=1).str[0]
+        .str.strip()
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+    result[present] = np.where(_truthy(cells), text.to_numpy(dtype=object), "")
+    return result
+
+
+def _map_unique(values: np.ndarray, func) -> np.ndarray:
+    """
+    Применить функцию к строковым значениям, вызывая её один раз на уникальное значение.
+    
+    Args:
+        values: Строковые значения (object)
+        func: Функция str -> результат
+        
+    Returns:
+        np.ndarray: Результаты (object)
+    """
+    if len(values) == 0:
+        return _empty_column(0)
+    codes, uniques = pd.factorize(values)
+    results = np.array([func(value) for value in uniques] + [None], dtype=object)
+    return results[codes]
+
+
+def _map_unique_batch(values: np.ndarray, batch_func) -> np.ndarray:
+    """
+    Применить пакетную функцию к уникальным строковым значениям.
+    
+    Args:
+        values: Строковые значения (object)
+        batch_func: Функция список str -> список результатов
+        
+    Returns:
+        np.ndarray: Результаты (object)
+    """
+    if len(values) == 0:
+        return _empty_column(0)
+    codes, uniques = pd.factorize(values)
+    results = np.array(list(batch_func(list(uniques))) + [None], dtype=object)
+    return results[codes]
+
+
+def _extract_price_column(price_text: np.ndarray) -> np.ndarray:
+    """Векторный аналог extract_price: первое число + " руб."."""
+    prices = _empty_column(len(price_text))
+    has_text = _truthy(price_text)
+    if not has_text.any():
+        return prices
+    
+    numbers = pd.Series(price_text[has_text], dtype=object).str.extract(r'(\d+(?:[.,]\d+)?)', expand=False)
+    formatted = numbers.str.replace(',', '.', regex=False) + " руб."
+    prices[has_text] = formatted.where(numbers.notna(), None).to_numpy(dtype=object)
+    return prices
+
+
+def _stock_value(val):
+    """Остаток: целое число или текст в нижнем регистре."""
+    try:
+        return int(float(val))
+    except (ValueError, TypeError):
+        return str(val).strip().lower()
+
+
+def _order_value(val):
+    """Заказ: целое число, 0 если не число."""
+    try:
+        return int(float(val))
+    except (ValueError, TypeError):
+        return 0
+
+
+_to_int = np.frompyfunc(int, 1, 1)
+_to_stock = np.frompyfunc(_stock_value, 1, 1)
+_to_order = np.frompyfunc(_order_value, 1, 1)
+
+# Одно регулярное выражение вместо any(...) по списку ключевых слов
+_IGNORE_KEYWORDS_RE = '|'.join(re.escape(keyword) for keyword in IGNORE_KEYWORDS)
+
+
+def _valid_items_mask(names: np.ndarray, prices: np.ndarray, stocks: np.ndarray, is_keg: np.ndarray) -> np.ndarray:
+    """
+    Векторный аналог ExcelParser._is_valid_beer_item.
+    
+    Args:
+        names: Названия
+        prices: Цены
+        stocks: Остатки
+        is_keg: Признак кеги
+        
+    Returns:
+        np.ndarray: Маска валидных позиций
+    """
+    name = pd.Series(names, dtype=object).fillna("")
+    name_lower = name.str.lower()
+    name_stripped_len = name.str.strip().str.len()
+    
+    # Должно быть название (не мусор, не статус, от 2 до 200 символов)
+    valid = (name.str.len() >= 2) & (name.str.len() <= 200) & (name_stripped_len >= 2)
+    valid &= ~name_lower.str.contains(_IGNORE_KEYWORDS_RE, regex=True)
+    valid &= ~name_lower.str.strip().isin(SHORT_IGNORE_NAMES)
+    
+    # Фильтр по остаткам < 10 шт (НЕ применяется к кегам!)
+    is_keg = pd.Series(is_keg, dtype=bool)
+    stock = pd.Series(stocks, dtype=object)
+    is_int_stock = stock.map(lambda value: isinstance(value, int)).astype(bool)
+    low_stock = is_int_stock & stock.where(is_int_stock, 10).astype(int).lt(10)
+    valid &= ~(low_stock & ~is_keg)
+    
+    # ГЛАВНОЕ ПРАВИЛО: если есть название + цена = это товар!
+    price = pd.Series(prices, dtype=object)
+    has_price = pd.Series(_truthy(prices)) & price.map(str).str.contains(r'\d', regex=True)
+    valid &= has_price
+    
+    return valid.to_numpy(dtype=bool)
@@ -0,0 +1,360 @@
+"""
+Планировщик задач парсинга вне цикла событий бота.
+
+Парсинг выполняется в отдельном пуле потоков. Планировщик ограничивает
+число одновременных задач и длину очереди, обслуживает пользователей
+по очереди (у каждого не больше одной ожидающей задачи) и отменяет
+предыдущую задачу пользователя, когда он загружает новый файл.
+Одновременные задачи с одинаковым ключом (хэшем файла) объединяются:
+выполняется одна, остальные ждут ее результат. Повторная загрузка того же
+файла тем же пользователем не отменяет его задачу: прежний обработчик
+получает ParseJobCancelled, а новый ждет результат уже идущей задачи.
+
+Аргументы задачи (например, буфер загруженного файла) освобождает
+планировщик: функция cleanup вызывается один раз, когда аргументы больше
+не нужны - после выполнения задачи в пуле или сразу, если задача не
+запускалась. Отмененная задача, которую уже выполняет поток, дочитывает
+аргументы, поэтому они освобождаются только после ее завершения.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import config
+
+
+class ParseQueueFull(Exception):
+    """Очередь парсинга переполнена."""
+
+
+class ParseJobCancelled(Exception):
+    """Задача отменена более новой задачей того же пользователя."""
+
+
+# Задача-лидер прервана (отменена ее владельцем): ожидающие запускают свою
+_FLIGHT_ABORTED = object()
+
+
+class _FlightAborted(Exception):
+    """Задача-лидер отменена: ожидающий должен повторить попытку."""
+
+
+class _Job:
+    """Задача парсинга одного пользователя."""
+
+    def __init__(self, user_id: int, func: Callable, args: tuple, future: asyncio.Future,
+                 cleanup: Optional[Callable] = None):
+        self.user_id = user_id
+        self.func = func
+        self.args = args
+        self.future = future
+        self.cleanup = cleanup
+        self.started = False  # Задача передана в пул
+
+    def release(self):
+        """Освободить аргументы задачи (один раз)."""
+        cleanup, self.cleanup = self.cleanup, None
+        if cleanup is not None:
+            cleanup()
+
+
+class ParseScheduler:
+    """Ограниченный планировщик задач парсинга с честной очередью по пользователям."""
+
+    def __init__(self, max_concurrent: int, max_queue: int):
+        """
+        Инициализация планировщика.
+
+        Args:
+            max_concurrent: Максимум одновременно выполняемых задач
+            max_queue: Максимум задач, ожидающих запуска
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._pending = OrderedDict()  # {user_id: _Job} в порядке поступления
+        self._running = []  # Выполняемые задачи
+        self._flights = {}  # {ключ: Future с (исключение, результат) задачи-лидера}
+        self._followers = {}  # {user_id: (ключ, Future)} пользователи, ждущие результат лидера
+        self._leaders = {}  # {ключ: user_id} чья задача выполняется для ключа
+        self._superseded = set()  # Ключи, чей лидер уступил ожидание своей новой загрузке
+        self._stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "rejected": 0,
+        }
+
+    async def run(self, user_id: int, func: Callable, *args, key: Optional[str] = None,
+                  cleanup: Optional[Callable] = None) -> Any:
+        """
+        Выполнить функцию в пуле парсинга и дождаться результата.
+
+        Args:
+            user_id: Пользователь, для которого выполняется задача
+            func: Синхронная функция (например, ExcelParser().parse_file)
+            *args: Аргументы функции
+            key: Ключ объединения (хэш файла): пока задача с этим ключом
+                выполняется, новые запросы ждут ее результат
+            cleanup: Освободить аргументы (например, закрыть буфер файла); вызывается
+                один раз при любом исходе, когда функция их уже не читает
+
+        Returns:
+            Any: Результат функции
+
+        Raises:
+            ParseQueueFull: Очередь переполнена
+            ParseJobCancelled: Пользователь запустил более новую задачу
+        """
+        if key is None:
+            return await self._run_job(user_id, func, args, cleanup)
+        return await self._run_shared(key, user_id, func, args, cleanup)
+
+    async def _run_job(self, user_id: int, func: Callable, args: tuple,
+                       cleanup: Optional[Callable] = None) -> Any:
+        """Поставить задачу пользователя в очередь и дождаться результата."""
+        loop = asyncio.get_running_loop()
+
+        # Новая загрузка отменяет предыдущую задачу пользователя
+        self.cancel(user_id)
+
+        job = _Job(user_id, func, args, loop.create_future(), cleanup)
+        try:
+            if len(self._pending) >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise ParseQueueFull()
+
+            self._pending[user_id] = job
+            self._stats["submitted"] += 1
+            self._dispatch(loop)
+            return await job.future
+        finally:
+            # Ожидающий обработчик отменен - задачу из очереди убираем
+            if self._pending.get(user_id) is job:
+                del self._pending[user_id]
+            # Не запущенная задача аргументы не читает; запущенную освобождает _finish
+            if not job.started:
+                job.release()
+
+    async def _run_shared(self, key: str, user_id: int, func: Callable, args: tuple,
+                          cleanup: Optional[Callable] = None) -> Any:
+        """
+        Выполнить задачу с объединением по ключу.
+
+        Первый запрос становится лидером и ставит задачу в очередь, остальные
+        ждут его результат. Если лидер отменен, ожидающие повторяют попытку
+        и один из них становится новым лидером.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                return await self._lead(key, user_id, func, args, loop, cleanup)
+
+            if not self._rejoin(user_id, key):
+                # Как и новая задача, ожидание отменяет предыдущую задачу пользователя
+                self.cancel(user_id)
+            self._stats["coalesced"] += 1
+            waiter = loop.create_future()
+            self._followers[user_id] = (key, waiter)
+            flight.add_done_callback(lambda flight, waiter=waiter: self._relay(flight, waiter))
+            aborted = False
+            try:
+                return await waiter
+            except _FlightAborted:
+                aborted = True
+            finally:
+                if self._followers.get(user_id, (None, None))[1] is waiter:
+                    del self._followers[user_id]
+                # Ожидание закончилось - свои аргументы не понадобятся
+                # (после отмены лидера ожидающий запускает задачу с ними сам)
+                if not aborted and cleanup is not None:
+                    cleanup()
+
+    async def _lead(self, key: str, user_id: int, func: Callable, args: tuple,
+                    loop: asyncio.AbstractEventLoop, cleanup: Optional[Callable] = None) -> Any:
+        """Выполнить задачу-лидера и передать результат ожидающим."""
+        flight = loop.create_future()
+        self._flights[key] = flight
+        self._leaders[key] = user_id
+        outcome = (_FLIGHT_ABORTED, None)
+        try:
+            result = await self._run_job(user_id, func, args, cleanup)
+            outcome = (None, result)
+        except ParseJobCancelled:
+            raise
+        except Exception as e:
+            outcome = (e, None)
+            if key in self._superseded:
+                # Ошибку покажет новый обработчик пользователя
+                raise ParseJobCancelled() from e
+            raise
+        finally:
+            del self._flights[key]
+            del self._leaders[key]
+            superseded = key in self._superseded
+            self._superseded.discard(key)
+            flight.set_result(outcome)
+        if superseded:
+            # Результат получит новый обработчик того же пользователя
+            raise ParseJobCancelled()
+        return result
+
+    def _rejoin(self, user_id: int, key: str) -> bool:
+        """
+        Повторная загрузка файла, который уже разбирается для этого пользователя.
+
+        Задача не отменяется: прежний обработчик пользователя получит
+        ParseJobCancelled, а новый будет ждать результат той же задачи.
+
+        Args:
+            user_id: Пользователь
+            key: Ключ новой задачи
+
+        Returns:
+            bool: True, если пользователь уже ждет задачу с этим ключом
+        """
+        rejoined = False
+        if self._leaders.get(key) == user_id:
+            if key not in self._superseded:
+                self._superseded.add(key)
+                self._stats["cancelled"] += 1
+            rejoined = True
+        follower = self._followers.get(user_id)
+        if follower is not None and follower[0] == key:
+            del self._followers[user_id]
+            if not follower[1].done():
+                follower[1].set_exception(ParseJobCancelled())
+                self._stats["cancelled"] += 1
+            rejoined = True
+        return rejoined
+
+    @staticmethod
+    def _relay(flight: asyncio.Future, waiter: asyncio.Future):
+        """Передать результат лидера ожидающему (если тот еще ждет)."""
+        if waiter.done():
+            return
+        error, result = flight.result()
+        if error is _FLIGHT_ABORTED:
+            waiter.set_exception(_FlightAborted())
+        elif error is not None:
+            waiter.set_exception(error)
+        else:
+            waiter.set_result(result)
+
+    def cancel(self, user_id: int) -> bool:
+        """
+        Отменить задачи пользователя (ожидающую, выполняемую и ожидание чужой).
+
+        Выполняемый парсинг нельзя прервать в потоке, поэтому его результат
+        просто отбрасывается, а ожидающий получает ParseJobCancelled.
+
+        Args:
+            user_id: Пользователь
+
+        Returns:
+            bool: True если была отменена хотя бы одна задача
+        """
+        cancelled = False
+        jobs = [job for job in self._running if job.user_id == user_id]
+        pending = self._pending.pop(user_id, None)
+        if pending is not None:
+            jobs.append(pending)
+
+        futures = [job.future for job in jobs]
+        follower = self._followers.pop(user_id, None)
+        if follower is not None:
+            futures.append(follower[1])
+
+        for future in futures:
+            if not future.done():
+                future.set_exception(ParseJobCancelled())
+                self._stats["cancelled"] += 1
+                cancelled = True
+        return cancelled
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счетчики планировщика.
+
+        Returns:
+            Dict[str, int]: Статистика (в очереди, выполняется, объединено и т.д.)
+        """
+        stats = dict(self._stats)
+        stats["queued"] = len(self._pending)
+        stats["running"] = len(self._running)
+        stats["in_flight"] = len(self._flights)
+        return stats
+
+    def shutdown(self):
+        """Остановить пул потоков (дожидаясь текущих задач)."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков создается при первой задаче."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrent,
+                    thread_name_prefix="parser",
+                )
+            return self._executor
+
+    def _next_job(self) -> _Job:
+        """
+        Выбрать следующую задачу: сначала пользователи без выполняемых задач.
+
+        Returns:
+            _Job: Задача, удаленная из очереди
+        """
+        busy_users = {job.user_id for job in self._running}
+        for user_id in self._pending:
+            if user_id not in busy_users:
+                return self._pending.pop(user_id)
+        return self._pending.popitem(last=False)[1]
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        """Запустить ожидающие задачи, пока есть свободные слоты."""
+        while self._pending and len(self._running) < self.max_concurrent:
+            job = self._next_job()
+            if job.future.done():
+                continue
+
+            self._running.append(job)
+            job.started = True
+            task = loop.run_in_executor(self._get_executor(), job.func, *job.args)
+            task.add_done_callback(lambda task, job=job: self._finish(job, task, loop))
+
+    def _finish(self, job: _Job, task: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        """Передать результат ожидающему и запустить следующую задачу."""
+        self._running.remove(job)
+
+        if not job.future.done():
+            if task.cancelled():
+                job.future.set_exception(ParseJobCancelled())
+                self._stats["cancelled"] += 1
+            elif task.exception() is not None:
+                job.future.set_exception(task.exception())
+                self._stats["failed"] += 1
+            else:
+                job.future.set_result(task.result())
+                self._stats["completed"] += 1
+
+        self._dispatch(loop)
+        # Поток завершился - аргументы больше никто не читает
+        job.release()
+
+
+# Общий планировщик процесса бота
+parse_scheduler = ParseScheduler(
+    max_concurrent=config.PARSE_MAX_CONCURRENT,
+    max_queue=config.PARSE_MAX_QUEUE,
+)
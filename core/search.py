@@ -0,0 +1,164 @@
+"""
+Поиск позиций каталога по названию, пивоварне и стилю.
+
+Индекс строится один раз на каталог: текст позиции приводится к общему
+виду (нижний регистр, ё -> е, кириллица -> латиница, сходные буквы
+и двойные буквы склеиваются), слова разбиваются на триграммы, для каждой
+триграммы хранится массив номеров позиций. Запрос проходит то же
+приведение, поэтому "хеллес" находит "Helles" и наоборот, а опечатка
+в одной букве оставляет большую часть триграмм общими. Результаты
+ранжируются по доле совпавших триграмм запроса.
+"""
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Mapping, Sequence
+import numpy as np
+import config
+
+# Кириллица -> латиница (ё и е совпадают)
+_TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+# Латинские буквы, которые транслитерация передает по-разному (weizen / вайцен)
+_LATIN_FOLD = str.maketrans({'w': 'v', 'y': 'i', 'j': 'i', 'q': 'k', 'c': 'k', 'x': 'ks'})
+
+_NON_WORD_RE = re.compile(r'[^0-9a-z]+')
+_DOUBLE_RE = re.compile(r'(.)\1+')
+
+# Поля позиции, по которым ищем
+SEARCH_FIELDS = ('название', 'пивоварня', 'стиль')
+
+# Доля триграмм запроса, которые должны совпасть
+MIN_TRIGRAM_SHARE = 0.5
+
+
+@lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE)
+def fold_text(text) -> str:
+    """
+    Привести текст к виду для поиска.
+
+    Args:
+        text: Исходный текст (None - пустая строка)
+
+    Returns:
+        str: Слова в нижнем регистре латиницей через пробел
+    """
+    if not text:
+        return ""
+    folded = str(text).lower().translate(_TRANSLIT).translate(_LATIN_FOLD)
+    folded = _DOUBLE_RE.sub(r'\1', folded)
+    return _NON_WORD_RE.sub(' ', folded).strip()
+
+
+def trigrams(folded: str) -> set:
+    """
+    Триграммы слов приведенного текста (слово дополняется пробелами по краям).
+
+    Args:
+        folded: Результат fold_text
+
+    Returns:
+        set: Триграммы
+    """
+    grams = set()
+    for word in folded.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SearchIndex:
+    """Инвертированный индекс триграмм по позициям каталога."""
+
+    def __init__(self, items: Sequence[Mapping]):
+        """
+        Построить индекс.
+
+        Args:
+            items: Позиции каталога (номер позиции - индекс в списке)
+        """
+        self._texts = []
+        postings = defaultdict(list)
+        name_postings = defaultdict(list)
+        for pos, item in enumerate(items):
+            name, *others = (fold_text(item.get(field)) for field in SEARCH_FIELDS)
+            text = ' '.join([name, *others])
+            self._texts.append(text)
+            name_grams = trigrams(name)
+            for gram in name_grams:
+                name_postings[gram].append(pos)
+            for gram in name_grams.union(*map(trigrams, others)):
+                postings[gram].append(pos)
+        self._postings = _freeze_postings(postings)
+        # Совпадения в названии важнее совпадений в пивоварне и стиле
+        self._name_postings = _freeze_postings(name_postings)
+        self._lengths = np.fromiter((len(text) for text in self._texts), dtype=np.int32, count=len(self._texts))
+        self._size = len(self._texts)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Оценка памяти индекса в байтах (тексты и массивы номеров позиций)."""
+        postings = sum(
+            len(gram) + array.nbytes
+            for table in (self._postings, self._name_postings)
+            for gram, array in table.items()
+        )
+        return sum(len(text) for text in self._texts) + postings + self._lengths.nbytes
+
+    def search(self, query: str) -> List[int]:
+        """
+        Найти позиции по запросу.
+
+        Порядок: сначала позиции, где совпало больше триграмм запроса,
+        при равенстве - где больше из них в названии, затем с более коротким текстом (запрос занимает в нем
+        большую часть), затем по порядку каталога. Запрос из двух букв
+        ищется как начало слова, из одной - как подстрока.
+
+        Args:
+            query: Поисковый запрос
+
+        Returns:
+            List[int]: Номера позиций по убыванию релевантности
+        """
+        folded = fold_text(query)
+        if not folded:
+            return []
+
+        if len(folded) == 1:
+            return [pos for pos, text in enumerate(self._texts) if folded in text]
+        grams = {f" {folded}"} if len(folded) == 2 else trigrams(folded)
+
+        lists = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not lists:
+            return []
+        hits = np.bincount(np.concatenate(lists), minlength=self._size)
+
+        min_hits = max(1, int(np.ceil(len(grams) * MIN_TRIGRAM_SHARE)))
+        candidates = np.flatnonzero(hits >= min_hits)
+        if not len(candidates):
+            return []
+
+        name_lists = [self._name_postings[gram] for gram in grams if gram in self._name_postings]
+        name_hits = np.zeros(self._size, dtype=np.int64)
+        if name_lists:
+            name_hits = np.bincount(np.concatenate(name_lists), minlength=self._size)
+
+        # lexsort: последний ключ - главный
+        order = np.lexsort((
+            candidates, self._lengths[candidates], -name_hits[candidates], -hits[candidates]
+        ))
+        return candidates[order].tolist()
+
+
+def _freeze_postings(postings: Dict[str, list]) -> Dict[str, np.ndarray]:
+    """Списки номеров позиций -> компактные массивы numpy."""
+    return {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
@@ -0,0 +1,184 @@
+"""
+Сортировки каталога для списка позиций.
+
+Ключи сортировки (цена за литр, цена, пивоварня, стиль, название)
+вычисляются один раз на каталог и хранятся как перестановки - массивы
+номеров позиций в нужном порядке. Отсортированное представление с
+фильтрами - выборка перестановки по маске фасетов, страница - срез
+представления, поэтому смена сортировки и листание не сортируют каталог
+заново. Для сортировки по названию хранится первая буква каждого
+названия, чтобы переходить к букве без прохода по позициям.
+"""
+import re
+from typing import Dict, List, Mapping, Optional, Sequence
+import numpy as np
+
+SORT_CATALOG = "catalog"
+SORT_PRICE_PER_LITER = "ppl"
+SORT_PRICE = "price"
+SORT_BREWERY = "brewery"
+SORT_STYLE = "style"
+SORT_NAME = "name"
+
+# Сортировки в порядке показа и их подписи
+SORT_TITLES = {
+    SORT_CATALOG: "Как в прайсе",
+    SORT_PRICE_PER_LITER: "Цена за литр",
+    SORT_PRICE: "Цена",
+    SORT_BREWERY: "Пивоварня",
+    SORT_STYLE: "Стиль",
+    SORT_NAME: "Название",
+}
+
+# Кавычки, скобки и прочие знаки в начале названия при сортировке не учитываются
+_LEADING_RE = re.compile(r'^[\W_]+')
+
+
+def sort_text(value) -> Optional[str]:
+    """
+    Ключ сортировки текстового поля.
+
+    Args:
+        value: Значение поля
+
+    Returns:
+        Optional[str]: Текст в нижнем регистре (ё -> е) или None для пустого значения
+    """
+    if value is None:
+        return None
+    text = _LEADING_RE.sub('', str(value).casefold().replace('ё', 'е')).strip()
+    return text or None
+
+
+def price_per_liter_kop(item: Mapping) -> Optional[float]:
+    """
+    Цена за литр позиции.
+
+    Args:
+        item: Позиция каталога
+
+    Returns:
+        Optional[float]: Копеек за литр или None, если нет цены или объема
+    """
+    price_kop = item.get('_price_kop')
+    liters = item.get('_volume_l')
+    if not price_kop or not liters:
+        return None
+    return price_kop / liters
+
+
+class CatalogSorts:
+    """Перестановки позиций каталога для каждой сортировки."""
+
+    def __init__(self, items: Sequence[Mapping]):
+        """
+        Построить перестановки.
+
+        Args:
+            items: Позиции каталога (номер позиции - индекс в списке)
+        """
+        self._size = len(items)
+        positions = np.arange(self._size, dtype=np.int32)
+        names = _text_ranks([item.get('название') for item in items])
+        breweries = _text_ranks([item.get('пивоварня') for item in items])
+        styles = _text_ranks([item.get('стиль') for item in items])
+        prices = _numeric_key([item.get('_price_kop') for item in items])
+        per_liter = _numeric_key([price_per_liter_kop(item) for item in items])
+
+        # lexsort: последний ключ - главный, номер позиции - последний критерий,
+        # поэтому равные ключи остаются в порядке прайса
+        self._orders: Dict[str, np.ndarray] = {
+            SORT_CATALOG: positions,
+            SORT_PRICE_PER_LITER: np.lexsort((positions, per_liter)).astype(np.int32),
+            SORT_PRICE: np.lexsort((positions, prices)).astype(np.int32),
+            SORT_BREWERY: np.lexsort((positions, names, breweries)).astype(np.int32),
+            SORT_STYLE: np.lexsort((positions, names, styles)).astype(np.int32),
+            SORT_NAME: np.lexsort((positions, names)).astype(np.int32),
+        }
+
+        # Место позиции в сортировке по названию и первые буквы названий:
+        # буква -> место первой позиции на эту букву
+        self._name_ranks = np.empty(self._size, dtype=np.int32)
+        self._name_ranks[self._orders[SORT_NAME]] = positions
+        self._letters: Dict[str, int] = {}
+        for rank, pos in enumerate(self._orders[SORT_NAME].tolist()):
+            text = sort_text(items[pos].get('название'))
+            if text:
+                self._letters.setdefault(text[0].upper(), rank)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Оценка памяти сортировок в байтах (перестановки и места по названию)."""
+        return sum(order.nbytes for order in self._orders.values()) + self._name_ranks.nbytes + 8 * len(self._letters)
+
+    def order(self, sort: str) -> np.ndarray:
+        """
+        Перестановка позиций для сортировки (неизвестная сортировка - порядок прайса).
+
+        Args:
+            sort: Сортировка
+
+        Returns:
+            np.ndarray: Номера позиций в порядке сортировки
+        """
+        return self._orders.get(sort, self._orders[SORT_CATALOG])
+
+    def view(self, sort: str, mask: Optional[np.ndarray] = None) -> Sequence[int]:
+        """
+        Отсортированное представление каталога.
+
+        Args:
+            sort: Сортировка
+            mask: Маска позиций фасетов (None - все позиции)
+
+        Returns:
+            Sequence[int]: Номера позиций; без маски - сама перестановка,
+            с маской - список номеров подходящих позиций
+        """
+        order = self.order(sort)
+        if mask is None:
+            return order
+        return order[mask[order]].tolist()
+
+    def letters(self) -> List[str]:
+        """
+        Первые буквы названий в порядке сортировки по названию.
+
+        Returns:
+            List[str]: Буквы (индекс буквы стабилен для каталога)
+        """
+        return list(self._letters)
+
+    def letter_index(self, view: Sequence[int], letter: str) -> int:
+        """
+        Место в представлении (отсортированном по названию) первой позиции
+        на букву или следующую за ней.
+
+        Args:
+            view: Представление из view(SORT_NAME, ...)
+            letter: Буква из letters()
+
+        Returns:
+            int: Индекс в представлении (len(view), если таких позиций нет)
+        """
+        first_rank = self._letters.get(letter)
+        if first_rank is None:
+            return 0
+        ranks = self._name_ranks[np.asarray(view, dtype=np.int64)]
+        return int(np.searchsorted(ranks, first_rank))
+
+
+def _text_ranks(values: List) -> np.ndarray:
+    """Ранги текстовых значений (пустые - после всех)."""
+    texts = [sort_text(value) for value in values]
+    ranks = {text: rank for rank, text in enumerate(sorted({text for text in texts if text}))}
+    missing = len(ranks)
+    return np.fromiter((ranks.get(text, missing) for text in texts), dtype=np.int64, count=len(texts))
+
+
+def _numeric_key(values: List) -> np.ndarray:
+    """Числовой ключ сортировки (пустые значения - после всех)."""
+    return np.array([np.inf if value is None else value for value in values], dtype=np.float64)
@@ -0,0 +1,119 @@
+"""
+Буфер загрузки документа.
+
+Файл из Telegram пишется сразу в память и хэшируется по мере поступления
+блоков. На диск (анонимный временный файл) данные переносятся только
+когда размер превышает лимит. Буфер ведет себя как двоичный файл
+(read/seek/tell), поэтому его напрямую открывают pandas и openpyxl.
+"""
+import hashlib
+import tempfile
+from io import BytesIO
+
+
+class UploadBuffer:
+    """Двоичный буфер в памяти с хэшированием при записи и сбросом на диск сверх лимита."""
+
+    def __init__(self, max_memory_bytes: int):
+        """
+        Инициализация буфера.
+
+        Args:
+            max_memory_bytes: Размер, после которого данные переносятся во временный файл
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.size = 0
+        self._file = BytesIO()
+        self._digest = hashlib.sha256()
+        self._spilled = False
+
+    @property
+    def in_memory(self) -> bool:
+        """Данные целиком в памяти (не перенесены на диск)."""
+        return not self._spilled
+
+    def write(self, data: bytes) -> int:
+        """
+        Дописать блок данных и обновить хэш.
+
+        Args:
+            data: Блок данных
+
+        Returns:
+            int: Количество записанных байт
+        """
+        self._digest.update(data)
+        self.size += len(data)
+        written = self._file.write(data)
+        if not self._spilled and self.size > self.max_memory_bytes:
+            self._spill()
+        return written
+
+    def hexdigest(self) -> str:
+        """
+        Хэш записанных данных (ключ кэша парсинга).
+
+        Returns:
+            str: Хэш SHA-256 в hex
+        """
+        return self._digest.hexdigest()
+
+    def getvalue(self) -> bytes:
+        """
+        Содержимое буфера.
+
+        Возвращается копия, а не memoryview: живой view не дает закрыть буфер.
+
+        Returns:
+            bytes: Данные из памяти или прочитанные с диска
+        """
+        if not self._spilled:
+            return self._file.getvalue()
+        position = self._file.tell()
+        self._file.seek(0)
+        data = self._file.read()
+        self._file.seek(position)
+        return data
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self):
+        """Освободить память или удалить временный файл."""
+        self._file.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _spill(self):
+        """Перенести данные из памяти в анонимный временный файл."""
+        spill = tempfile.TemporaryFile()
+        with self._file.getbuffer() as view:
+            spill.write(view)
+        position = self._file.tell()
+        self._file.close()
+        spill.seek(position)
+        self._file = spill
+        self._spilled = True
@@ -1,81 +1,58 @@
 """
 Обучение ML-модели для классификации колонок Excel.
 """
+import json
+import os
 import pickle
 from pathlib import Path
+from typing import Optional
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 import config
+from core.column_detector import EXPORT_FORMAT_VERSION
+from ml.training_data import TRAINING_DATA
 
 
-# Обучающие данные: примеры заголовков колонок
-TRAINING_DATA = [
-    # BREWERY
-    ("Пивоварня", "BREWERY"),
-    ("Brewery", "BREWERY"),
-    ("Производитель", "BREWERY"),
-    ("Бренд", "BREWERY"),
-    ("Brand", "BREWERY"),
-    ("Завод", "BREWERY"),
-    
-    # NAME
-    ("Название", "NAME"),
-    ("Наименование", "NAME"),
-    ("Пиво", "NAME"),
-    ("Name", "NAME"),
-    ("Beer", "NAME"),
-    ("Product", "NAME"),
-    ("Товар", "NAME"),
-    ("Продукт", "NAME"),
-    ("Позиция", "NAME"),
-    
-    # STYLE
-    ("Стиль", "STYLE"),
-    ("Style", "STYLE"),
-    ("Тип", "STYLE"),
-    ("Type", "STYLE"),
-    ("Сорт", "STYLE"),
+def export_classifier(model: Pipeline, path: Optional[Path] = None) -> Path:
+    """
+    Выгрузить обученную модель в JSON для бота (считается на numpy без sklearn).
     
-    # VOLUME
-    ("Объем", "VOLUME"),
-    ("Объём", "VOLUME"),
-    ("Volume", "VOLUME"),
-    ("Емкость", "VOLUME"),
-    ("Ёмкость", "VOLUME"),
-    ("Литраж", "VOLUME"),
-    ("л", "VOLUME"),
-    ("L", "VOLUME"),
-    ("мл", "VOLUME"),
-    ("ml", "VOLUME"),
-    ("Тара", "VOLUME"),
-    ("Упаковка", "VOLUME"),
+    Args:
+        model: Pipeline из TfidfVectorizer(analyzer='char') и MultinomialNB
+        path: Файл выгрузки (None - config.COLUMN_CLASSIFIER_EXPORT_PATH)
+        
+    Returns:
+        Path: Файл выгрузки
+        
+    Raises:
+        ValueError: Модель нельзя посчитать без sklearn
+    """
+    path = Path(path or config.COLUMN_CLASSIFIER_EXPORT_PATH)
+    vectorizer = model.named_steps['vectorizer']
+    classifier = model.named_steps['classifier']
+    if vectorizer.analyzer != 'char' or vectorizer.norm not in ('l2', None) or not vectorizer.use_idf:
+        raise ValueError("выгружается только TF-IDF по символам с нормой l2")
     
-    # PRICE
-    ("Цена", "PRICE"),
-    ("Price", "PRICE"),
-    ("Стоимость", "PRICE"),
-    ("Cost", "PRICE"),
-    ("Руб", "PRICE"),
-    ("₽", "PRICE"),
-    ("RUB", "PRICE"),
-    ("Рублей", "PRICE"),
+    payload = {
+        "version": EXPORT_FORMAT_VERSION,
+        "ngram_range": list(vectorizer.ngram_range),
+        "lowercase": bool(vectorizer.lowercase),
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "norm": vectorizer.norm,
+        "vocabulary": {ngram: int(idx) for ngram, idx in vectorizer.vocabulary_.items()},
+        "idf": vectorizer.idf_.tolist(),
+        "classes": [str(label) for label in classifier.classes_],
+        "class_log_prior": classifier.class_log_prior_.tolist(),
+        "feature_log_prob": classifier.feature_log_prob_.tolist(),
+    }
     
-    # IGNORE
-    ("Артикул", "IGNORE"),
-    ("SKU", "IGNORE"),
-    ("Код", "IGNORE"),
-    ("ID", "IGNORE"),
-    ("Примечание", "IGNORE"),
-    ("Комментарий", "IGNORE"),
-    ("Comment", "IGNORE"),
-    ("Описание", "IGNORE"),
-    ("Description", "IGNORE"),
-    ("Картинка", "IGNORE"),
-    ("Image", "IGNORE"),
-    ("Фото", "IGNORE"),
-    ("", "IGNORE"),
-]
+    # Атомарная замена: запущенный бот перезагрузит модель по изменению файла
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_path, path)
+    return path
 
 
 def train_column_classifier():
@@ -103,10 +80,14 @@ def train_column_classifier():
     # Сохранение модели
     config.ML_MODELS_DIR.mkdir(parents=True, exist_ok=True)
     
-    with open(config.COLUMN_CLASSIFIER_PATH, 'wb') as f:
+    # Pipeline sklearn (бот его не читает) и выгрузка для бота
+    tmp_path = config.COLUMN_CLASSIFIER_PATH.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
         pickle.dump(model, f)
+    os.replace(tmp_path, config.COLUMN_CLASSIFIER_PATH)
+    export_path = export_classifier(model)
     
-    print(f"Модель сохранена в {config.COLUMN_CLASSIFIER_PATH}")
+    print(f"Модель сохранена в {config.COLUMN_CLASSIFIER_PATH}, выгрузка для бота - в {export_path}")
     
     # Тестирование
     test_samples = [
@@ -0,0 +1,71 @@
+"""
+Обучающие данные классификатора колонок (без зависимостей от sklearn).
+"""
+
+# Обучающие данные: примеры заголовков колонок
+TRAINING_DATA = [
+    # BREWERY
+    ("Пивоварня", "BREWERY"),
+    ("Brewery", "BREWERY"),
+    ("Производитель", "BREWERY"),
+    ("Бренд", "BREWERY"),
+    ("Brand", "BREWERY"),
+    ("Завод", "BREWERY"),
+    
+    # NAME
+    ("Название", "NAME"),
+    ("Наименование", "NAME"),
+    ("Пиво", "NAME"),
+    ("Name", "NAME"),
+    ("Beer", "NAME"),
+    ("Product", "NAME"),
+    ("Товар", "NAME"),
+    ("Продукт", "NAME"),
+    ("Позиция", "NAME"),
+    
+    # STYLE
+    ("Стиль", "STYLE"),
+    ("Style", "STYLE"),
+    ("Тип", "STYLE"),
+    ("Type", "STYLE"),
+    ("Сорт", "STYLE"),
+    
+    # VOLUME
+    ("Объем", "VOLUME"),
+    ("Объём", "VOLUME"),
+    ("Volume", "VOLUME"),
+    ("Емкость", "VOLUME"),
+    ("Ёмкость", "VOLUME"),
+    ("Литраж", "VOLUME"),
+    ("л", "VOLUME"),
+    ("L", "VOLUME"),
+    ("мл", "VOLUME"),
+    ("ml", "VOLUME"),
+    ("Тара", "VOLUME"),
+    ("Упаковка", "VOLUME"),
+    
+    # PRICE
+    ("Цена", "PRICE"),
+    ("Price", "PRICE"),
+    ("Стоимость", "PRICE"),
+    ("Cost", "PRICE"),
+    ("Руб", "PRICE"),
+    ("₽", "PRICE"),
+    ("RUB", "PRICE"),
+    ("Рублей", "PRICE"),
+    
+    # IGNORE
+    ("Артикул", "IGNORE"),
+    ("SKU", "IGNORE"),
+    ("Код", "IGNORE"),
+    ("ID", "IGNORE"),
+    ("Примечание", "IGNORE"),
+    ("Комментарий", "IGNORE"),
+    ("Comment", "IGNORE"),
+    ("Описание", "IGNORE"),
+    ("Description", "IGNORE"),
+    ("Картинка", "IGNORE"),
+    ("Image", "IGNORE"),
+    ("Фото", "IGNORE"),
+    ("", "IGNORE"),
+]
@@ -1,65 +1,439 @@
 """
-Автоматическое дообучение ML-модели на новых данных.
+Автоматическое дообучение классификатора колонок на новых данных.
+
+Заголовки, которые парсер классифицировал, попадают в хранилище примеров
+(SampleStore): одна запись на название колонки в нижнем регистре, поэтому
+повторные загрузки одного прайс-листа не множат примеры. Хранилище
+сохраняется на диск и переживает перезапуск бота.
+
+Модель (HashedNaiveBayes) - наивный байесовский классификатор по
+хэшированным n-граммам символов. Словаря нет, а обучение - накопление
+счетчиков n-грамм по классам (partial_fit), поэтому новые примеры
+добавляются к обученной модели без обучения с нуля.
+
+AdaptiveColumnClassifier дообучает модель в фоне, когда после последнего
+нового примера проходит пауза (ONLINE_LEARNING_DEBOUNCE_SECONDS).
+Дообучается копия модели, которая затем атомарно подменяет общую модель
+детектора, поэтому загрузка прайс-листа не ждет обучения.
+
+Примеры хранилища размечены самим классификатором, поэтому дообученная
+модель сначала проверяется на размеченных вручную обучающих данных
+(TRAINING_DATA): она заменяет общую модель, только если ошибается на них
+не чаще выгрузки ml/train_detector и модели, обученной на одних этих данных.
+
+Отметка дообученной модели - хэш обучающих данных и примеров хранилища,
+поэтому после перезапуска с теми же примерами у модели та же отметка.
 """
-import pickle
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
 from pathlib import Path
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.pipeline import Pipeline
-import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
 import config
+from core.column_detector import SharedModel, char_ngrams, column_model
+from ml.training_data import TRAINING_DATA
+
+# Размер пространства хэшей n-грамм
+HASH_FEATURES = 2 ** 14
+
+# Версия формата хранилища примеров
+SAMPLE_STORE_VERSION = 1
+
+# Результат SampleStore.add
+SAMPLE_ADDED = "added"  # новый пример
+SAMPLE_REPLACED = "replaced"  # изменился тип или вытеснен старый пример: модель обучается заново
+
+
+class HashedNaiveBayes:
+    """Наивный байесовский классификатор по хэшированным n-граммам символов."""
+
+    def __init__(self, n_features: int = HASH_FEATURES, ngram_range: Tuple[int, int] = (1, 3),
+                 alpha: float = 0.1):
+        """
+        Инициализация необученной модели.
+
+        Args:
+            n_features: Размер пространства хэшей
+            ngram_range: Длины n-грамм (мин, макс)
+            alpha: Сглаживание счетчиков
+        """
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.alpha = alpha
+        self.classes: List[str] = []
+        self.class_count = np.zeros(0, dtype=np.float64)
+        self.feature_count = np.zeros((0, n_features), dtype=np.float64)
+        self._log_prob = None
+        self._log_prior = None
+
+    def copy(self) -> "HashedNaiveBayes":
+        """Копия модели (опубликованная модель не изменяется)."""
+        model = HashedNaiveBayes(self.n_features, self.ngram_range, self.alpha)
+        model.classes = list(self.classes)
+        model.class_count = self.class_count.copy()
+        model.feature_count = self.feature_count.copy()
+        model._log_prob = self._log_prob
+        model._log_prior = self._log_prior
+        return model
+
+    def features(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Признаки названия: номера хэшей n-грамм и их веса (с L2-нормой).
+
+        Args:
+            name: Название колонки
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Номера признаков и веса
+        """
+        counts = {}
+        for ngram in char_ngrams(name, self.ngram_range):
+            idx = zlib.crc32(ngram.encode('utf-8')) % self.n_features
+            counts[idx] = counts.get(idx, 0) + 1
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if len(weights):
+            weights /= np.sqrt(weights @ weights)
+        return indices, weights
+
+    def partial_fit(self, names: Sequence[str], labels: Sequence[str]):
+        """
+        Дообучить модель: прибавить признаки примеров к счетчикам классов.
+
+        Args:
+            names: Названия колонок
+            labels: Типы колонок
+        """
+        for name, label in zip(names, labels):
+            if label not in self.classes:
+                self.classes.append(label)
+                self.class_count = np.append(self.class_count, 0.0)
+                self.feature_count = np.vstack([self.feature_count, np.zeros(self.n_features)])
+            row = self.classes.index(label)
+            indices, weights = self.features(name)
+            self.feature_count[row, indices] += weights
+            self.class_count[row] += 1
+
+        smoothed = self.feature_count + self.alpha
+        self._log_prob = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        self._log_prior = np.log(self.class_count) - np.log(self.class_count.sum())
+
+    def predict(self, names: Sequence[str]) -> List[str]:
+        """
+        Типы колонок.
+
+        Args:
+            names: Названия колонок
+
+        Returns:
+            List[str]: Тип с наибольшим правдоподобием для каждого названия
+
+        Raises:
+            ValueError: Модель не обучена
+        """
+        if self._log_prob is None:
+            raise ValueError("модель не обучена")
+        types = []
+        for name in names:
+            indices, weights = self.features(name)
+            scores = self._log_prob[:, indices] @ weights + self._log_prior
+            types.append(self.classes[int(np.argmax(scores))])
+        return types
+
+
+class SampleStore:
+    """Примеры для дообучения: название колонки (нижний регистр) -> тип, с сохранением на диск."""
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = 5000):
+        """
+        Инициализация хранилища.
+
+        Args:
+            path: JSON файл хранилища (None - только в памяти)
+            max_entries: Максимум примеров (давно не встречавшиеся вытесняются)
+        """
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self._samples = OrderedDict()  # {название: тип}
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def add(self, key: str, label: str) -> Optional[str]:
+        """
+        Добавить пример.
+
+        Args:
+            key: Название колонки в нижнем регистре
+            label: Тип колонки
+
+        Returns:
+            Optional[str]: SAMPLE_ADDED, SAMPLE_REPLACED или None, если пример уже есть
+        """
+        with self._lock:
+            previous = self._samples.get(key)
+            self._samples[key] = label
+            self._samples.move_to_end(key)
+            if previous == label:
+                return None
+            status = SAMPLE_ADDED if previous is None else SAMPLE_REPLACED
+            while len(self._samples) > self.max_entries:
+                self._samples.popitem(last=False)
+                status = SAMPLE_REPLACED
+            return status
+
+    def items(self) -> List[Tuple[str, str]]:
+        """
+        Все примеры.
+
+        Returns:
+            List[Tuple[str, str]]: Пары (название, тип)
+        """
+        with self._lock:
+            return list(self._samples.items())
+
+    def save(self):
+        """Атомарно записать хранилище на диск."""
+        if not self.path:
+            return
+        with self._lock:
+            payload = json.dumps(
+                {"version": SAMPLE_STORE_VERSION, "samples": list(self._samples.items())},
+                ensure_ascii=False
+            )
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(payload, encoding='utf-8')
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Не удалось сохранить примеры для дообучения {self.path}: {e}")
+
+    def _load(self):
+        """Загрузить хранилище с диска (устаревший формат игнорируется)."""
+        if not self.path:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != SAMPLE_STORE_VERSION:
+            return
+        self._samples.update((key, label) for key, label in data.get("samples", []))
 
 
 class AdaptiveColumnClassifier:
-    """Классификатор с возможностью дообучения."""
-    
-    def __init__(self):
-        """Инициализация."""
-        self.model = None
-        self.training_samples = []
-        self.training_labels = []
-        self._load_or_create_model()
-    
-    def _load_or_create_model(self):
-        """Загрузить существующую модель или создать новую."""
-        if config.COLUMN_CLASSIFIER_PATH.exists():
-            with open(config.COLUMN_CLASSIFIER_PATH, 'rb') as f:
-                self.model = pickle.load(f)
-        else:
-            # Создаем базовую модель
-            self.model = Pipeline([
-                ('vectorizer', TfidfVectorizer(
-                    analyzer='char',
-                    ngram_range=(1, 3),
-                    max_features=100
-                )),
-                ('classifier', MultinomialNB(alpha=0.1))
-            ])
-    
-    def learn_from_dataframe(self, df: pd.DataFrame, column_mappings: dict):
-        """
-        Дообучить модель на новых данных из DataFrame.
-        
+    """Фоновое дообучение общей модели детектора на примерах с загруженных прайс-листов."""
+
+    def __init__(self, store: SampleStore, shared: SharedModel = column_model,
+                 debounce: float = config.ONLINE_LEARNING_DEBOUNCE_SECONDS):
+        """
+        Инициализация.
+
         Args:
-            df: DataFrame с данными
-            column_mappings: Маппинг {имя_колонки: тип}
-        """
-        for col_name, col_type in column_mappings.items():
-            self.training_samples.append(col_name)
-            self.training_labels.append(col_type)
-    
-    def retrain_and_save(self):
-        """Переобучить модель на накопленных данных и сохранить."""
-        if len(self.training_samples) < 5:
-            return  # Слишком мало данных
-        
-        # Обучаем модель
-        self.model.fit(self.training_samples, self.training_labels)
-        
-        # Сохраняем
-        config.ML_MODELS_DIR.mkdir(parents=True, exist_ok=True)
-        with open(config.COLUMN_CLASSIFIER_PATH, 'wb') as f:
-            pickle.dump(self.model, f)
-        
-        print(f"✅ Модель переобучена на {len(self.training_samples)} примерах")
+            store: Хранилище примеров
+            shared: Общая модель детектора, которую подменяет дообученная
+            debounce: Пауза после последнего нового примера перед дообучением (секунды)
+        """
+        self.store = store
+        self.shared = shared
+        self.debounce = debounce
+        self._model: Optional[HashedNaiveBayes] = None  # последняя обученная модель
+        self._pending: List[Tuple[str, str]] = []  # примеры, еще не учтенные моделью
+        self._rebuild = True  # обучить с нуля: обучающие данные + все примеры хранилища
+        self._started = False
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._train_lock = threading.Lock()
+        # Точность на обучающих данных: модели только на них и выгрузки (по отметке файла)
+        self._reference_accuracy: Optional[float] = None
+        self._export_accuracy: Optional[Tuple[tuple, float]] = None
+
+    def start(self):
+        """
+        Включить фоновое дообучение (при запуске бота).
+
+        Сохраненные примеры учитываются сразу, до первой загрузки прайс-листа:
+        иначе первые листы классифицировала бы и запомнила в реестре раскладок
+        модель из файла.
+        """
+        with self._lock:
+            self._started = True
+        if len(self.store):
+            self.retrain()
+
+    def learn(self, column_types: Dict[str, str]) -> int:
+        """
+        Запомнить классифицированные колонки (обучение - позже, в фоне).
+
+        Args:
+            column_types: {название колонки: тип}
+
+        Returns:
+            int: Количество новых примеров
+        """
+        added = 0
+        with self._lock:
+            for name, col_type in column_types.items():
+                key = str(name).strip().lower()
+                if not key or col_type == "IGNORE":
+                    continue
+                status = self.store.add(key, col_type)
+                if status is None:
+                    continue
+                if status == SAMPLE_REPLACED:
+                    self._rebuild = True
+                self._pending.append((key, col_type))
+                added += 1
+            if added and self._started:
+                self._schedule(self.debounce)
+        return added
+
+    def retrain(self) -> bool:
+        """
+        Дообучить модель на новых примерах и подменить общую модель детектора.
+
+        Returns:
+            bool: True, если модель обновлена (дообученная модель прошла проверку)
+        """
+        with self._train_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                rebuild, self._rebuild = self._rebuild, False
+                # Примеры берутся вместе с pending: learn пишет их под той же блокировкой
+                stored = self.store.items()
+            if not pending and not (rebuild and stored):
+                return False
+
+            if rebuild or self._model is None:
+                model = HashedNaiveBayes()
+                samples = list(TRAINING_DATA) + stored
+            else:
+                # Опубликованную модель читают парсеры - дообучаем копию
+                model = self._model.copy()
+                samples = pending
+            names, labels = zip(*samples)
+            model.partial_fit(names, labels)
+
+            # Следующие примеры дообучают эту модель, даже если она не прошла проверку
+            self._model = model
+            self.store.save()
+            accuracy, baseline = _accuracy(model), self._baseline_accuracy()
+            if accuracy < baseline:
+                print(
+                    f"Дообученная модель не принята: точность на обучающих данных "
+                    f"{accuracy:.3f} ниже {baseline:.3f}"
+                )
+                return False
+
+            self.shared.swap(model, _model_tag(stored))
+            print(f"Модель классификатора колонок дообучена: {len(samples)} примеров, всего {len(self.store)}")
+            return True
+
+    def flush(self) -> bool:
+        """
+        Дообучить сразу, не дожидаясь паузы.
+
+        Returns:
+            bool: True, если модель обновлена
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return self.retrain()
+
+    def shutdown(self):
+        """Остановить фоновое дообучение и сохранить примеры."""
+        with self._lock:
+            self._started = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.store.save()
+
+    def _baseline_accuracy(self) -> float:
+        """
+        Точность, ниже которой дообученная модель не публикуется.
+
+        Это лучшая из точностей на обучающих данных модели, обученной только
+        на них, и выгрузки из файла модели (если она есть).
+
+        Returns:
+            float: Доля верно классифицированных обучающих примеров
+        """
+        if self._reference_accuracy is None:
+            reference = HashedNaiveBayes()
+            reference.partial_fit(*zip(*TRAINING_DATA))
+            self._reference_accuracy = _accuracy(reference)
+
+        try:
+            stat = self.shared.path.stat()
+        except OSError:
+            return self._reference_accuracy
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if self._export_accuracy is None or self._export_accuracy[0] != stamp:
+            try:
+                export_accuracy = _accuracy(self.shared.loader(self.shared.path))
+            except Exception as e:
+                print(f"Ошибка проверки модели {self.shared.path}: {e}")
+                return self._reference_accuracy
+            self._export_accuracy = (stamp, export_accuracy)
+        return max(self._reference_accuracy, self._export_accuracy[1])
+
+    def _schedule(self, delay: float):
+        """Перезапустить таймер дообучения (вызывается под блокировкой)."""
+        if self._timer is not None:
+            self._timer.cancel()
+        timer = threading.Timer(delay, lambda: self._on_timer(timer))
+        timer.daemon = True
+        self._timer = timer
+        timer.start()
+
+    def _on_timer(self, timer: threading.Timer):
+        """Дообучение по таймеру: сбрасывается только свой таймер, а не запущенный после него."""
+        with self._lock:
+            if self._timer is timer:
+                self._timer = None
+        self.retrain()
+
+
+def _accuracy(model) -> float:
+    """
+    Точность модели на обучающих данных.
+
+    Args:
+        model: Модель (объект с predict)
+
+    Returns:
+        float: Доля верно классифицированных примеров TRAINING_DATA
+    """
+    names, labels = zip(*TRAINING_DATA)
+    predicted = model.predict(names)
+    return sum(p == label for p, label in zip(predicted, labels)) / len(labels)
+
+
+def _model_tag(samples: List[Tuple[str, str]]) -> str:
+    """
+    Отметка модели, обученной на обучающих данных и примерах хранилища.
+
+    Args:
+        samples: Примеры хранилища (порядок не важен)
+
+    Returns:
+        str: Отметка для SharedModel.swap
+    """
+    payload = json.dumps([list(TRAINING_DATA), sorted(samples)], ensure_ascii=False)
+    return "learned:" + hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
 
+# Дообучение общей модели процесса
+online_learner = AdaptiveColumnClassifier(
+    SampleStore(path=config.COLUMN_SAMPLES_PATH, max_entries=config.COLUMN_SAMPLES_MAX_ENTRIES),
+)
@@ -6,7 +6,7 @@ echo "Активация виртуального окружения..."
 source venv/bin/activate
 
 echo "Проверка наличия ML-модели..."
-if [ ! -f "ml/models/column_classifier.pkl" ]; then
+if [ ! -f "ml/models/column_classifier.json" ]; then
     echo "ML-модель не найдена. Обучение модели..."
     python ml/train_detector.py
 fi
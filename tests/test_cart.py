@@ -0,0 +1,204 @@
+"""
+Тесты для заказа пользователя и итогов корзины.
+"""
+import json
+import random
+import pytest
+from core.cart import CART_OP_KEY, CART_STATE_KEY, CartJournal, cart_totals, empty_cart, initial_order, order_lines, set_quantity
+from core.catalog import freeze_catalog
+
+
+def make_catalog():
+    """Каталог: банки и кеги, одна позиция без цены, одна с заказом из файла."""
+    return freeze_catalog([
+        {"название": "IPA", "заказ": None, "_is_keg": False, "_price_kop": 17550},
+        {"название": "IPA", "заказ": None, "_is_keg": True, "_price_kop": 550000},
+        {"название": "Stout", "заказ": 2, "_is_keg": False, "_price_kop": 21000},
+        {"название": "Lager", "заказ": 0, "_is_keg": False, "_price_kop": None},
+    ])
+
+
+class TestCart:
+    """Тесты для заказа и итогов корзины."""
+    
+    def test_initial_order(self):
+        """Тест: заказ из файла переносится в заказ пользователя."""
+        catalog = make_catalog()
+        order = initial_order(catalog)
+        assert order == {2: 2}
+        assert cart_totals(catalog, order) == {"positions": 1, "cans": 2, "kegs": 0, "sum_kop": 42000}
+        assert cart_totals(catalog, {}) == empty_cart()
+    
+    def test_set_quantity(self):
+        """Тест: изменение количества обновляет заказ и итоги."""
+        catalog = make_catalog()
+        order = initial_order(catalog)
+        cart = cart_totals(catalog, order)
+        
+        set_quantity(catalog, order, cart, 0, 12)
+        set_quantity(catalog, order, cart, 1, 1)
+        set_quantity(catalog, order, cart, 3, 6)
+        assert order == {0: 12, 1: 1, 2: 2, 3: 6}
+        assert cart == {"positions": 4, "cans": 20, "kegs": 1, "sum_kop": 12 * 17550 + 550000 + 42000}
+        
+        set_quantity(catalog, order, cart, 2, 0)
+        set_quantity(catalog, order, cart, 0, 6)
+        assert order == {0: 6, 1: 1, 3: 6}
+        assert cart == {"positions": 3, "cans": 12, "kegs": 1, "sum_kop": 6 * 17550 + 550000}
+    
+    def test_matches_full_recount(self):
+        """Тест: итоги после серии изменений совпадают с полным пересчетом."""
+        rng = random.Random(0)
+        catalog = freeze_catalog([dict(item) for item in make_catalog() * 5])
+        order = {}
+        cart = empty_cart()
+        for _ in range(200):
+            set_quantity(catalog, order, cart, rng.randrange(len(catalog)), rng.choice([None, -1, 0, 1, 6, 24]))
+            assert cart == cart_totals(catalog, order)
+            assert all(qty > 0 for qty in order.values())
+    
+    def test_sessions_do_not_share_orders(self):
+        """Тест: заказ одного пользователя не виден другому и не меняет каталог."""
+        catalog = make_catalog()
+        first, second = {}, {}
+        set_quantity(catalog, first, empty_cart(), 0, 12)
+        assert second == {}
+        assert catalog[0]["заказ"] is None
+        with pytest.raises(TypeError):
+            catalog[0]["заказ"] = 12
+    
+    def test_order_lines(self):
+        """Тест: строки заказа - копии позиций с количеством, в порядке каталога."""
+        catalog = make_catalog()
+        lines = order_lines(catalog, {3: 6, 0: 12})
+        assert [(line["название"], line["заказ"]) for line in lines] == [("IPA", 12), ("Lager", 6)]
+        assert catalog[0]["заказ"] is None
+
+
+
+class TestCartJournal:
+    """Тесты для журнала заказа."""
+    
+    def test_order_and_totals_follow_ops(self):
+        """Тест: заказ и итоги журнала обновляются каждой операцией."""
+        catalog = make_catalog()
+        journal = CartJournal(catalog, initial_order(catalog))
+        journal.set(0, 12)
+        journal.bulk([(1, 1), (2, 0)])
+        assert journal.order == {0: 12, 1: 1}
+        assert journal.cart == cart_totals(catalog, journal.order)
+        
+        journal.clear()
+        journal.set(3, 6)
+        assert journal.order == {3: 6}
+        assert journal.cart == cart_totals(catalog, {3: 6})
+    
+    def test_undo_redo(self):
+        """Тест: отмена и повтор применяют операцию в обратную и прямую сторону."""
+        catalog = make_catalog()
+        journal = CartJournal(catalog)
+        assert not journal.undo()
+        
+        journal.set(0, 12)
+        journal.bulk([(0, 3), (1, 1), (0, 5)])
+        journal.clear()
+        assert journal.undo()
+        assert journal.order == {0: 5, 1: 1}
+        assert journal.undo()
+        assert journal.order == {0: 12}
+        assert journal.cart == cart_totals(catalog, {0: 12})
+        assert journal.can_redo
+        assert journal.redo()
+        assert journal.redo()
+        assert journal.order == {}
+        
+        journal.undo()
+        journal.set(1, 2)
+        assert not journal.can_redo
+        assert journal.order == {0: 5, 1: 2}
+    
+    def test_state_writes_one_op(self):
+        """Тест: изменение записывает заголовок и одну операцию, сохраненный заказ не меняется."""
+        catalog = make_catalog()
+        data = CartJournal(catalog, initial_order(catalog)).to_state()
+        assert list(data) == [CART_STATE_KEY]
+        
+        for step in range(30):
+            journal = CartJournal.from_state(data, catalog, max_undo=5)
+            stored_order = data[CART_STATE_KEY]["order"]
+            stored_copy = dict(stored_order)
+            journal.set(step % 4, step)
+            changes = journal.to_state()
+            assert set(changes) == {CART_STATE_KEY, CART_OP_KEY.format(step % 5)}
+            assert stored_order == stored_copy
+            data = {**data, **changes}
+        
+        # Ячеек операций не больше max_undo, отменить можно последние max_undo изменений
+        assert len([key for key in data if key != CART_STATE_KEY]) == 5
+        journal = CartJournal.from_state(data, catalog, max_undo=5)
+        history = []
+        while journal.undo():
+            history.append(dict(journal.order))
+        assert len(history) == 5
+        assert history[-1] == {0: 24, 1: 21, 2: 22, 3: 23}
+    
+    def test_random_ops_match_reference(self):
+        """Тест: после случайных операций, отмен и повторов заказ и итоги совпадают с пересчетом."""
+        catalog = freeze_catalog([dict(item) for item in make_catalog() * 5])
+        rng = random.Random(1)
+        data = CartJournal(catalog).to_state()
+        orders, current, oldest = [{}], 0, 0  # Заказ после каждой операции, курсор, граница отмены
+        for step in range(300):
+            journal = CartJournal.from_state(data, catalog, max_undo=5)
+            action = rng.random()
+            if action < 0.2:
+                assert journal.undo() == (current > oldest)
+                current = max(current - 1, oldest)
+            elif action < 0.3:
+                assert journal.redo() == (current < len(orders) - 1)
+                current = min(current + 1, len(orders) - 1)
+            else:
+                order = dict(orders[current])
+                if action < 0.4:
+                    journal.clear()
+                    order = {}
+                else:
+                    changes = [(rng.randrange(len(catalog)), rng.choice([0, None, 1, 6])) for _ in range(3)]
+                    if action < 0.6:
+                        journal.bulk(changes)
+                    else:
+                        changes = changes[:1]
+                        journal.set(*changes[0])
+                    for pos, qty in changes:
+                        if qty:
+                            order[pos] = qty
+                        else:
+                            order.pop(pos, None)
+                orders = orders[:current + 1] + [order]
+                current += 1
+                oldest = max(oldest, current - 5)
+            data = {**data, **journal.to_state()}
+            assert journal.order == orders[current]
+            assert journal.cart == cart_totals(catalog, journal.order)
+    
+    def test_state_roundtrip(self):
+        """Тест: журнал переживает сериализацию состояния в JSON."""
+        catalog = make_catalog()
+        journal = CartJournal(catalog, initial_order(catalog))
+        journal.bulk([(0, 12), (1, 1)])
+        journal.set(2, 0)
+        journal.undo()
+        
+        restored = CartJournal.from_state(json.loads(json.dumps(journal.to_state())), catalog)
+        assert restored.order == journal.order
+        assert restored.cart == journal.cart
+        assert restored.redo()
+        assert restored.order == {0: 12, 1: 1}
+        
+        empty = CartJournal.from_state(None)
+        assert (empty.order, empty.cart) == ({}, empty_cart())
+        with pytest.raises(ValueError):
+            empty.set(0, 1)
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
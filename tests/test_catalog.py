@@ -0,0 +1,91 @@
+"""
+Тесты для представлений каталога.
+"""
+import json
+import pytest
+from core.catalog import CatalogStore, page_positions
+from core.facets import FACET_BREWERY, CatalogFacets
+from core.parse_cache import ParseCache
+
+
+def make_items():
+    """Каталог с повторяющимися строками (одинаковые название, объем и строка)."""
+    breweries = ["AF Brew", "Zavod", "AF Brew", "AF Brew", "Zavod"]
+    return [
+        {"название": "IPA", "объем": "0.5 л (банка)", "пивоварня": brewery, "_row_index": 2, "_pos": pos}
+        for pos, brewery in enumerate(breweries)
+    ]
+
+
+class TestCatalog:
+    """Тесты для представлений каталога."""
+    
+    def test_brewery_view(self):
+        """Тест: представление пивоварни - номера ее позиций."""
+        facets = CatalogFacets(make_items())
+        assert facets.view({FACET_BREWERY: "AF Brew"}) == [0, 2, 3]
+        assert facets.view({FACET_BREWERY: "Zavod"}) == [1, 4]
+        assert facets.view({FACET_BREWERY: "Нет такой"}) == []
+    
+    def test_page_positions(self):
+        """Тест: страница представления - срез номеров позиций."""
+        view = CatalogFacets(make_items()).view({FACET_BREWERY: "AF Brew"})
+        assert page_positions(view, 0, 2) == [0, 2]
+        assert page_positions(view, 1, 2) == [3]
+        assert list(page_positions(range(5), 1, 2)) == [2, 3]
+    
+    def test_duplicate_rows_keep_own_number(self):
+        """Тест: одинаковые строки получают разные номера (раньше - номер первой)."""
+        items = make_items()
+        numbers = [items[pos]["_pos"] + 1 for pos in page_positions(CatalogFacets(items).view({FACET_BREWERY: "AF Brew"}), 0, 20)]
+        assert numbers == [1, 3, 4]
+
+
+class TestCatalogStore:
+    """Тесты для общего хранилища каталогов."""
+    
+    def test_catalog_shared_and_read_only(self):
+        """Тест: один файл - один каталог для всех сессий, изменить его нельзя."""
+        store = CatalogStore(max_memory_bytes=1024 * 1024)
+        items = make_items()
+        catalog = store.put("hash", items)
+        assert store.put("hash", make_items()) is catalog
+        assert store.get("hash") is catalog
+        assert [dict(item) for item in catalog] == items
+        with pytest.raises(TypeError):
+            catalog[0]["заказ"] = 5
+    
+    def test_restored_from_parse_cache(self):
+        """Тест: вытесненный каталог восстанавливается из кэша парсинга."""
+        cache = ParseCache(max_memory_bytes=1024 * 1024)
+        cache.put("a", make_items())
+        store = CatalogStore(max_memory_bytes=1, source=cache)
+        store.put("a", make_items())
+        store.put("b", make_items())
+        assert store.stats()["entries"] == 1
+        
+        assert store.get("a")[0]["название"] == "IPA"
+        assert store.get("missing") is None
+        assert CatalogStore(max_memory_bytes=1).get("a") is None
+
+    
+    def test_memory_limit_counts_derived(self):
+        """Тест: лимит памяти учитывает позиции и производные структуры каталога."""
+        size = len(json.dumps(make_items(), ensure_ascii=False))
+        store = CatalogStore(max_memory_bytes=2 * size)
+        store.put("a", make_items())
+        store.put("b", make_items())
+        assert store.stats()["entries"] == 2
+        assert store.stats()["memory_bytes"] == 2 * size
+        
+        # Индекс каталога "b" не помещается рядом с "a" - вытесняется давно не использованный
+        index = store.search_index("b")
+        stats = store.stats()
+        assert stats["entries"] == 1
+        assert stats["memory_bytes"] == size + index.nbytes
+        assert store.search_index("b") is index
+        assert store.facets("a") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,317 @@
+"""
+Тесты для детектора типов колонок.
+"""
+import itertools
+import os
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+import pandas as pd
+import pytest
+from core.column_detector import (
+    COLUMN_RULES, FALLBACK_RULES, ColumnDetector, ExportedClassifier, RuleMatcher, SharedModel,
+)
+from ml.training_data import TRAINING_DATA
+
+# Заголовки из прайс-листов поставщиков (в дополнение к тестовым файлам)
+REAL_HEADERS = [
+    "Наименование", "Наименование пивоварни", "Пивоварня", "Производитель", "Бренд", "Brewery Name",
+    "Название пива", "Номенклатура", "Товар", "Продукт", "Product name", "Позиция",
+    "Стиль", "Стиль пива", "Style", "Сорт", "Тип", "Beer type", "Вид продукции", "Категория",
+    "Объем", "Объём, л", "Volume (L)", "Тип тары", "Тара", "Вид упаковки", "Тип фасовки", "Фасовка",
+    "Литраж", "Емкость", "мл", "Упаковка, шт", "Кратность упаковки",
+    "Цена", "ЦЕНА", "Цена за литр", "Цена за шт", "Цена опт, руб", "Цена со скидкой", "Price", "Price, RUB",
+    "Стоимость", "Сумма", "Сумма заказа", "Цена / сумма", "Руб.", "₽", "Cost",
+    "Заказ", "Заказать", "Количество заказа", "Order", "Заказ, шт", "Заказ кег",
+    "Остаток", "Наличие", "Склад", "Stock", "Годен до", "Срок годности", "Код", "Код товара", "Артикул",
+    "SKU", "ID", "Штрихкод", "ABV", "OG", "IBU", "EBC", "ABV / OG / IBU", "Unnamed: 0", "Unnamed: 7",
+    "Этикетка", "Фото", "Картинка", "Описание", "Комментарий", "Скидки", "Акции", "Promo",
+    "Dogma", "Logo", "Rating", "Кол-во", "№", "Примечание",
+]
+
+
+def header_corpus():
+    """Заголовки: реальные, обучающие и строки первых строк тестовых прайс-листов."""
+    headers = set(REAL_HEADERS) | {text for text, _ in TRAINING_DATA}
+    for path in (Path(__file__).parent / "test_data").glob("*.xlsx"):
+        with pd.ExcelFile(path) as xls:
+            for sheet_name in xls.sheet_names:
+                rows = xls.parse(sheet_name, header=None, nrows=12)
+                headers.update(value for value in rows.values.ravel() if isinstance(value, str))
+    return sorted(headers)
+
+
+def legacy_rule_type(cleaned_lower):
+    """Прежняя цепочка явных правил (эталон для таблицы COLUMN_RULES)."""
+    if 'цена' in cleaned_lower and 'сумма' not in cleaned_lower:
+        return "PRICE"
+    if 'price' in cleaned_lower or 'стоимость' in cleaned_lower:
+        return "PRICE"
+    if cleaned_lower in ['пивоварня', 'brewery', 'производитель']:
+        return "BREWERY"
+    if 'пивоварн' in cleaned_lower or 'brewery' in cleaned_lower:
+        return "BREWERY"
+    if cleaned_lower in ['название', 'наименование', 'name', 'номенклатура', 'продукт', 'товар']:
+        return "NAME"
+    if cleaned_lower in ['стиль', 'style', 'сорт', 'тип']:
+        return "STYLE"
+    if cleaned_lower in ['объем', 'объём', 'volume', 'тип тары', 'тара', 'вид упаковки', 'упаковка', 'тип фасовки', 'фасовка', 'литраж']:
+        return "VOLUME"
+    if 'тара' in cleaned_lower or 'упаковк' in cleaned_lower or 'фасовк' in cleaned_lower or 'литраж' in cleaned_lower:
+        return "VOLUME"
+    if cleaned_lower in ['заказ', 'order', 'количество заказа', 'заказать']:
+        return "ORDER_QUANTITY"
+    if 'заказ' in cleaned_lower and 'заказать' not in cleaned_lower:
+        return "ORDER_QUANTITY"
+    ignore_columns = [
+        'этикетка', 'etiquette', 'label', 'картинка', 'фото', 'abv', 'og', 'ibu', 'ebc',
+        'наличие', 'availability', 'stock', 'склад', 'остаток', 'годен до', 'expiry', 'expires', 'срок годности',
+        'скидки', 'акции', 'discount', 'promo', 'стоимость', 'сумма', 'код', 'sku', 'артикул', 'id',
+        'описание', 'description', 'комментарий', 'вид продукции', 'категория', 'category', 'unnamed',
+        'abv / og / ibu',
+    ]
+    if cleaned_lower in ignore_columns:
+        return "IGNORE"
+    if any(ignored in cleaned_lower for ignored in ['unnamed', 'остаток', 'сумма', 'код', 'срок', 'годн', 'abv', 'ibu', 'og', 'наличи']):
+        return "IGNORE"
+    return None
+
+
+def legacy_fallback(column_name):
+    """Прежняя цепочка резервных правил (эталон для таблицы FALLBACK_RULES)."""
+    name_lower = column_name.lower()
+    if name_lower in ["цена", "price", "стоимость", "cost"]:
+        return "PRICE"
+    if any(word in name_lower for word in ["цена", "price", "стоимость", "cost", "руб", "₽", "rub"]):
+        return "PRICE"
+    if any(word in name_lower for word in ["пивоварня", "brewery", "производитель", "бренд", "brand"]):
+        return "BREWERY"
+    if any(word in name_lower for word in ["название", "наименование", "name", "пиво", "beer", "продукт", "product"]):
+        return "NAME"
+    if any(word in name_lower for word in ["объем", "объём", "volume", "литр", "мл", "ml", "упаковка"]):
+        return "VOLUME"
+    if "тара" in name_lower:
+        return "VOLUME"
+    if any(word in name_lower for word in ["стиль", "style", "тип", "type", "сорт"]):
+        return "STYLE"
+    return "IGNORE"
+
+
+class ConstantModel:
+    """Модель, которая всегда отвечает одним типом и запоминает вызовы."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.calls = []
+
+    def predict(self, names):
+        self.calls.append(list(names))
+        return [self.label for _ in names]
+
+
+def load_pickle(path):
+    """Загрузчик тестовых моделей."""
+    return pickle.loads(Path(path).read_bytes())
+
+
+def write_model(path, label: str, mtime_ns: int):
+    """Сохранить модель и выставить время изменения файла."""
+    path.write_bytes(pickle.dumps(ConstantModel(label)))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+class TestSharedModel:
+    """Тесты для общей модели процесса."""
+
+    def test_loaded_once_and_shared(self, tmp_path):
+        """Тест: модель загружается один раз на все детекторы."""
+        path = tmp_path / "model.pkl"
+        write_model(path, "NAME", 10**18)
+        loads = []
+        shared = SharedModel(path, loader=lambda path: loads.append(1) or load_pickle(path))
+
+        first, second = ColumnDetector(shared), ColumnDetector(shared)
+        assert first.detect_column_type("Колонка X") == "NAME"
+        assert second.detect_column_type("Колонка Y") == "NAME"
+        assert first.model is second.model
+        assert len(loads) == 1
+        assert shared.version == 1
+
+    def test_reloaded_when_file_changes(self, tmp_path):
+        """Тест: измененный файл модели загружается заново, неизмененный - нет."""
+        path = tmp_path / "model.pkl"
+        write_model(path, "NAME", 10**18)
+        shared = SharedModel(path, loader=load_pickle)
+        model = shared.get()
+        assert shared.get() is model
+
+        write_model(path, "STYLE", 10**18 + 1)
+        assert shared.get().label == "STYLE"
+        assert shared.version == 2
+
+    def test_broken_file_keeps_previous_model(self, tmp_path):
+        """Тест: испорченный файл не заменяет загруженную модель."""
+        path = tmp_path / "model.pkl"
+        write_model(path, "NAME", 10**18)
+        shared = SharedModel(path, loader=load_pickle)
+        shared.get()
+
+        path.write_bytes(b"not a pickle")
+        assert shared.get().label == "NAME"
+        assert shared.version == 1
+
+    def test_tag_follows_model(self, tmp_path):
+        """Тест: отметка модели меняется при перезагрузке и замене, но не при каждом обращении."""
+        path = tmp_path / "model.pkl"
+        write_model(path, "NAME", 10**18)
+        shared = SharedModel(path, loader=load_pickle)
+        tag = shared.tag
+        assert shared.tag == tag
+        assert SharedModel(path, loader=load_pickle).tag == tag
+
+        write_model(path, "STYLE", 10**18 + 1)
+        reloaded = shared.tag
+        assert reloaded != tag
+
+        shared.swap(ConstantModel("PRICE"))
+        assert shared.tag not in (tag, reloaded)
+        shared.swap(ConstantModel("PRICE"), tag="learned:1")
+        model, tag = shared.current()
+        assert (model.label, tag) == ("PRICE", "learned:1")
+
+        shared.adopt(ConstantModel("VOLUME"), "learned:1")
+        assert shared.get() is model
+        shared.adopt(ConstantModel("VOLUME"), "learned:2")
+        assert shared.get().label == "VOLUME"
+
+    def test_missing_model_uses_fallback(self, tmp_path):
+        """Тест: без файла модели работают правила по ключевым словам."""
+        detector = ColumnDetector(SharedModel(tmp_path / "missing.pkl"))
+        assert detector.model is None
+        assert detector.detect_column_type("Бренд") == "BREWERY"
+        assert detector.detect_column_type("Цена, руб") == "PRICE"
+
+
+class TestBatchClassification:
+    """Тесты для пакетной классификации колонок."""
+
+    def test_single_predict_call(self, tmp_path):
+        """Тест: правила без модели, остальные названия - одним вызовом, повторы - один раз."""
+        path = tmp_path / "model.pkl"
+        write_model(path, "STYLE", 10**18)
+        shared = SharedModel(path, loader=load_pickle)
+        detector = ColumnDetector(shared)
+
+        names = ["Цена", "Колонка X", " колонка x ", "Колонка Y", None, "", "Остаток"]
+        assert detector.detect_column_types(names) == [
+            "PRICE", "STYLE", "STYLE", "STYLE", "IGNORE", "IGNORE", "IGNORE",
+        ]
+        assert shared.get().calls == [["Колонка X", "Колонка Y"]]
+
+        # Повторные названия отвечаются из кэша решений без модели
+        assert detector.detect_column_types(["КОЛОНКА X", "Цена"]) == ["STYLE", "PRICE"]
+        assert detector.detect_column_type("Колонка Y") == "STYLE"
+        assert len(shared.get().calls) == 1
+
+    def test_cache_bounded_and_reset_on_reload(self, tmp_path):
+        """Тест: кэш решений ограничен и сбрасывается вместе с моделью."""
+        path = tmp_path / "model.pkl"
+        write_model(path, "NAME", 10**18)
+        shared = SharedModel(path, max_cached_types=2, loader=load_pickle)
+        detector = ColumnDetector(shared)
+        detector.detect_column_types(["A1", "A2", "A3"])
+        assert shared.cached_type("a1") is None
+        assert shared.cached_type("a3") == "NAME"
+
+        write_model(path, "STYLE", 10**18 + 1)
+        assert detector.detect_column_type("A3") == "STYLE"
+
+    def test_replaced_model_decisions_not_cached(self, tmp_path):
+        """Тест: решения модели, замененной во время классификации, не попадают в кэш новой."""
+        shared = SharedModel(tmp_path / "missing.pkl")
+
+        class SwappedDuringPredict(ConstantModel):
+            def predict(self, names):
+                shared.swap(ConstantModel("STYLE"))
+                return super().predict(names)
+
+        shared.swap(SwappedDuringPredict("NAME"))
+        detector = ColumnDetector(shared)
+        assert detector.detect_column_types(["Колонка X", "Цена"]) == ["NAME", "PRICE"]
+        assert shared.cached_type("колонка x") is None
+        assert shared.cached_type("цена") is None
+        assert detector.detect_column_type("Колонка X") == "STYLE"
+
+
+class TestRuleTable:
+    """Тесты для таблицы правил: решения совпадают с прежними цепочками условий."""
+
+    def test_real_headers_identical(self):
+        """Тест: на реальных заголовках решения таблицы и цепочек совпадают."""
+        detector = ColumnDetector(SharedModel(Path("missing.pkl")))
+        corpus = header_corpus()
+        assert len(corpus) > 100
+        for header in corpus:
+            cleaned = header.strip()
+            assert detector._rule_type(cleaned.lower()) == legacy_rule_type(cleaned.lower()), header
+            assert detector._fallback_detection(cleaned) == legacy_fallback(cleaned), header
+
+    def test_keyword_combinations_identical(self):
+        """Тест: все пары слов правил (в том числе вложенные: "заказ" и "заказать") дают те же решения."""
+        words = sorted({
+            word for rule in COLUMN_RULES + FALLBACK_RULES for word in rule.words + rule.unless
+        })
+        rules, fallback = RuleMatcher(COLUMN_RULES), RuleMatcher(FALLBACK_RULES)
+        for first, second in itertools.product(words, repeat=2):
+            for text in (first, f"{first} {second}", f"{first}{second}"):
+                assert rules.match(text) == legacy_rule_type(text), text
+                assert (fallback.match(text) or "IGNORE") == legacy_fallback(text), text
+
+
+
+class TestExportedClassifier:
+    """Тесты для выгрузки модели и ее расчета на numpy."""
+
+    def test_same_predictions_as_pipeline(self, tmp_path):
+        """Тест: выгрузка предсказывает то же, что обученный Pipeline sklearn."""
+        pytest.importorskip("sklearn")
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.pipeline import Pipeline
+        from ml.train_detector import export_classifier
+
+        texts, labels = zip(*TRAINING_DATA)
+        corpus = header_corpus() + ["  Цена \n за   литр ", "x", ""]
+        for vectorizer in (
+            TfidfVectorizer(analyzer='char', ngram_range=(1, 3), max_features=100),
+            TfidfVectorizer(analyzer='char', ngram_range=(2, 4), sublinear_tf=True),
+        ):
+            model = Pipeline([('vectorizer', vectorizer), ('classifier', MultinomialNB(alpha=0.1))])
+            model.fit(texts, labels)
+            exported = ExportedClassifier.load(export_classifier(model, tmp_path / "model.json"))
+
+            assert exported.predict(corpus) == list(model.predict(corpus))
+            expected = model.named_steps['vectorizer'].transform(corpus).toarray()
+            assert abs(exported.transform(corpus) - expected).max() < 1e-12
+
+    def test_runtime_does_not_import_sklearn(self, tmp_path):
+        """Тест: детектор с выгрузкой работает без импорта sklearn."""
+        path = tmp_path / "model.json"
+        path.write_text(
+            '{"version": 1, "ngram_range": [1, 1], "lowercase": true, "sublinear_tf": false, "norm": "l2",'
+            ' "vocabulary": {"a": 0, "b": 1}, "idf": [1.0, 1.0], "classes": ["NAME", "STYLE"],'
+            ' "class_log_prior": [-0.7, -0.7], "feature_log_prob": [[-0.1, -2.3], [-2.3, -0.1]]}',
+            encoding='utf-8',
+        )
+        code = (
+            "import sys; from core.column_detector import ColumnDetector, SharedModel; "
+            f"detector = ColumnDetector(SharedModel({str(path)!r})); "
+            "assert detector.detect_column_types(['aaa', 'bbb']) == ['NAME', 'STYLE']; "
+            "assert 'sklearn' not in sys.modules"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).parent.parent)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,79 @@
+"""
+Тесты для фасетов каталога.
+"""
+import pytest
+from core.catalog import CatalogStore
+from core.facets import (
+    FACET_BREWERY, FACET_CATEGORY, FACET_CONTAINER, FACET_PRICE, NO_PRICE,
+    CatalogFacets, price_bucket,
+)
+from core.filters import Container
+
+
+def make_items():
+    """Позиции разных пивоварен, стилей, тары и цены."""
+    return [
+        {"название": "Black Magic", "пивоварня": "AF Brew", "стиль": "IPA",
+         "_container": Container.CAN, "_price_kop": 19000},
+        {"название": "Munich", "пивоварня": "Zavod", "стиль": "Helles",
+         "_container": Container.KEG, "_price_kop": 550000},
+        {"название": "Hazy", "пивоварня": "AF Brew", "стиль": "IPA",
+         "_container": Container.KEG, "_price_kop": 480000},
+        {"название": "Ночь", "пивоварня": "AF Brew", "стиль": "Stout",
+         "_container": "bottle", "_price_kop": None},
+        {"название": "Без имени", "пивоварня": None, "стиль": None,
+         "_container": None, "_price_kop": 14999},
+    ]
+
+
+class TestCatalogFacets:
+    """Тесты для CatalogFacets."""
+
+    def test_price_bucket(self):
+        """Тест: диапазоны цены по границам в рублях."""
+        assert price_bucket(14999) == "до 150 ₽"
+        assert price_bucket(15000) == "150-250 ₽"
+        assert price_bucket(99999) == "400-1000 ₽"
+        assert price_bucket(100000) == "от 1000 ₽"
+        assert price_bucket(None) == NO_PRICE
+
+    def test_values_in_display_order(self):
+        """Тест: значения фасетов - только встречающиеся, в порядке показа."""
+        facets = CatalogFacets(make_items())
+        assert facets.values(FACET_BREWERY) == ["AF Brew", "Zavod", "Без пивоварни"]
+        assert facets.values(FACET_CONTAINER) == ["Банки", "Бутылки", "Кеги", "Другая тара"]
+        assert facets.values(FACET_PRICE) == ["до 150 ₽", "150-250 ₽", "от 1000 ₽", NO_PRICE]
+
+    def test_combined_filters(self):
+        """Тест: несколько фильтров - пересечение масок."""
+        facets = CatalogFacets(make_items())
+        assert facets.view({}) == [0, 1, 2, 3, 4]
+        assert facets.view({FACET_BREWERY: "AF Brew"}) == [0, 2, 3]
+        assert facets.view({FACET_BREWERY: "AF Brew", FACET_CONTAINER: "Кеги"}) == [2]
+        assert facets.view({FACET_BREWERY: "Zavod", FACET_CATEGORY: "Темное"}) == []
+        assert facets.view({FACET_PRICE: "нет такого"}) == []
+
+    def test_counts_ignore_own_filter(self):
+        """Тест: счетчики фасета учитывают остальные фильтры, но не его собственный."""
+        facets = CatalogFacets(make_items())
+        filters = {FACET_BREWERY: "AF Brew", FACET_CONTAINER: "Кеги"}
+        assert facets.counts(FACET_BREWERY, filters) == {"AF Brew": 1, "Zavod": 1, "Без пивоварни": 0}
+        assert facets.counts(FACET_CONTAINER, filters) == {
+            "Банки": 1, "Бутылки": 1, "Кеги": 1, "Другая тара": 0,
+        }
+        assert sum(facets.counts(FACET_PRICE, {}).values()) == len(facets)
+
+    def test_store_builds_facets_once(self):
+        """Тест: фасеты строятся один раз на каталог и вытесняются вместе с ним."""
+        store = CatalogStore(max_memory_bytes=1)
+        store.put("a", make_items())
+        facets = store.facets("a")
+        assert store.facets("a") is facets
+
+        store.put("b", make_items())
+        assert store.facets("a") is None
+        assert store.facets("missing") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
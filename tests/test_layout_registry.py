@@ -0,0 +1,121 @@
+"""
+Тесты для реестра раскладок поставщиков.
+"""
+import json
+import pytest
+from core.layout_registry import LAYOUT_REGISTRY_VERSION, LayoutRegistry, fingerprint_row
+
+
+class TestLayoutRegistry:
+    """Тесты для LayoutRegistry."""
+    
+    def test_fingerprint_ignores_trailing_empty_cells(self):
+        """Тест: отпечаток не зависит от ширины листа, но зависит от позиций."""
+        base = fingerprint_row(["Название", "Цена"])
+        assert fingerprint_row(["Название", "Цена", None, float("nan")]) == base
+        assert fingerprint_row([" Название ", "Цена"]) == base
+        assert fingerprint_row([None, "Название", "Цена"]) != base
+        assert fingerprint_row([None, float("nan")]) is None
+    
+    def test_get_put_stats(self):
+        """Тест: попадания и промахи учитываются."""
+        registry = LayoutRegistry()
+        assert registry.get("abc") is None
+        registry.record_miss()
+        registry.put("abc", {"Название": "NAME", "Цена": "PRICE"})
+        
+        assert registry.get("abc") == {"Название": "NAME", "Цена": "PRICE"}
+        stats = registry.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+    
+    def test_persisted_between_instances(self, tmp_path):
+        """Тест: раскладки переживают перезапуск и сохраняют порядок колонок."""
+        path = tmp_path / "layouts.json"
+        LayoutRegistry(path).put("abc", {"Цена": "PRICE", "Название": "NAME"})
+        
+        restored = LayoutRegistry(path).get("abc")
+        assert list(restored) == ["Цена", "Название"]
+    
+    def test_stale_version_ignored(self, tmp_path):
+        """Тест: реестр старого формата не загружается."""
+        path = tmp_path / "layouts.json"
+        path.write_text(json.dumps({"version": LAYOUT_REGISTRY_VERSION - 1, "layouts": {"abc": {}}}))
+        assert LayoutRegistry(path).stats()["entries"] == 0
+    
+    def test_max_entries(self):
+        """Тест: давно не встречавшиеся раскладки вытесняются."""
+        registry = LayoutRegistry(max_entries=2)
+        registry.put("a", {"A": "NAME"})
+        registry.put("b", {"B": "NAME"})
+        registry.get("a")
+        registry.put("c", {"C": "NAME"})
+        
+        assert registry.get("b") is None
+        assert registry.get("a") == {"A": "NAME"}
+    
+    def test_snapshot_and_merge(self, tmp_path):
+        """Тест: раскладки и счетчики процесса пула добавляются в реестр родителя."""
+        path = tmp_path / "layouts.json"
+        parent = LayoutRegistry(path)
+        parent.put("a", {"A": "NAME"})
+        
+        worker = LayoutRegistry()
+        worker.merge(parent.snapshot())
+        assert worker.get("a") == {"A": "NAME"}
+        worker.put("b", {"B": "PRICE"})
+        
+        parent.merge({"b": {"B": "PRICE"}}, {"hits": 1, "stores": 1})
+        assert LayoutRegistry(path).get("b") == {"B": "PRICE"}
+        stats = parent.stats()
+        assert stats["hits"] == 1
+        assert stats["stores"] == 2
+        assert stats["entries"] == 2
+
+    
+    def test_model_change_forgets_layouts(self, tmp_path):
+        """Тест: раскладки другой модели забываются, отметка модели сохраняется в файл."""
+        path = tmp_path / "layouts.json"
+        registry = LayoutRegistry(path)
+        registry.put("a", {"A": "NAME"}, model="file:1:10")
+        assert registry.get("a", model="file:1:10") == {"A": "NAME"}
+        assert LayoutRegistry(path).get("a", model="file:1:10") == {"A": "NAME"}
+        
+        assert registry.get("a", model="file:2:10") is None
+        assert registry.model == "file:2:10"
+        assert registry.stats()["entries"] == 0
+        assert LayoutRegistry(path).model == "file:2:10"
+        
+        # Раскладки, классифицированные старой моделью, не смешиваются с новыми
+        registry.put("b", {"B": "PRICE"}, model="file:2:10")
+        registry.merge({"c": {"C": "NAME"}}, model="file:1:10")
+        assert registry.get("c", model="file:1:10") == {"C": "NAME"}
+        assert registry.get("b", model="file:1:10") is None
+        assert registry.snapshot("file:3:10") == {}
+    
+    def test_revalidate_keeps_unchanged_layouts(self, tmp_path):
+        """Тест: после смены модели остаются раскладки, которые она классифицирует так же."""
+        path = tmp_path / "layouts.json"
+        registry = LayoutRegistry(path)
+        registry.put("a", {"A": "NAME", "B": "PRICE"}, model="learned:1")
+        registry.put("b", {"A": "NAME", "C": "VOLUME"}, model="learned:1")
+        
+        calls = []
+        decisions = {"A": "NAME", "B": "PRICE", "C": "IGNORE"}
+        classify = lambda names: calls.append(names) or [decisions[name] for name in names]
+        
+        assert registry.revalidate("learned:2", classify) == 1
+        assert calls == [["A", "B", "C"]]
+        assert registry.model == "learned:2"
+        assert registry.get("a", model="learned:2") == {"A": "NAME", "B": "PRICE"}
+        assert registry.get("b", model="learned:2") is None
+        assert LayoutRegistry(path).get("a", model="learned:2") == {"A": "NAME", "B": "PRICE"}
+        
+        # Повторная перепроверка той же модели ничего не классифицирует
+        assert registry.revalidate("learned:2", classify) == 0
+        assert len(calls) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
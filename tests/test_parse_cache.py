@@ -0,0 +1,104 @@
+"""
+Тесты для кэша результатов парсинга.
+"""
+import json
+import pytest
+from core.parse_cache import DocumentIndex, PARSE_CACHE_VERSION, ParseCache
+
+
+class TestParseCache:
+    """Тесты для ParseCache."""
+    
+    @pytest.fixture
+    def items(self):
+        """Пример позиций."""
+        return [{"название": "Black Magic IPA", "цена": "250 руб.", "_row_index": 2}]
+    
+    def test_memory_hit_and_miss(self, items):
+        """Тест: попадание и промах в памяти учитываются в статистике."""
+        cache = ParseCache(max_memory_bytes=10_000)
+        
+        assert cache.get("abc") is None
+        cache.put("abc", items)
+        assert cache.get("abc") == items
+        
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["memory_hits"] == 1
+        assert stats["hits"] == 1
+    
+    def test_lru_eviction_by_bytes(self, items):
+        """Тест: вытесняется давно использованная запись при превышении лимита байт."""
+        size = len(json.dumps({"version": PARSE_CACHE_VERSION, "items": items}, ensure_ascii=False))
+        cache = ParseCache(max_memory_bytes=size * 2)
+        
+        cache.put("a", items)
+        cache.put("b", items)
+        cache.get("a")  # "a" становится самой свежей
+        cache.put("c", items)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == items
+        assert cache.get("c") == items
+        assert cache.stats()["evictions"] == 1
+    
+    def test_disk_tier_survives_restart(self, items, tmp_path):
+        """Тест: запись с диска доступна новому экземпляру кэша."""
+        ParseCache(max_memory_bytes=10_000, cache_dir=tmp_path).put("abc", items)
+        
+        restarted = ParseCache(max_memory_bytes=10_000, cache_dir=tmp_path)
+        assert restarted.get("abc") == items
+        assert restarted.stats()["disk_hits"] == 1
+        assert restarted.get("abc") == items
+        assert restarted.stats()["memory_hits"] == 1
+    
+    def test_stale_version_ignored(self, items, tmp_path):
+        """Тест: запись старого формата считается промахом."""
+        (tmp_path / "abc.json").write_text(json.dumps({"version": 0, "items": items}), encoding="utf-8")
+        
+        cache = ParseCache(max_memory_bytes=10_000, cache_dir=tmp_path)
+        assert cache.get("abc") is None
+
+
+class TestDocumentIndex:
+    """Тесты индекса file_unique_id -> хэш."""
+    
+    def test_hit_and_miss(self):
+        """Тест: известный документ возвращает хэш, неизвестный - None."""
+        index = DocumentIndex(ttl_seconds=60, max_entries=10)
+        index.put("uid1", "hash1")
+        
+        assert index.get("uid1") == "hash1"
+        assert index.get("uid2") is None
+        stats = index.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+    
+    def test_ttl_expiry(self):
+        """Тест: запись истекает по TTL."""
+        now = [0.0]
+        index = DocumentIndex(ttl_seconds=10, max_entries=10, clock=lambda: now[0])
+        index.put("uid1", "hash1")
+        
+        now[0] = 9.0
+        assert index.get("uid1") == "hash1"
+        now[0] = 10.0
+        assert index.get("uid1") is None
+        assert index.stats()["expired"] == 1
+        assert index.stats()["entries"] == 0
+    
+    def test_max_entries_evicts_oldest(self):
+        """Тест: при переполнении вытесняется самая старая запись."""
+        index = DocumentIndex(ttl_seconds=60, max_entries=2)
+        index.put("a", "1")
+        index.put("b", "2")
+        index.put("c", "3")
+        
+        assert index.get("a") is None
+        assert index.get("b") == "2"
+        assert index.get("c") == "3"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,14 +1,28 @@
 """
 Тесты для парсера Excel файлов.
 """
+import random
+import threading
 import pytest
+import pandas as pd
+import config
+from io import BytesIO
 from pathlib import Path
-from core.parser import ExcelParser
+from core.column_detector import ColumnDetector, SharedModel
+from core.layout_registry import LayoutRegistry
+from core.parser import ExcelParser, _frame_from_rows, _get_process_pool, shutdown_process_pool
 from core.filters import (
+    Container,
+    StyleMatcher,
     extract_beer_style,
+    extract_beer_styles,
     extract_brewery_from_filename,
     extract_volume,
-    extract_price
+    extract_volumes,
+    extract_price,
+    extract_prices,
+    price_kopecks,
+    volume_fields
 )
 
 
@@ -22,6 +36,85 @@ class TestFilters:
         assert extract_beer_style("Классическое Pilsner") == "Pilsner"
         assert extract_beer_style("Обычное пиво") is None
     
+    def test_extract_beer_style_longest_match(self):
+        """Тест: находится самый длинный стиль, даже если короткий стоит раньше."""
+        assert extract_beer_style("Stout, а внутри Imperial Stout") == "Imperial Stout"
+        assert extract_beer_style("Russian Imperial Stout") == "Russian Imperial Stout"
+        assert extract_beer_style("Munich Helles") == "Helles"
+    
+    def test_extract_beer_style_short_terms_whole_word(self):
+        """Тест: короткие стили из категорий не находятся внутри слов."""
+        assert extract_beer_style("Балтика банка") is None
+        assert extract_beer_style("Paris") is None
+        assert extract_beer_style("Zagovor RIS") == "RIS"
+    
+    def test_style_matcher_matches_linear_scan(self):
+        """Тест: скомпилированный поиск совпадает с перебором стилей по убыванию длины."""
+        def linear(text):
+            if not text or not isinstance(text, str):
+                return None
+            for style in sorted(config.BEER_STYLES, key=len, reverse=True):
+                if style.upper() in text.upper():
+                    return style
+            return None
+        
+        matcher = StyleMatcher(config.BEER_STYLES)
+        words = config.BEER_STYLES + ["Пиво", "banka", "Imperial", "Pale", "ß", ""]
+        random.seed(0)
+        texts = [" ".join(random.choices(words, k=random.randint(0, 4))) for _ in range(2000)]
+        texts += [None, 42, "Black Magic\nIPA"]
+        
+        assert [matcher.match(text) for text in texts] == [linear(text) for text in texts]
+        assert matcher.match_many(texts) == [linear(text) for text in texts]
+    
+    def test_style_matcher_batch_keeps_newlines(self):
+        """Тест: пакетный поиск по многострочным ячейкам совпадает с поштучным."""
+        matcher = StyleMatcher(config.BEER_STYLES, ["RIS"])
+        texts = ["Imperial\nStout", "Russian Imperial\nStout", "RIS\nбанка", "Black\nMagic IPA", "\nIPA\n", "Pale\nAle"]
+        
+        assert matcher.match_many(texts) == [matcher.match(text) for text in texts]
+    
+    def test_normalizers_cache_keeps_types(self):
+        """Тест: кэш различает 300 и 300.0 (как и без кэша)."""
+        assert extract_price(300) == "300 руб."
+        assert extract_price(300.0) == "300.0 руб."
+        assert extract_price(300) == "300 руб."
+        assert extract_volume(20) == "20 л (ПЭТ-кега)"
+        assert extract_volume(["кега"]) is None  # Нехэшируемое значение
+    
+    def test_normalizers_batch(self):
+        """Тест: пакетная нормализация колонки совпадает с поштучной."""
+        volumes = pd.Series(["0,5 л банка", None, "кега 30", float("nan"), "0,5 л банка"], index=[5, 6, 7, 8, 9])
+        result = extract_volumes(volumes)
+        assert list(result.index) == [5, 6, 7, 8, 9]
+        assert result.tolist() == ["0.5 л (банка)", None, "30 л (кега)", None, "0.5 л (банка)"]
+        
+        prices = pd.Series([250, "5 500 ₽", None, "по запросу"])
+        assert extract_prices(prices).tolist() == ["250 руб.", "5 руб.", None, None]
+    
+    def test_volume_fields(self):
+        """Тест: литраж, тара и признак кеги из объема позиции."""
+        assert volume_fields("0.5 л (банка)") == (0.5, Container.CAN, False)
+        assert volume_fields("0.33 л (бутылка)") == (0.33, Container.BOTTLE, False)
+        assert volume_fields("30 л (кега)") == (30.0, Container.KEG, True)
+        assert volume_fields("20 л (ПЭТ-кега)") == (20.0, Container.PET_KEG, True)
+        assert volume_fields("кега") == (None, Container.KEG, True)
+        assert volume_fields("1.0 л") == (1.0, None, False)
+        assert volume_fields(None) == (None, None, False)
+    
+    def test_price_kopecks(self):
+        """Тест: перевод цены в копейки."""
+        assert price_kopecks("250 руб.") == 25000
+        assert price_kopecks("175.5 руб.") == 17550
+        assert price_kopecks("99.99 руб.") == 9999
+        assert price_kopecks("10.005 руб.") == 1001
+        assert price_kopecks(None) is None
+    
+    def test_extract_beer_styles_batch(self):
+        """Тест: пакетный поиск по колонке."""
+        names = ["Black Magic IPA", None, "", "Обычное пиво", "Imperial Stout Dark"]
+        assert extract_beer_styles(names) == [extract_beer_style(name) for name in names]
+    
     def test_extract_brewery_from_filename(self):
         """Тест извлечения пивоварни из имени файла."""
         assert extract_brewery_from_filename("afbrew_pricelist.xlsx") is not None
@@ -42,13 +135,20 @@ class TestFilters:
         assert extract_price("5500", "30 л (кега)") is not None
 
 
+class NameModel:
+    """Модель, которая любую колонку считает названием (передается в процессы пула)."""
+    
+    def predict(self, names):
+        return ["NAME" for _ in names]
+
+
 class TestParser:
     """Тесты для парсера."""
     
     @pytest.fixture
     def parser(self):
-        """Создание экземпляра парсера."""
-        return ExcelParser()
+        """Создание экземпляра парсера (с пустым реестром раскладок)."""
+        return ExcelParser(layouts=LayoutRegistry())
     
     @pytest.fixture
     def test_data_dir(self):
@@ -71,6 +171,7 @@ class TestParser:
         
         assert len(items) > 0
         assert any("IPA" in str(item.get('название', '')) for item in items)
+        assert [item["_pos"] for item in items] == list(range(len(items)))
     
     def test_parse_kegs_file(self, parser, test_data_dir):
         """Тест парсинга файла с кегами."""
@@ -84,6 +185,268 @@ class TestParser:
         assert len(items) > 0
         # Проверка наличия кег
         assert any("кег" in str(item.get('объем', '')).lower() for item in items)
+        assert all(item["_is_keg"] == ("кег" in str(item["объем"]).lower()) for item in items)
+        assert all(item["_price_kop"] == price_kopecks(item["цена"]) for item in items)
+    
+    def test_header_frame_matches_read_excel(self, parser, test_data_dir):
+        """Тест: DataFrame из сырой сетки совпадает с pd.read_excel(header=...)."""
+        for file_path in sorted(test_data_dir.glob("*.xlsx")):
+            with pd.ExcelFile(file_path) as xls:
+                for sheet_name in xls.sheet_names:
+                    df, header_row_idx = parser._read_excel_with_header_detection(xls, sheet_name)
+                    if df is None:
+                        continue
+                    header = header_row_idx - 1 if header_row_idx else 0
+                    expected = pd.read_excel(file_path, sheet_name=sheet_name, header=header)
+                    expected.columns = [str(col).strip() for col in expected.columns]
+                    pd.testing.assert_frame_equal(df.drop(columns=['_original_row']), expected)
+    
+    def test_vectorized_matches_rowwise(self, test_data_dir):
+        """Тест: векторное извлечение дает те же позиции, что и построчное."""
+        rowwise = ExcelParser(auto_learn=False, vectorized=False, layouts=LayoutRegistry())
+        vectorized = ExcelParser(auto_learn=False, vectorized=True, layouts=LayoutRegistry())
+        
+        for file_path in sorted(test_data_dir.glob("*.xlsx")):
+            assert vectorized.parse_file(str(file_path)) == rowwise.parse_file(str(file_path))
+        
+        # Граничные случаи: подхват названия для кег, пустые ячейки, стиль из названия
+        df = pd.DataFrame({
+            "Название": ["Black Magic IPA", None, "  Helles\nописание ", None, "Внимание: отгрузка", 0, "Gose"],
+            "Объем": ["0,5 л банка", "Кега 30", 20, "кега 20", "0.33", "0.5", None],
+            "Цена": [250, "5 500 руб", "320,5", None, 100, 90, "договорная"],
+            "Остаток": [5, None, "Много", 3, 50, 12, 40.0],
+            "_original_row": range(2, 9),
+        })
+        column_types = rowwise._classify_columns(df)
+        expected = rowwise._extract_beer_items(df, column_types, "AF Brew", sheet_index=1)
+        items = vectorized._extract_beer_items(df, column_types, "AF Brew", sheet_index=1)
+        assert items == expected
+        assert [item["_row_index"] for item in items] == [3, 4]
+        assert items[0]["название"] == "Black Magic IPA"
+    
+    def test_iter_items_streams_same_items(self, parser, test_data_dir):
+        """Тест: потоковый режим отдает те же позиции, что и parse_file."""
+        for file_path in sorted(test_data_dir.glob("*.xlsx")):
+            stream = parser.iter_items(str(file_path))
+            assert not isinstance(stream, list)
+            assert list(stream) == parser.parse_file(str(file_path))
+    
+    def test_iter_items_chunks_keep_keg_names(self, parser, tmp_path):
+        """Тест: название для строки с кегой подхватывается через границу блока."""
+        file_path = tmp_path / "kegs.xlsx"
+        pd.DataFrame({
+            "Название": ["Helles", None, "Gose", None],
+            "Объем": ["0,5 л банка", "кега 30", "0,33 л банка", "кега 20"],
+            "Цена": [150, 5500, 160, 4000],
+        }).to_excel(file_path, index=False)
+        
+        for chunk_rows in (1, 2, 1000):
+            items = list(parser.iter_items(str(file_path), chunk_rows=chunk_rows))
+            assert [item["название"] for item in items] == ["Helles", "Helles", "Gose", "Gose"]
+            assert [item["_row_index"] for item in items] == [2, 3, 4, 5]
+    
+    def test_iter_items_keeps_cells_right_of_header(self, parser, tmp_path):
+        """Тест: ячейки правее заголовков не отбрасываются, как и в parse_file."""
+        df = _frame_from_rows(["Название", "Цена"], [["Helles", 150, "сноска"], ["Gose"]])
+        assert list(df.columns) == ["Название", "Цена", "Unnamed: 2"]
+        assert df["Unnamed: 2"].tolist()[0] == "сноска"
+        
+        file_path = tmp_path / "wide.xlsx"
+        rows = [
+            ["Название", "Объем", "Цена", None],
+            ["Helles", "0,5 л банка", "150 руб", "новинка"],
+            ["Gose", "0,33 л банка", "160 руб", None],
+        ]
+        pd.DataFrame(rows).to_excel(file_path, header=False, index=False)
+        
+        expected = parser.parse_file(str(file_path))
+        assert len(expected) == 2
+        for chunk_rows in (1, 1000):
+            assert list(parser.iter_items(str(file_path), chunk_rows=chunk_rows)) == expected
+    
+    def test_iter_items_raises_on_broken_sheet(self, parser, test_data_dir):
+        """Тест: ошибка посреди книги не выдает оборванный список за полный."""
+        file_path = str(test_data_dir / "afbrew_pricelist.xlsx")
+        extract = parser._extract_beer_items
+        calls = []
+        
+        def broken(*args, **kwargs):
+            calls.append(1)
+            if len(calls) > 1:
+                raise ValueError("битый лист")
+            return extract(*args, **kwargs)
+        
+        parser._extract_beer_items = broken
+        with pytest.raises(ValueError):
+            list(parser.iter_items(file_path, chunk_rows=1))
+    
+    def test_parallel_sheets_keep_order(self, tmp_path):
+        """Тест: параллельный разбор листов сохраняет порядок и _sheet_index."""
+        file_path = tmp_path / "multi_sheet.xlsx"
+        with pd.ExcelWriter(file_path) as writer:
+            for sheet_idx in range(3):
+                pd.DataFrame({
+                    "Название": [f"Beer {sheet_idx}-{i}" for i in range(5)],
+                    "Объем": ["0,5 л банка"] * 5,
+                    "Цена": [100 + i for i in range(5)],
+                }).to_excel(writer, sheet_name=f"Лист{sheet_idx}", index=False)
+        
+        sequential = ExcelParser(auto_learn=False, workers=0, layouts=LayoutRegistry()).parse_file(str(file_path))
+        parallel = ExcelParser(auto_learn=False, workers=2, layouts=LayoutRegistry()).parse_file(str(file_path))
+        
+        assert parallel == sequential
+        assert [item["_sheet_index"] for item in parallel] == [0] * 5 + [1] * 5 + [2] * 5
+    
+    def test_parallel_sheets_merge_layouts(self, tmp_path):
+        """Тест: раскладки из процессов пула добавляет в реестр родительский процесс."""
+        file_path = tmp_path / "multi_sheet.xlsx"
+        with pd.ExcelWriter(file_path) as writer:
+            for sheet_idx, header in enumerate([["Название", "Объем", "Цена"], ["Объем", "Название", "Цена"]]):
+                pd.DataFrame([
+                    ["Прайс на неделю", None, None],
+                    header,
+                    [{"Название": f"Beer {sheet_idx}", "Объем": "0,5 л банка", "Цена": 250}[col] for col in header],
+                ]).to_excel(writer, sheet_name=f"Лист{sheet_idx}", header=False, index=False)
+        
+        registry_path = tmp_path / "layouts.json"
+        registry = LayoutRegistry(registry_path)
+        parser = ExcelParser(auto_learn=False, workers=2, layouts=registry)
+        expected = parser.parse_file(str(file_path))
+        
+        assert registry.stats()["entries"] == 2
+        assert LayoutRegistry(registry_path).stats()["entries"] == 2
+        assert parser.parse_file(str(file_path)) == expected
+        assert registry.stats()["hits"] == 2
+    
+    def test_parallel_sheets_use_parent_model(self, tmp_path):
+        """Тест: процессы пула классифицируют колонки моделью родительского процесса."""
+        file_path = tmp_path / "multi_sheet.xlsx"
+        with pd.ExcelWriter(file_path) as writer:
+            for sheet_idx in range(2):
+                pd.DataFrame({
+                    "Позиция": [f"Beer {sheet_idx}-{i}" for i in range(3)],
+                    "Объем": ["0,5 л банка"] * 3,
+                    "Цена": [100 + i for i in range(3)],
+                }).to_excel(writer, sheet_name=f"Лист{sheet_idx}", index=False)
+        
+        shared = SharedModel(tmp_path / "missing.pkl")
+        shared.swap(NameModel(), tag="learned:test")
+        sequential = ExcelParser(auto_learn=False, workers=0, layouts=LayoutRegistry())
+        sequential.detector = ColumnDetector(shared)
+        registry = LayoutRegistry()
+        parallel = ExcelParser(auto_learn=False, workers=2, layouts=registry)
+        parallel.detector = ColumnDetector(shared)
+        
+        expected = sequential.parse_file(str(file_path))
+        assert len(expected) == 6
+        assert parallel.parse_file(str(file_path)) == expected
+        assert registry.model == "learned:test"
+    
+    def test_process_pool_shared_between_threads(self):
+        """Тест: потоки получают один пул процессов, остановка пула создает новый при следующем разборе."""
+        pools = []
+        threads = [threading.Thread(target=lambda: pools.append(_get_process_pool(3))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len({id(pool) for pool in pools}) == 1
+        assert _get_process_pool(2) is not pools[0]
+        shutdown_process_pool()
+        assert _get_process_pool(3) is not pools[0]
+        shutdown_process_pool()
+    
+    def test_parse_from_memory(self, parser, test_data_dir):
+        """Тест: разбор из bytes, memoryview и BytesIO совпадает с разбором файла."""
+        for file_path in sorted(test_data_dir.glob("*.xlsx")):
+            expected = parser.parse_file(str(file_path))
+            data = file_path.read_bytes()
+            
+            assert parser.parse_file(data, filename=file_path.name) == expected
+            assert parser.parse_file(memoryview(data), filename=file_path.name) == expected
+            assert parser.parse_file(BytesIO(data), filename=file_path.name) == expected
+            assert list(parser.iter_items(BytesIO(data), filename=file_path.name)) == expected
+    
+    def test_parallel_sheets_from_memory(self, tmp_path):
+        """Тест: параллельный разбор работает и для книги в памяти."""
+        file_path = tmp_path / "multi_sheet.xlsx"
+        with pd.ExcelWriter(file_path) as writer:
+            for sheet_idx in range(2):
+                pd.DataFrame({
+                    "Название": [f"Beer {sheet_idx}-{i}" for i in range(3)],
+                    "Объем": ["0,5 л банка"] * 3,
+                    "Цена": [100 + i for i in range(3)],
+                }).to_excel(writer, sheet_name=f"Лист{sheet_idx}", index=False)
+        
+        expected = ExcelParser(auto_learn=False, workers=0, layouts=LayoutRegistry()).parse_file(str(file_path))
+        parallel = ExcelParser(auto_learn=False, workers=2, layouts=LayoutRegistry()).parse_file(
+            BytesIO(file_path.read_bytes())
+        )
+        assert parallel == expected
+    
+    def test_known_layout_skips_detection(self, tmp_path):
+        """Тест: повторный файл берет раскладку из реестра без классификации."""
+        registry = LayoutRegistry()
+        parser = ExcelParser(auto_learn=False, layouts=registry)
+        file_path = str(tmp_path / "supplier.xlsx")
+        rows = [
+            ["Прайс на неделю", None, None],
+            ["Название", "Объем", "Цена"],
+            ["Black Magic IPA", "0,5 л банка", 250],
+            ["Gose", "кега 30", 5500],
+        ]
+        pd.DataFrame(rows).to_excel(file_path, header=False, index=False)
+        
+        expected = parser.parse_file(file_path)
+        assert len(expected) == 2
+        assert registry.stats()["stores"] == 1
+        
+        calls = []
+        detect = parser.detector.detect_column_types
+        parser.detector.detect_column_types = lambda names: calls.append(names) or detect(names)
+        
+        assert parser.parse_file(file_path) == expected
+        assert list(parser.iter_items(file_path)) == expected
+        assert calls == []
+        assert registry.stats()["hits"] > 0
+    
+    def test_model_change_revalidates_layouts(self, tmp_path):
+        """Тест: после смены модели раскладки перепроверяются, а не забываются."""
+        registry = LayoutRegistry()
+        parser = ExcelParser(auto_learn=False, layouts=registry)
+        parser.detector = ColumnDetector(SharedModel(tmp_path / "missing.pkl"))
+        file_path = str(tmp_path / "supplier.xlsx")
+        rows = [
+            ["Прайс на неделю", None, None],
+            ["Название", "Объем", "Цена"],
+            ["Black Magic IPA", "0,5 л банка", 250],
+        ]
+        pd.DataFrame(rows).to_excel(file_path, header=False, index=False)
+        expected = parser.parse_file(file_path)
+        
+        calls = []
+        detect = parser.detector.detect_column_types
+        parser.detector.detect_column_types = lambda names: calls.append(names) or detect(names)
+        
+        # Новая модель классифицирует колонки так же - раскладка остается
+        parser.detector.shared.swap(None)
+        assert parser.parse_file(file_path) == expected
+        assert calls == [["Название", "Объем", "Цена"]]
+        assert registry.model == parser.detector.model_tag
+        assert registry.stats()["entries"] == 1
+        assert list(parser.iter_items(file_path)) == expected
+        assert len(calls) == 1
+        
+        # Новая модель меняет тип колонки - лист классифицируется заново
+        calls.clear()
+        parser.detector.detect_column_types = (
+            lambda names: calls.append(names) or (["IGNORE"] * len(names) if len(calls) == 1 else detect(names))
+        )
+        parser.detector.shared.swap(None)
+        assert parser.parse_file(file_path) == expected
+        assert len(calls) == 2
+        assert registry.stats()["entries"] == 1
     
     def test_parse_with_brewery_override(self, parser, test_data_dir):
         """Тест парсинга с переопределением пивоварни."""
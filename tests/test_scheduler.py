@@ -0,0 +1,294 @@
+"""
+Тесты для планировщика задач парсинга.
+"""
+import asyncio
+import threading
+import time
+import pytest
+from core.scheduler import ParseJobCancelled, ParseQueueFull, ParseScheduler
+
+
+def blocking_job(event: threading.Event, value):
+    """Задача, которая ждет сигнала (имитация долгого парсинга)."""
+    event.wait(timeout=5)
+    return value
+
+
+class TestParseScheduler:
+    """Тесты для ParseScheduler."""
+    
+    @pytest.mark.asyncio
+    async def test_run_returns_result(self):
+        """Тест: результат функции возвращается ожидающему."""
+        scheduler = ParseScheduler(max_concurrent=1, max_queue=5)
+        try:
+            assert await scheduler.run(1, sum, [1, 2, 3]) == 6
+            assert scheduler.stats()["completed"] == 1
+        finally:
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_event_loop_stays_responsive(self):
+        """Тест: долгий парсинг не блокирует цикл событий."""
+        scheduler = ParseScheduler(max_concurrent=1, max_queue=5)
+        try:
+            job = asyncio.create_task(scheduler.run(1, time.sleep, 0.3))
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            assert time.perf_counter() - start < 0.2
+            await job
+        finally:
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_new_upload_cancels_previous(self):
+        """Тест: новая задача пользователя отменяет предыдущую."""
+        scheduler = ParseScheduler(max_concurrent=1, max_queue=5)
+        event = threading.Event()
+        try:
+            first = asyncio.create_task(scheduler.run(1, blocking_job, event, "old"))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(scheduler.run(1, blocking_job, event, "new"))
+            await asyncio.sleep(0.01)
+            event.set()
+            
+            with pytest.raises(ParseJobCancelled):
+                await first
+            assert await second == "new"
+            assert scheduler.stats()["cancelled"] == 1
+        finally:
+            event.set()
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_queue_limit(self):
+        """Тест: при переполненной очереди новая задача отклоняется."""
+        scheduler = ParseScheduler(max_concurrent=1, max_queue=1)
+        event = threading.Event()
+        try:
+            running = asyncio.create_task(scheduler.run(1, blocking_job, event, 1))
+            await asyncio.sleep(0.01)
+            queued = asyncio.create_task(scheduler.run(2, blocking_job, event, 2))
+            await asyncio.sleep(0.01)
+            
+            with pytest.raises(ParseQueueFull):
+                await scheduler.run(3, blocking_job, event, 3)
+            
+            event.set()
+            assert await running == 1
+            assert await queued == 2
+            assert scheduler.stats()["rejected"] == 1
+        finally:
+            event.set()
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_fair_order_between_users(self):
+        """Тест: пользователь без выполняемых задач обслуживается раньше."""
+        scheduler = ParseScheduler(max_concurrent=2, max_queue=5)
+        stale_event = threading.Event()
+        other_event = threading.Event()
+        order = []
+        
+        def record(name):
+            order.append(name)
+            return name
+        
+        try:
+            # Оба слота заняты: отмененной задачей пользователя 1 и задачей пользователя 3
+            stale = asyncio.create_task(scheduler.run(1, blocking_job, stale_event, "stale"))
+            other = asyncio.create_task(scheduler.run(3, blocking_job, other_event, "other"))
+            await asyncio.sleep(0.01)
+            first = asyncio.create_task(scheduler.run(1, record, "user1"))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(scheduler.run(2, record, "user2"))
+            await asyncio.sleep(0.01)
+            
+            # Освободившийся слот получает пользователь 2, хотя 1 встал в очередь раньше
+            other_event.set()
+            assert await second == "user2"
+            assert await first == "user1"
+            assert order == ["user2", "user1"]
+            with pytest.raises(ParseJobCancelled):
+                await stale
+            assert await other == "other"
+        finally:
+            stale_event.set()
+            other_event.set()
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_same_key_coalesced(self):
+        """Тест: одновременные задачи с одним ключом выполняются один раз."""
+        scheduler = ParseScheduler(max_concurrent=2, max_queue=5)
+        event = threading.Event()
+        calls = []
+        
+        def parse(value):
+            calls.append(value)
+            event.wait(timeout=5)
+            return value
+        
+        try:
+            jobs = [
+                asyncio.create_task(scheduler.run(user_id, parse, "items", key="hash"))
+                for user_id in (1, 2, 3)
+            ]
+            await asyncio.sleep(0.01)
+            event.set()
+            
+            assert await asyncio.gather(*jobs) == ["items"] * 3
+            assert calls == ["items"]
+            stats = scheduler.stats()
+            assert stats["coalesced"] == 2
+            assert stats["submitted"] == 1
+            assert stats["in_flight"] == 0
+        finally:
+            event.set()
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_follower_takes_over_cancelled_leader(self):
+        """Тест: если лидер отменен своим пользователем, ожидающий парсит сам."""
+        scheduler = ParseScheduler(max_concurrent=2, max_queue=5)
+        event = threading.Event()
+        try:
+            leader = asyncio.create_task(scheduler.run(1, blocking_job, event, "items", key="hash"))
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(scheduler.run(2, blocking_job, event, "items", key="hash"))
+            await asyncio.sleep(0.01)
+            
+            # Пользователь 1 загрузил другой файл
+            other = asyncio.create_task(scheduler.run(1, blocking_job, event, "other"))
+            await asyncio.sleep(0.01)
+            event.set()
+            
+            with pytest.raises(ParseJobCancelled):
+                await leader
+            assert await follower == "items"
+            assert await other == "other"
+        finally:
+            event.set()
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_follower_cancelled_by_own_upload(self):
+        """Тест: новая загрузка отменяет ожидание чужого результата."""
+        scheduler = ParseScheduler(max_concurrent=2, max_queue=5)
+        event = threading.Event()
+        try:
+            leader = asyncio.create_task(scheduler.run(1, blocking_job, event, "items", key="hash"))
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(scheduler.run(2, blocking_job, event, "items", key="hash"))
+            await asyncio.sleep(0.01)
+            newer = asyncio.create_task(scheduler.run(2, blocking_job, event, "newer"))
+            await asyncio.sleep(0.01)
+            event.set()
+            
+            with pytest.raises(ParseJobCancelled):
+                await follower
+            assert await leader == "items"
+            assert await newer == "newer"
+        finally:
+            event.set()
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_same_file_reupload_keeps_running_job(self):
+        """Тест: повторная загрузка того же файла ждет идущую задачу, а не парсит заново."""
+        scheduler = ParseScheduler(max_concurrent=2, max_queue=5)
+        event = threading.Event()
+        calls = []
+        
+        def parse(value):
+            calls.append(value)
+            return blocking_job(event, value)
+        
+        try:
+            first = asyncio.create_task(scheduler.run(1, parse, "items", key="hash"))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(scheduler.run(1, parse, "items", key="hash"))
+            await asyncio.sleep(0.01)
+            third = asyncio.create_task(scheduler.run(1, parse, "items", key="hash"))
+            await asyncio.sleep(0.01)
+            event.set()
+            
+            with pytest.raises(ParseJobCancelled):
+                await first
+            with pytest.raises(ParseJobCancelled):
+                await second
+            assert await third == "items"
+            assert calls == ["items"]
+            stats = scheduler.stats()
+            assert stats["submitted"] == 1
+            assert stats["cancelled"] == 2
+            assert stats["in_flight"] == 0
+        finally:
+            event.set()
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_after_thread_stops(self):
+        """Тест: аргументы отмененной задачи освобождаются только после завершения потока."""
+        scheduler = ParseScheduler(max_concurrent=1, max_queue=5)
+        event = threading.Event()
+        released = []
+        try:
+            first = asyncio.create_task(scheduler.run(
+                1, blocking_job, event, "old", cleanup=lambda: released.append("old")
+            ))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(scheduler.run(
+                1, blocking_job, event, "new", cleanup=lambda: released.append("new")
+            ))
+            with pytest.raises(ParseJobCancelled):
+                await first
+            assert released == []
+            
+            event.set()
+            assert await second == "new"
+            assert released == ["old", "new"]
+        finally:
+            event.set()
+            scheduler.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_without_run(self):
+        """Тест: аргументы не запущенной задачи, отклоненной и ожидающей чужой результат освобождаются."""
+        scheduler = ParseScheduler(max_concurrent=1, max_queue=1)
+        event = threading.Event()
+        released = []
+        try:
+            leader = asyncio.create_task(scheduler.run(
+                1, blocking_job, event, "items", key="hash", cleanup=lambda: released.append("leader")
+            ))
+            await asyncio.sleep(0.01)
+            follower = asyncio.create_task(scheduler.run(
+                2, blocking_job, event, "items", key="hash", cleanup=lambda: released.append("follower")
+            ))
+            queued = asyncio.create_task(scheduler.run(
+                3, blocking_job, event, "queued", cleanup=lambda: released.append("queued")
+            ))
+            await asyncio.sleep(0.01)
+            with pytest.raises(ParseQueueFull):
+                await scheduler.run(4, blocking_job, event, 4, cleanup=lambda: released.append("rejected"))
+            assert released == ["rejected"]
+            
+            # Пользователь 3 загрузил другой файл, пока его задача ждала в очереди
+            newer = asyncio.create_task(scheduler.run(3, blocking_job, event, "newer"))
+            with pytest.raises(ParseJobCancelled):
+                await queued
+            assert released == ["rejected", "queued"]
+            
+            event.set()
+            assert await follower == "items"
+            assert await leader == "items"
+            assert await newer == "newer"
+            assert sorted(released) == ["follower", "leader", "queued", "rejected"]
+        finally:
+            event.set()
+            scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
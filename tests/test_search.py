@@ -0,0 +1,69 @@
+"""
+Тесты для поискового индекса каталога.
+"""
+import pytest
+from core.catalog import CatalogStore
+from core.search import SearchIndex, fold_text
+
+
+def make_items():
+    """Позиции с кириллицей, латиницей и ё."""
+    return [
+        {"название": "Black Magic IPA", "пивоварня": "AF Brew", "стиль": "IPA"},
+        {"название": "Хеллес", "пивоварня": "Бакунин", "стиль": None},
+        {"название": "Munich Helles", "пивоварня": "Zavod", "стиль": "Helles"},
+        {"название": "Ёжик в тумане", "пивоварня": "Бакунин", "стиль": "Stout"},
+        {"название": "Sunny Day", "пивоварня": "Zavod", "стиль": "Helles"},
+        {"название": "Imperial Stout", "пивоварня": "AF Brew", "стиль": "Imperial Stout"},
+    ]
+
+
+class TestSearchIndex:
+    """Тесты для SearchIndex."""
+    
+    def test_fold_text(self):
+        """Тест: приведение текста - регистр, ё, транслитерация, двойные буквы."""
+        assert fold_text("Хеллес") == fold_text("HELLES") == "heles"
+        assert fold_text("Ёжик") == fold_text("ежик")
+        assert fold_text("Black-Magic  IPA!") == "blak magik ipa"
+        assert fold_text(None) == ""
+    
+    def test_transliteration_both_ways(self):
+        """Тест: кириллический и латинский запрос находят одно и то же."""
+        index = SearchIndex(make_items())
+        assert set(index.search("хеллес")) == set(index.search("helles")) == {1, 2, 4}
+        assert index.search("ежик") == index.search("Ёжик") == [3]
+    
+    def test_ranking_prefers_name(self):
+        """Тест: совпадение в названии выше совпадения только в стиле."""
+        index = SearchIndex(make_items())
+        assert index.search("helles")[-1] == 4
+        assert index.search("imperial stout")[0] == 5
+    
+    def test_typo_tolerance(self):
+        """Тест: опечатка в одной букве не мешает поиску."""
+        index = SearchIndex(make_items())
+        assert index.search("imperal stout")[0] == 5
+        assert 0 in index.search("blak magic")
+    
+    def test_short_and_empty_queries(self):
+        """Тест: запрос из двух букв ищется как начало слова, пустой - ничего."""
+        index = SearchIndex(make_items())
+        assert index.search("ip") == [0]
+        assert index.search("  ") == []
+        assert index.search("xyzzy") == []
+    
+    def test_store_builds_index_once(self):
+        """Тест: хранилище строит индекс один раз на каталог."""
+        store = CatalogStore(max_memory_bytes=1)
+        store.put("hash", make_items())
+        index = store.search_index("hash")
+        assert store.search_index("hash") is index
+        assert store.search_index("missing") is None
+        
+        store.put("other", make_items())
+        assert store.stats()["indexes"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,71 @@
+"""
+Тесты для сортировок каталога.
+"""
+import numpy as np
+import pytest
+from core.catalog import CatalogStore
+from core.sorting import (
+    SORT_BREWERY, SORT_CATALOG, SORT_NAME, SORT_PRICE, SORT_PRICE_PER_LITER, SORT_STYLE,
+    CatalogSorts, price_per_liter_kop, sort_text,
+)
+
+
+def make_items():
+    """Позиции с разной ценой, объемом и пустыми полями."""
+    return [
+        {"название": "Zeppelin", "пивоварня": "Zavod", "стиль": "Stout", "_price_kop": 30000, "_volume_l": 0.5},
+        {"название": "\"Ёлка\"", "пивоварня": "AF Brew", "стиль": "IPA", "_price_kop": 20000, "_volume_l": 0.33},
+        {"название": "Amber", "пивоварня": "AF Brew", "стиль": None, "_price_kop": 450000, "_volume_l": 30},
+        {"название": "black", "пивоварня": None, "стиль": "IPA", "_price_kop": None, "_volume_l": 0.5},
+        {"название": "Ель", "пивоварня": "Zavod", "стиль": "Stout", "_price_kop": 20000, "_volume_l": None},
+    ]
+
+
+class TestCatalogSorts:
+    """Тесты для CatalogSorts."""
+
+    def test_sort_text_and_price_per_liter(self):
+        """Тест: ключ текста без регистра, ё и знаков в начале; цена за литр из копеек и литров."""
+        assert sort_text("\"Ёлка") == "елка"
+        assert sort_text("  ") is None
+        assert price_per_liter_kop(make_items()[0]) == 60000
+        assert price_per_liter_kop(make_items()[3]) is None
+
+    def test_orders(self):
+        """Тест: перестановки по ключам, пустые значения - в конце, равные - в порядке прайса."""
+        sorts = CatalogSorts(make_items())
+        assert sorts.order(SORT_CATALOG).tolist() == [0, 1, 2, 3, 4]
+        assert sorts.order(SORT_PRICE).tolist() == [1, 4, 0, 2, 3]
+        assert sorts.order(SORT_PRICE_PER_LITER).tolist() == [2, 0, 1, 3, 4]
+        assert sorts.order(SORT_NAME).tolist() == [2, 3, 0, 1, 4]
+        assert sorts.order(SORT_BREWERY).tolist() == [2, 1, 0, 4, 3]
+        assert sorts.order(SORT_STYLE).tolist() == [3, 1, 0, 4, 2]
+        assert sorts.order("unknown").tolist() == [0, 1, 2, 3, 4]
+
+    def test_view_with_mask_keeps_sort_order(self):
+        """Тест: представление с фильтром - выборка перестановки по маске."""
+        sorts = CatalogSorts(make_items())
+        mask = np.array([True, True, False, True, True])
+        assert sorts.view(SORT_PRICE, mask) == [1, 4, 0, 3]
+        assert sorts.view(SORT_PRICE) is sorts.order(SORT_PRICE)
+
+    def test_letter_index(self):
+        """Тест: переход к букве - место первой позиции на букву в представлении по названию."""
+        sorts = CatalogSorts(make_items())
+        assert sorts.letters() == ["A", "B", "Z", "Е"]
+        assert sorts.letter_index(sorts.view(SORT_NAME), "Е") == 3
+        filtered = sorts.view(SORT_NAME, np.array([True, True, False, False, True]))
+        assert filtered == [0, 1, 4]
+        assert sorts.letter_index(filtered, "B") == 0
+        assert sorts.letter_index(filtered, "Е") == 1
+
+    def test_store_builds_sorts_once(self):
+        """Тест: сортировки строятся один раз на каталог."""
+        store = CatalogStore(max_memory_bytes=1)
+        store.put("a", make_items())
+        assert store.sorts("a") is store.sorts("a")
+        assert store.sorts("missing") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,49 @@
+"""
+Тесты для буфера загрузки документов.
+"""
+import hashlib
+import pytest
+from core.upload_buffer import UploadBuffer
+
+
+class TestUploadBuffer:
+    """Тесты для UploadBuffer."""
+    
+    def test_hash_while_writing(self):
+        """Тест: хэш при записи блоками совпадает с SHA-256 всего содержимого."""
+        data = b"price list" * 1000
+        
+        buffer = UploadBuffer(max_memory_bytes=1024 * 1024)
+        for start in range(0, len(data), 4096):
+            buffer.write(data[start:start + 4096])
+        
+        assert buffer.hexdigest() == hashlib.sha256(data).hexdigest()
+        assert buffer.size == len(data)
+        assert buffer.in_memory
+        assert bytes(buffer.getvalue()) == data
+    
+    def test_spill_to_disk(self):
+        """Тест: сверх лимита данные переносятся во временный файл без потерь."""
+        with UploadBuffer(max_memory_bytes=10) as buffer:
+            buffer.write(b"0123456789")
+            assert buffer.in_memory
+            buffer.write(b"abcdef")
+            assert not buffer.in_memory
+            
+            buffer.seek(0)
+            assert buffer.read() == b"0123456789abcdef"
+            assert buffer.getvalue() == b"0123456789abcdef"
+        assert buffer.closed
+    
+    def test_close_after_getvalue(self):
+        """Тест: содержимое - копия, поэтому буфер в памяти закрывается без BufferError."""
+        buffer = UploadBuffer(max_memory_bytes=1024)
+        buffer.write(b"price list")
+        data = buffer.getvalue()
+        buffer.close()
+        assert data == b"price list"
+        assert buffer.closed
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
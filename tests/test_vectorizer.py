@@ -0,0 +1,171 @@
+"""
+Тесты для дообучения классификатора колонок.
+"""
+import subprocess
+import sys
+import pytest
+from core.column_detector import ColumnDetector, SharedModel
+from core.layout_registry import LayoutRegistry
+from ml.training_data import TRAINING_DATA
+from ml.vectorizer import (
+    SAMPLE_ADDED, SAMPLE_REPLACED, AdaptiveColumnClassifier, HashedNaiveBayes, SampleStore,
+)
+
+
+class LookupModel:
+    """Выгрузка, безошибочно классифицирующая обучающие данные."""
+
+    def predict(self, names):
+        labels = dict(TRAINING_DATA)
+        return [labels.get(name, "IGNORE") for name in names]
+
+
+class TestHashedNaiveBayes:
+    """Тесты для HashedNaiveBayes."""
+
+    def test_fit_on_training_data(self):
+        """Тест: модель, обученная на обучающих данных, узнает их заголовки."""
+        names, labels = zip(*TRAINING_DATA)
+        model = HashedNaiveBayes()
+        model.partial_fit(names, labels)
+        predicted = model.predict(names)
+        accuracy = sum(p == l for p, l in zip(predicted, labels)) / len(labels)
+        assert accuracy > 0.9
+
+    def test_partial_fit_adds_new_class(self):
+        """Тест: дообучение добавляет новый тип, не трогая копию-источник."""
+        model = HashedNaiveBayes()
+        model.partial_fit(["название", "цена"], ["NAME", "PRICE"])
+        with pytest.raises(ValueError):
+            HashedNaiveBayes().predict(["цена"])
+
+        updated = model.copy()
+        updated.partial_fit(["крепость"], ["ABV"])
+        assert updated.predict(["крепость"]) == ["ABV"]
+        assert model.classes == ["NAME", "PRICE"]
+
+
+class TestSampleStore:
+    """Тесты для SampleStore."""
+
+    def test_dedup_replace_and_evict(self):
+        """Тест: повтор не добавляется, смена типа и вытеснение требуют обучения заново."""
+        store = SampleStore(max_entries=2)
+        assert store.add("цена", "PRICE") == SAMPLE_ADDED
+        assert store.add("цена", "PRICE") is None
+        assert store.add("цена", "PRICE_DISCOUNT") == SAMPLE_REPLACED
+        assert store.add("стиль", "STYLE") == SAMPLE_ADDED
+        assert store.add("объем", "VOLUME") == SAMPLE_REPLACED
+        assert store.items() == [("стиль", "STYLE"), ("объем", "VOLUME")]
+
+    def test_save_and_load(self, tmp_path):
+        """Тест: хранилище переживает перезапуск, битый файл игнорируется."""
+        path = tmp_path / "samples.json"
+        store = SampleStore(path)
+        store.add("сорт", "NAME")
+        store.save()
+        assert SampleStore(path).items() == [("сорт", "NAME")]
+
+        path.write_text("не json", encoding='utf-8')
+        assert len(SampleStore(path)) == 0
+
+
+class TestAdaptiveColumnClassifier:
+    """Тесты для AdaptiveColumnClassifier."""
+
+    def test_learn_and_flush_swaps_shared_model(self, tmp_path):
+        """Тест: примеры копятся без обучения, flush дообучает и подменяет общую модель."""
+        shared = SharedModel(tmp_path / "missing.json")
+        store = SampleStore(tmp_path / "samples.json")
+        learner = AdaptiveColumnClassifier(store, shared=shared, debounce=3600)
+
+        assert learner.learn({" Наименование ": "NAME", "Лишнее": "IGNORE"}) == 1
+        assert learner.learn({"наименование": "NAME"}) == 0
+        assert learner._timer is None
+        assert shared.get() is None
+
+        assert learner.flush()
+        assert isinstance(shared.get(), HashedNaiveBayes)
+        assert (tmp_path / "samples.json").exists()
+        assert not learner.flush()
+
+        # Дообучение копии на новом примере
+        published = shared.get()
+        learner.learn({"градусы крепости": "ABV"})
+        assert learner.flush()
+        assert shared.get() is not published
+        assert shared.get().class_count.sum() == published.class_count.sum() + 1
+        assert ColumnDetector(shared).detect_column_types(["наименование"]) == ["NAME"]
+
+    def test_retrain_revalidates_layouts(self, tmp_path):
+        """Тест: дообученная модель получает новую отметку, раскладки перепроверяются, а не забываются."""
+        shared = SharedModel(tmp_path / "missing.json")
+        store = SampleStore(tmp_path / "samples.json")
+        learner = AdaptiveColumnClassifier(store, shared=shared, debounce=3600)
+        registry = LayoutRegistry()
+        registry.put("a", {"Наименование": "NAME"}, model=shared.tag)
+
+        learner.learn({"Наименование": "NAME"})
+        assert learner.flush()
+        assert registry.revalidate(shared.tag, ColumnDetector(shared).detect_column_types) == 0
+        assert registry.get("a", model=shared.tag) == {"Наименование": "NAME"}
+        tag = shared.tag
+
+        # После перезапуска с теми же примерами модель обучается сразу и с той же отметкой
+        restarted = SharedModel(tmp_path / "missing.json")
+        AdaptiveColumnClassifier(SampleStore(tmp_path / "samples.json"), shared=restarted, debounce=3600).start()
+        assert isinstance(restarted.get(), HashedNaiveBayes)
+        assert restarted.tag == tag
+
+        learner.learn({"Градусы": "ABV"})
+        assert learner.flush()
+        assert shared.tag != tag
+
+    def test_retrain_keeps_better_export(self, tmp_path):
+        """Тест: дообученная модель хуже выгрузки на обучающих данных - выгрузка остается."""
+        path = tmp_path / "model.json"
+        path.write_text("{}", encoding='utf-8')
+        shared = SharedModel(path, loader=lambda _: LookupModel())
+        export = shared.get()
+        learner = AdaptiveColumnClassifier(SampleStore(), shared=shared, debounce=3600)
+
+        learner.learn({"Наименование": "NAME"})
+        assert not learner.flush()
+        assert shared.get() is export
+        assert shared.tag.startswith("file:")
+
+    def test_start_schedules_debounced_retrain(self, tmp_path):
+        """Тест: после start новый пример откладывает дообучение, shutdown отменяет его."""
+        learner = AdaptiveColumnClassifier(SampleStore(), shared=SharedModel(tmp_path / "m.json"), debounce=3600)
+        learner.start()
+        assert learner._timer is None
+        learner.learn({"пивоварня": "BREWERY"})
+        assert learner._timer is not None
+        learner.shutdown()
+        assert learner._timer is None
+
+    def test_stale_timer_keeps_new_one(self, tmp_path):
+        """Тест: сработавший старый таймер не сбрасывает таймер, запущенный после него."""
+        learner = AdaptiveColumnClassifier(SampleStore(), shared=SharedModel(tmp_path / "m.json"), debounce=3600)
+        learner.start()
+        learner.learn({"пивоварня": "BREWERY"})
+        stale = learner._timer
+        learner.learn({"сорт": "NAME"})
+        fresh = learner._timer
+
+        learner._on_timer(stale)
+        assert learner._timer is fresh
+        assert fresh.is_alive()
+        learner._on_timer(fresh)
+        assert learner._timer is None
+        learner.shutdown()
+
+    def test_runtime_does_not_import_sklearn(self):
+        """Тест: дообучение работает без scikit-learn."""
+        code = "import sys, ml.vectorizer; print('sklearn' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "False"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])